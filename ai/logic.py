@@ -1,17 +1,50 @@
-import copy
+import os
 import random
-import re
-from typing import Tuple, List, Dict, Set, Any
+from collections.abc import Mapping
+from typing import Tuple, List, Dict, Set, Any, AsyncIterator, Iterator, NamedTuple, Union
 
+from utils.product_catalog import ProductCatalog, ProductRecord
+from utils.product_store import SqlProductCatalog
 from utils.product_loader import (
     extract_product_core_info,
-    load_products_from_csv,
-    filter_products_by_involvement,
+    get_product_catalog,
     get_matching_products,
     get_random_products,
 )
-from utils.deepseek_client import call_deepseek_with_products
+from utils.deepseek_client import (
+    astream_deepseek_with_products,
+    call_deepseek_with_products,
+    stream_deepseek_with_products,
+)
+from utils.selection_cache import SelectionCache
+from utils.keyword_matcher import KeywordHits
+from utils.lexicon import as_keyword_hits, normalize_text, scan_keywords
+from utils.preference_analyzer import PreferenceAnalyzer
+from utils.memo_cache import MemoCache
+from utils.price_parser import parse_budget
 from models.main import InteractionTurn, ExperimentSession
+from ai.session_state import SessionState
+
+# 商品目录：进程内列存目录（csv）或 products 表（sql），见 PRODUCT_CATALOG_BACKEND
+CatalogLike = Union[ProductCatalog, SqlProductCatalog]
+
+# HIGH 校准选品结果缓存（条数上限，0 表示不缓存）
+selection_cache = SelectionCache(max_entries=int(os.environ.get("SELECTION_CACHE_ENTRIES", "4096")))
+
+
+def get_selection_cache_stats() -> Dict:
+    return selection_cache.stats()
+
+
+# 文本分析结果缓存（需求抽取 / 意图 / 偏好向量 / 整条消息分析，按规范化文本；条数上限，0 表示不缓存）
+analysis_memo = MemoCache(max_entries=int(os.environ.get("ANALYSIS_MEMO_ENTRIES", "8192")))
+
+# 偏好分析器本身无状态，app 与回复计划共用同一个实例和缓存
+preference_analyzer = PreferenceAnalyzer(memo=analysis_memo)
+
+
+def get_analysis_memo_stats() -> Dict:
+    return analysis_memo.stats()
 
 
 # =========================
@@ -41,16 +74,30 @@ def assign_group():
 # =========================
 # 2. 基础工具
 # =========================
-def _normalize_text(text: str) -> str:
-    return (text or "").strip().lower()
+# 单条用户发言的长度上限（字符）：超出部分在分析、落库和拼 prompt 之前截掉，
+# 关键词扫描 / 预算解析 / 缓存键 / 历史回放的每轮成本都以它为上界；<= 0 表示不限制
+MAX_MESSAGE_CHARS = int(os.environ.get("MAX_MESSAGE_CHARS", "2000"))
+_CLIP_MARKER = "……（中间内容过长已省略）……"
 
 
-def _safe_json_dict(value: Any) -> Dict:
-    return value if isinstance(value, dict) else {}
+def clip_user_message(user_msg: str, max_chars: int = None) -> Tuple[str, bool]:
+    """
+    超长发言保留开头约 2/3 和结尾约 1/3（需求通常在开头、结论通常在结尾），中间换成省略标记
+    返回 (截断后的文本, 是否截断)；截断后的长度不超过 max_chars
+    """
+    text = user_msg or ""
+    max_chars = MAX_MESSAGE_CHARS if max_chars is None else max_chars
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text, False
+    keep = max_chars - len(_CLIP_MARKER)
+    if keep <= 0:
+        return text[:max_chars], True
+    head = keep * 2 // 3
+    return text[:head] + _CLIP_MARKER + text[len(text) - (keep - head):], True
 
 
-def _safe_json_list(value: Any) -> List:
-    return value if isinstance(value, list) else []
+def _normalize_text(text: str) -> str:
+    return clip_user_message((text or "").strip())[0].lower()
 
 
 def _dedup_products(products: List[Dict], max_n: int = None) -> List[Dict]:
@@ -58,7 +105,7 @@ def _dedup_products(products: List[Dict], max_n: int = None) -> List[Dict]:
     result = []
 
     for p in products:
-        if not isinstance(p, dict):
+        if not isinstance(p, Mapping):
             continue
         pid = p.get("product_id")
         if not pid or pid in seen:
@@ -90,183 +137,124 @@ def _count_filled_slots(profile: Dict) -> int:
 # 3. 从文本抽取结构化需求
 # =========================
 def _extract_budget(text: str):
-    if not text:
-        return None
-
-    patterns = [
-        r"预算\s*(\d+)",
-        r"(\d+)\s*元?\s*以内",
-        r"(\d+)\s*元?\s*以下",
-        r"(\d+)\s*块?\s*以内",
-        r"不超过\s*(\d+)",
-        r"低于\s*(\d+)",
-        r"小于\s*(\d+)",
-        r"控制在\s*(\d+)",
-        r"(\d+)\s*左右",
-    ]
-    for pattern in patterns:
-        m = re.search(pattern, text)
-        if m:
-            try:
-                return int(m.group(1))
-            except Exception:
-                pass
-    return None
-
-
-def _extract_headset_type(text: str):
-    if not text:
-        return None
-
-    mapping = {
-        "头戴式": "头戴式",
-        "头戴": "头戴式",
-        "入耳式": "入耳式",
-        "入耳": "入耳式",
-        "半入耳式": "半入耳式",
-        "半入耳": "半入耳式",
-    }
+    # 预算 / 以内 / 区间 / 中文数字等写法见 utils.price_parser，一次正则扫描按规则优先级取值
+    return parse_budget(text)
 
-    for k, v in mapping.items():
-        if k in text:
-            return v
-    return None
-
-
-def _extract_core_functions(text: str) -> List[str]:
-    if not text:
-        return []
-
-    mapping = [
-        ("主动降噪", "降噪"),
-        ("降噪", "降噪"),
-        ("无线", "无线蓝牙"),
-        ("蓝牙", "无线蓝牙"),
-        ("续航", "长续航"),
-        ("长续航", "长续航"),
-        ("游戏", "游戏低延迟"),
-        ("低延迟", "游戏低延迟"),
-        ("音质", "高音质"),
-        ("重低音", "重低音"),
-        ("通话", "高清通话"),
-        ("麦克风", "高清通话"),
-        ("运动", "运动防水"),
-        ("防水", "运动防水"),
-        ("舒适", "佩戴舒适"),
-        ("佩戴", "佩戴舒适"),
-    ]
-
-    found = []
-    for keyword, normalized in mapping:
-        if keyword in text and normalized not in found:
-            found.append(normalized)
-    return found
-
-
-def _extract_brand(text: str):
-    if not text:
-        return None
-
-    brand_map = {
-        "sony": "索尼",
-        "索尼": "索尼",
-        "apple": "苹果",
-        "苹果": "苹果",
-        "huawei": "华为",
-        "华为": "华为",
-        "xiaomi": "小米",
-        "小米": "小米",
-        "edifier": "漫步者",
-        "漫步者": "漫步者",
-        "bose": "Bose",
-        "博士": "Bose",
-        "jbl": "JBL",
-        "beats": "Beats",
-        "sennheiser": "森海塞尔",
-        "森海塞尔": "森海塞尔",
-        "oppo": "OPPO",
-        "vivo": "vivo",
-    }
 
-    text_lower = text.lower()
-    for raw, normalized in brand_map.items():
-        if raw in text_lower:
-            return normalized
-    return None
-
-
-def _extract_scenarios(text: str) -> List[str]:
-    if not text:
-        return []
-
-    mapping = [
-        ("通勤", "通勤"),
-        ("地铁", "通勤"),
-        ("上班", "办公"),
-        ("办公", "办公"),
-        ("开会", "办公"),
-        ("学习", "学习"),
-        ("运动", "运动"),
-        ("跑步", "运动"),
-        ("健身", "运动"),
-        ("游戏", "游戏"),
-        ("手游", "游戏"),
-        ("打游戏", "游戏"),
-        ("睡觉", "助眠"),
-        ("日常", "日常"),
-        ("出差", "通勤"),
-    ]
-
-    found = []
-    for keyword, normalized in mapping:
-        if keyword in text and normalized not in found:
-            found.append(normalized)
-    return found
-
-
-def _build_intent_details(user_msg: str) -> Dict:
+# 类型 / 功能 / 品牌 / 场景的关键词映射见 utils.lexicon（slot_*），按映射顺序取命中项
+def _extract_headset_type(hits: KeywordHits):
+    return hits.first("slot_headset_type")
+
+
+def _extract_core_functions(hits: KeywordHits) -> List[str]:
+    return hits.values("slot_core_function", unique=True)
+
+
+def _extract_brand(hits: KeywordHits):
+    return hits.first("slot_brand")
+
+
+def _extract_scenarios(hits: KeywordHits) -> List[str]:
+    return hits.values("slot_scenario", unique=True)
+
+
+def _build_intent_details(user_msg: str, hits: KeywordHits = None) -> Dict:
+    """
+    hits：调用方已扫描好的本条消息关键词命中，没有则在这里扫描
+    结果按规范化文本缓存，返回只读字典
+    """
     text = _normalize_text(user_msg)
+    return analysis_memo.get_or_compute(("build_intent_details", text), lambda: _compute_intent_details(text, hits))
+
+
+def _compute_intent_details(text: str, hits: KeywordHits = None) -> Dict:
+    hits = hits if hits is not None else scan_keywords(text)
     details = {}
 
     budget = _extract_budget(text)
     if budget is not None:
         details["max_price"] = budget
 
-    headset_type = _extract_headset_type(text)
+    headset_type = _extract_headset_type(hits)
     if headset_type:
         details["headset_type"] = headset_type
 
-    brand = _extract_brand(text)
+    brand = _extract_brand(hits)
     if brand:
         details["brand"] = brand
 
-    core_functions = _extract_core_functions(text)
+    core_functions = _extract_core_functions(hits)
     if core_functions:
         details["core_function"] = core_functions[0]
         details["core_functions"] = core_functions
 
-    scenarios = _extract_scenarios(text)
+    scenarios = _extract_scenarios(hits)
     if scenarios:
         details["scenarios"] = scenarios
 
     return details
 
 
-def _detect_user_intent(user_msg: str) -> str:
-    text = _normalize_text(user_msg)
+def _detect_user_intent(user_msg: Union[str, KeywordHits]) -> str:
+    return analysis_memo.get_or_compute(
+        ("detect_user_intent", normalize_text(user_msg)), lambda: _compute_user_intent(user_msg)
+    )
+
+
+def _compute_user_intent(user_msg: Union[str, KeywordHits]) -> str:
+    hits = as_keyword_hits(user_msg)
 
-    if any(k in text for k in ["对比", "比较", "区别", "哪个好", "哪款好", "怎么选"]):
+    if hits.has("intent_comparison"):
         return "comparison"
 
-    if any(k in text for k in ["便宜", "预算", "以内", "以下", "不超过", "性价比"]):
+    if hits.has("intent_price"):
         return "price_sensitive"
 
-    if any(k in text for k in ["随便看看", "都有哪些", "有什么", "推荐几款", "先看看"]):
+    if hits.has("intent_exploration"):
         return "exploration"
 
     return "recommendation"
 
 
+class MessageFeatures(NamedTuple):
+    """
+    一条用户消息的全部文本分析结果，每个请求只计算一次（analyze_message），
+    偏好指标落库（app）与回复计划（prepare_ai_response）共用；字典字段均为只读
+    """
+    text: str                 # 规范化后的文本（缓存键）
+    keyword_hits: KeywordHits
+    preference_vector: Dict   # PreferenceAnalyzer.compute_vector
+    focus: str                # PreferenceAnalyzer.identify_focus
+    intent: str               # _detect_user_intent
+    intent_details: Dict      # _build_intent_details
+    is_finish: bool           # 明确结束指令（_is_explicit_finish_intent）
+    is_decision: bool         # 说出决策关键词（记录决策效率轮次）
+
+
+def analyze_message(user_msg: str, analyzer: PreferenceAnalyzer = None) -> MessageFeatures:
+    """
+    关键词只扫描一遍，偏好向量 / 关注维度 / 意图 / 需求槽位 / 结束与决策信号都从同一份命中结果得出
+    整条分析结果按规范化文本缓存，重复的说法（如“就买这个”）直接复用
+    """
+    text = _normalize_text(user_msg)
+    return analysis_memo.get_or_compute(("analyze_message", text), lambda: _compute_features(text, analyzer))
+
+
+def _compute_features(text: str, analyzer: PreferenceAnalyzer = None) -> MessageFeatures:
+    analyzer = analyzer or preference_analyzer
+    hits = scan_keywords(text)
+    return MessageFeatures(
+        text=text,
+        keyword_hits=hits,
+        preference_vector=analyzer.compute_vector(hits),
+        focus=analyzer.identify_focus(hits),
+        intent=_detect_user_intent(hits),
+        intent_details=_build_intent_details(text, hits),
+        is_finish=_is_explicit_finish_intent(hits),
+        is_decision=hits.has("decision"),
+    )
+
+
 # =========================
 # 4. 会话历史 / 记忆
 # =========================
@@ -277,157 +265,37 @@ def _get_session_involvement(session_uuid: str) -> str:
     return (exp_session.assigned_involvement or "high").lower()
 
 
-def _get_history_ai_turns(session_uuid: str):
-    return InteractionTurn.query.filter_by(
-        session_uuid=session_uuid,
-        sender="ai"
-    ).order_by(InteractionTurn.turn_index.asc()).all()
-
-
-def _get_history_user_turns(session_uuid: str):
-    return InteractionTurn.query.filter_by(
-        session_uuid=session_uuid,
-        sender="user"
-    ).order_by(InteractionTurn.turn_index.asc()).all()
-
-
-def _get_history_product_ids(session_uuid: str) -> Set[str]:
-    history_turns = _get_history_ai_turns(session_uuid)
-    history_ids = set()
-
-    for turn in history_turns:
-        products = _safe_json_list(turn.recommended_products)
-        for p in products:
-            pid = p.get("product_id")
-            if pid:
-                history_ids.add(pid)
-
-    return history_ids
-
-
-def _get_recent_history_products(session_uuid: str, max_n: int = 3) -> List[Dict]:
-    history_turns = _get_history_ai_turns(session_uuid)
-    collected = []
-
-    for turn in reversed(history_turns):
-        products = _safe_json_list(turn.recommended_products)
-        for p in products:
-            collected.append(p)
-
-    return _dedup_products(collected, max_n=max_n)
-
-
-def _count_stable_signals(session_uuid: str) -> Dict:
+def _rebuild_session_state(session_uuid: str, before_turn: int = None) -> SessionState:
     """
-    统计跨轮重复出现的偏好信号，避免一次提及就被当成稳定需求
+    回放历史轮次重建会话状态，仅在快照缺失（旧会话 / 快照版本升级）时使用一次
     """
-    history_user_turns = _get_history_user_turns(session_uuid)
-
-    counts = {
-        "budget": 0,
-        "headset_type": 0,
-        "brand": 0,
-        "core_function": 0,
-        "scenario": 0,
-    }
-
-    for turn in history_user_turns:
-        details = _build_intent_details(_normalize_text(turn.content or ""))
-
-        if details.get("max_price") is not None:
-            counts["budget"] += 1
-        if details.get("headset_type"):
-            counts["headset_type"] += 1
-        if details.get("brand"):
-            counts["brand"] += 1
-        if details.get("core_functions"):
-            counts["core_function"] += 1
-        if details.get("scenarios"):
-            counts["scenario"] += 1
-
-    return counts
-
-
-def _build_user_memory_profile(session_uuid: str) -> Dict:
-    history_user_turns = _get_history_user_turns(session_uuid)
-
-    memory = {
-        "max_price": None,
-        "headset_type": None,
-        "brand": None,
-        "core_functions": [],
-        "scenarios": [],
-        "known_slots": [],
-        "summary": "暂无明确历史需求",
-    }
-
-    for turn in history_user_turns:
-        text = _normalize_text(turn.content or "")
-        current_details = _build_intent_details(text)
-
-        if current_details.get("max_price") is not None:
-            memory["max_price"] = current_details["max_price"]
-
-        if current_details.get("headset_type"):
-            memory["headset_type"] = current_details["headset_type"]
-
-        if current_details.get("brand"):
-            memory["brand"] = current_details["brand"]
-
-        for func in current_details.get("core_functions", []):
-            if func not in memory["core_functions"]:
-                memory["core_functions"].append(func)
-
-        for s in current_details.get("scenarios", []):
-            if s not in memory["scenarios"]:
-                memory["scenarios"].append(s)
-
-        vec = _safe_json_dict(turn.preference_vector)
-        attrs = _safe_json_dict(vec.get("preferred_attributes"))
-
-        for func in _safe_json_list(attrs.get("core_function")):
-            if func not in memory["core_functions"]:
-                memory["core_functions"].append(func)
-
-        for s in _safe_json_list(attrs.get("scenario")):
-            if s not in memory["scenarios"]:
-                memory["scenarios"].append(s)
-
-        headset_types = _safe_json_list(attrs.get("headset_type"))
-        if not memory["headset_type"] and headset_types:
-            memory["headset_type"] = headset_types[0]
+    state = SessionState()
+    turns = InteractionTurn.query.filter_by(
+        session_uuid=session_uuid
+    ).order_by(InteractionTurn.turn_index.asc(), InteractionTurn.id.asc()).all()
 
-        brands = _safe_json_list(attrs.get("brand"))
-        if not memory["brand"] and brands:
-            memory["brand"] = brands[0]
-
-    if memory["max_price"] is not None:
-        memory["known_slots"].append("budget")
-    if memory["headset_type"]:
-        memory["known_slots"].append("headset_type")
-    if memory["brand"]:
-        memory["known_slots"].append("brand")
-    if memory["core_functions"]:
-        memory["known_slots"].append("core_function")
-    if memory["scenarios"]:
-        memory["known_slots"].append("scenario")
+    for turn in turns:
+        if before_turn is not None and (turn.turn_index or 0) >= before_turn:
+            continue
+        if turn.sender == "user":
+            details = _build_intent_details(_normalize_text(turn.content or ""))
+            state.apply_user_turn(details, turn.preference_vector)
+        elif turn.sender == "ai":
+            state.apply_ai_turn(turn.recommended_products)
 
-    summary_parts = []
-    if memory["max_price"] is not None:
-        summary_parts.append(f"预算约{memory['max_price']}元")
-    if memory["headset_type"]:
-        summary_parts.append(f"偏好{memory['headset_type']}")
-    if memory["brand"]:
-        summary_parts.append(f"偏好品牌{memory['brand']}")
-    if memory["core_functions"]:
-        summary_parts.append(f"关注功能：{'、'.join(memory['core_functions'])}")
-    if memory["scenarios"]:
-        summary_parts.append(f"使用场景：{'、'.join(memory['scenarios'])}")
+    return state
 
-    if summary_parts:
-        memory["summary"] = "；".join(summary_parts)
 
-    return memory
+def load_session_state(session_uuid: str, snapshot: Any, current_turn: int) -> SessionState:
+    """
+    优先从 ExperimentSession.conversation_state 快照恢复，缺失时回放本轮之前的历史
+    """
+    state = SessionState.from_dict(snapshot)
+    if state is not None:
+        return state
+    if not session_uuid:
+        return SessionState()
+    return _rebuild_session_state(session_uuid, before_turn=current_turn)
 
 
 def _merge_memory_with_current(memory: Dict, current_details: Dict) -> Dict:
@@ -558,32 +426,23 @@ def _build_confirmation_followup(memory_profile: Dict) -> str:
 # =========================
 # 6. 停止指令
 # =========================
-def _is_explicit_finish_intent(user_msg: str) -> bool:
-    text = _normalize_text(user_msg)
-    finish_keywords = [
-        "可以了", "就这样", "没问题了", "不用再推荐了", "不用推荐了",
-        "我已经决定了", "决定好了", "就买这个", "买这个", "就这个",
-        "可以结束了", "结束吧", "开始答题", "去答题", "填写问卷",
-        "我要答题", "进入问卷"
-    ]
-    return any(k in text for k in finish_keywords)
+def _is_explicit_finish_intent(user_msg: Union[str, KeywordHits]) -> bool:
+    return as_keyword_hits(user_msg).has("finish")
 
 
-def _is_need_clear_enough(memory_profile: Dict, current_turn: int, user_msg: str, stable_counts: Dict) -> bool:
+def _is_need_clear_enough(
+    memory_profile: Dict,
+    current_turn: int,
+    user_msg: Union[str, KeywordHits],
+    stable_counts: Dict
+) -> bool:
     """
     降敏版停止条件：
     1. 用户明确表示结束/决定 -> 可以停
     2. 否则至少第3轮以后
     3. 且信息完整度更高 + 稳定信号足够
     """
-    text = _normalize_text(user_msg)
-
-    decision_keywords = [
-        "就买", "下单", "决定", "买这个", "就这个",
-        "直接买", "可以了", "够了", "不用再推荐"
-    ]
-
-    if any(k in text for k in decision_keywords):
+    if as_keyword_hits(user_msg).has("stop_decision"):
         return True
 
     if current_turn < 3:
@@ -611,72 +470,43 @@ def _build_stop_message(memory_profile: Dict) -> str:
 # =========================
 # 7. 校准操控：基于合并记忆选商品
 # =========================
-def _safe_filter_products_by_ids(products: List[Dict], allowed_ids: Set[str]) -> List[Dict]:
-    if not allowed_ids:
-        return products
-    return [p for p in products if p.get("product_id") in allowed_ids]
-
-
-def _exclude_history_products(products: List[Dict], history_ids: Set[str]) -> List[Dict]:
-    filtered = [p for p in products if p.get("product_id") not in history_ids]
-    return filtered if filtered else list(products)
-
-
 def _high_calibration_select(
-    base_products: List[Dict],
+    catalog: CatalogLike,
+    candidates: Any,
     user_intent: str,
     intent_details: Dict,
-    top_n: int = 5
+    top_n: int = 5,
+    query_text: str = None
 ) -> List[Dict]:
-    matched = get_matching_products(user_intent, intent_details, top_n=top_n * 2)
-
-    base_ids = {p.get("product_id") for p in base_products if p.get("product_id")}
-    matched = _safe_filter_products_by_ids(matched, base_ids)
-
-    if matched:
-        return matched[:top_n]
-
-    fallback = copy.deepcopy(base_products)
-    random.shuffle(fallback)
-    return fallback[:top_n]
+    # 只做规则匹配（含语义相似度兜底排序），匹配为空时返回空列表，随机兜底由调用方负责（保证结果可缓存）
+    return get_matching_products(
+        user_intent, intent_details, top_n=top_n, candidates=candidates, catalog=catalog,
+        fallback=False, query_text=query_text
+    )
 
 
 def _low_calibration_select(
-    base_products: List[Dict],
+    catalog: CatalogLike,
+    candidates: Any,
     top_n: int = 5
 ) -> List[Dict]:
-    random_products = get_random_products(top_n=top_n * 2)
-    base_ids = {p.get("product_id") for p in base_products if p.get("product_id")}
-    random_products = _safe_filter_products_by_ids(random_products, base_ids)
-
-    if len(random_products) >= top_n:
-        return random_products[:top_n]
-
-    fallback_pool = copy.deepcopy(base_products)
-    random.shuffle(fallback_pool)
-
-    seen = {p.get("product_id") for p in random_products if p.get("product_id")}
-    for p in fallback_pool:
-        pid = p.get("product_id")
-        if pid not in seen:
-            random_products.append(p)
-            seen.add(pid)
-        if len(random_products) >= top_n:
-            break
-
-    return random_products[:top_n]
+    return get_random_products(top_n=top_n, candidates=candidates, catalog=catalog)
 
 
 def _select_products_by_calibration(
-    all_products: List[Dict],
+    catalog: CatalogLike,
+    involvement: str,
     user_intent: str,
     merged_profile: Dict,
     calib_level: str,
     history_product_ids: Set[str],
-    top_n: int = 5
-) -> List[Dict]:
-    candidate_products = _exclude_history_products(all_products, history_product_ids)
-
+    top_n: int = 5,
+    query_text: str = None
+) -> Tuple[ProductRecord, ...]:
+    """
+    返回不可变的商品元组：HIGH 校准命中缓存时多个会话共享同一个结果，调用方不得原地修改
+    query_text 为本轮用户原话，供 recommendation 意图的语义相似度兜底排序
+    """
     intent_details = {}
     if merged_profile.get("max_price") is not None:
         intent_details["max_price"] = merged_profile["max_price"]
@@ -687,108 +517,250 @@ def _select_products_by_calibration(
     if merged_profile.get("core_function"):
         intent_details["core_function"] = merged_profile["core_function"]
 
+    # HIGH 校准是确定性规则：同一目录版本下输入相同则结果相同，先查缓存（LOW 校准的随机选品从不缓存）
+    cache_key = None
+    if calib_level == "HIGH" and catalog.version:
+        # 语义排序只看原话中落在索引里的片段，片段相同的不同说法共用一个缓存项
+        query_signature = None
+        if query_text and user_intent == "recommendation" and isinstance(catalog, ProductCatalog):
+            query_signature = catalog.query_signature(query_text)
+        cache_key = selection_cache.make_key(
+            catalog.version, involvement, user_intent, intent_details, history_product_ids, top_n,
+            query_signature=query_signature
+        )
+        cached = selection_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    # 按当前session涉入度过滤商品池，再排除已推荐商品（过滤后为空则逐级回退）
+    candidates = catalog.candidate_pool(involvement, history_product_ids)
+
     if calib_level == "HIGH":
-        selected = _high_calibration_select(
-            base_products=candidate_products,
+        matched = _high_calibration_select(
+            catalog=catalog,
+            candidates=candidates,
             user_intent=user_intent,
             intent_details=intent_details,
-            top_n=top_n
+            top_n=top_n,
+            query_text=query_text
         )
-    else:
-        selected = _low_calibration_select(
-            base_products=candidate_products,
-            top_n=top_n
-        )
-
-    return _dedup_products(selected, max_n=top_n)
+        if matched:
+            selected = _dedup_products(matched, max_n=top_n)
+            if cache_key is not None:
+                return selection_cache.set(cache_key, selected)
+            return tuple(selected)
+
+    # LOW 校准，或 HIGH 校准匹配为空时从同一商品池随机兜底
+    selected = _low_calibration_select(
+        catalog=catalog,
+        candidates=candidates,
+        top_n=top_n
+    )
+    return tuple(_dedup_products(selected, max_n=top_n))
 
 
 # =========================
 # 8. 主函数
 # =========================
-def get_ai_response(
+def _plan_response(
+    catalog: CatalogLike,
     user_msg: str,
-    group_id: str,
     current_turn: int,
-    assigned_adaptivity: str,
-    assigned_calibration: str,
-    session_uuid: str,
-    previous_recommended_products: list = None
-) -> Tuple[str, str, str, List[Dict]]:
+    adapt_level: str,
+    calib_level: str,
+    involvement: str,
+    session_state: SessionState,
+    previous_recommended_products: list,
+    features: MessageFeatures
+) -> Dict:
     """
-    返回:
-    (
-        ai_text,
-        adapt_level,
-        calib_level,
-        core_products
-    )
+    决定本轮如何回复：
+    - text：无需调用模型时直接给出的回复（追问 / 结束语），否则为 None
+    - llm_request：需要调用模型时的参数（call_deepseek_with_products / stream_deepseek_with_products 通用）
+    - products：本轮推荐商品（精简存库字段）
     """
-    previous_recommended_products = previous_recommended_products or []
-
-    adapt_level = (assigned_adaptivity or "HIGH").upper()
-    calib_level = (assigned_calibration or "HIGH").upper()
-
-    # 1) 读取当前session涉入度，并过滤商品池
-    all_products = load_products_from_csv()
-    involvement = _get_session_involvement(session_uuid)
-    all_products = filter_products_by_involvement(all_products, involvement)
+    # 1) 本轮意图 + 历史记忆 + 合并画像（历史记忆已包含本轮用户发言）
+    user_intent = features.intent
+    history_memory = session_state.memory_profile()
+    merged_profile = _merge_memory_with_current(history_memory, features.intent_details)
+    stable_counts = session_state.stable_signal_counts()
 
-    # 2) 本轮意图 + 历史记忆 + 合并画像
-    user_intent = _detect_user_intent(user_msg)
-    current_details = _build_intent_details(user_msg)
-    history_memory = _build_user_memory_profile(session_uuid)
-    merged_profile = _merge_memory_with_current(history_memory, current_details)
-    stable_counts = _count_stable_signals(session_uuid)
+    # 2) 明确结束指令优先
+    if features.is_finish:
+        return {"text": _build_stop_message(merged_profile), "llm_request": None, "products": []}
 
-    # 3) 明确结束指令优先
-    if _is_explicit_finish_intent(user_msg):
-        ai_text = _build_stop_message(merged_profile)
-        return ai_text, adapt_level, calib_level, []
-
-    # 4) HIGH adaptivity：第2-3轮优先做确认式追问，避免过早收口
+    # 3) HIGH adaptivity：第2-3轮优先做确认式追问，避免过早收口
     if adapt_level == "HIGH" and _need_confirmation_followup(merged_profile, current_turn, stable_counts):
-        ai_text = _build_confirmation_followup(merged_profile)
-        return ai_text, adapt_level, calib_level, []
+        return {"text": _build_confirmation_followup(merged_profile), "llm_request": None, "products": []}
 
-    # 5) HIGH adaptivity：只有明显信息不足时才追问缺失项
+    # 4) HIGH adaptivity：只有明显信息不足时才追问缺失项
     if adapt_level == "HIGH" and _need_clarification_from_memory(merged_profile, current_turn):
-        ai_text = _build_targeted_clarifying_question(merged_profile)
-        return ai_text, adapt_level, calib_level, []
+        return {"text": _build_targeted_clarifying_question(merged_profile), "llm_request": None, "products": []}
 
-    # 6) 更保守地判断是否可以进入结束阶段
-    if _is_need_clear_enough(merged_profile, current_turn, user_msg, stable_counts):
-        ai_text = _build_stop_message(merged_profile)
-        return ai_text, adapt_level, calib_level, []
+    # 5) 更保守地判断是否可以进入结束阶段
+    if _is_need_clear_enough(merged_profile, current_turn, features.keyword_hits, stable_counts):
+        return {"text": _build_stop_message(merged_profile), "llm_request": None, "products": []}
 
-    # 7) 做校准型选品
-    history_product_ids = _get_history_product_ids(session_uuid)
+    # 6) 做校准型选品
+    history_product_ids = session_state.history_product_ids()
     selected_products = _select_products_by_calibration(
-        all_products=all_products,
+        catalog=catalog,
+        involvement=involvement,
         user_intent=user_intent,
         merged_profile=merged_profile,
         calib_level=calib_level,
         history_product_ids=history_product_ids,
-        top_n=5
+        top_n=5,
+        query_text=user_msg
     )
 
     # comparison 场景允许加入少量最近历史商品做对比
     if user_intent == "comparison":
-        recent_history = _get_recent_history_products(session_uuid, max_n=2)
-        selected_products = _dedup_products(recent_history + selected_products, max_n=5)
+        recent_history = session_state.recent_history_products(max_n=2)
+        selected_products = _dedup_products(recent_history + list(selected_products), max_n=5)
+
+    # 7) 模型调用参数
+    llm_request = {
+        "user_msg": user_msg,
+        "user_intent": user_intent,
+        "recommended_products": selected_products,
+        "adapt_level": adapt_level,
+        "calib_level": calib_level,
+        "memory_profile": merged_profile,
+        "previous_products": previous_recommended_products,
+    }
+
+    return {
+        "text": None,
+        "llm_request": llm_request,
+        "products": extract_product_core_info(selected_products[:5]),
+    }
+
+
+def prepare_ai_response(
+    user_msg: str,
+    group_id: str,
+    current_turn: int,
+    assigned_adaptivity: str,
+    assigned_calibration: str,
+    session_uuid: str,
+    previous_recommended_products: list = None,
+    session_state: SessionState = None,
+    preference_vector: Dict = None,
+    involvement: str = None,
+    features: MessageFeatures = None
+) -> Dict:
+    """
+    生成本轮回复计划（不调用模型），供同步 / 流式两种出口共用
+    返回 dict：adapt_level, calib_level, text, llm_request, products, session_state, catalog_version
+
+    involvement 为会话涉入度（HIGH/LOW），调用方已读到会话行时直接传入可省一次查询；
+    features 为本条消息的分析结果（analyze_message），调用方已计算过时直接传入，避免重复分析；
+    session_state 会被原地合并本轮用户发言，AI 推荐需在回复落库时再 apply_ai_turn
+    """
+    previous_recommended_products = previous_recommended_products or []
+
+    adapt_level = (assigned_adaptivity or "HIGH").upper()
+    calib_level = (assigned_calibration or "HIGH").upper()
+
+    if involvement is None:
+        involvement = _get_session_involvement(session_uuid)
+    involvement = (involvement or "high").lower()
 
-    # 8) 调用模型生成回复
-    ai_text = call_deepseek_with_products(
+    if session_state is None:
+        session_state = _rebuild_session_state(session_uuid, before_turn=current_turn)
+    if features is None:
+        features = analyze_message(user_msg)
+    session_state.apply_user_turn(features.intent_details, preference_vector)
+
+    # 整轮只取一次目录快照，后台热更新不会让本轮中途换版本
+    catalog = get_product_catalog()
+    plan = _plan_response(
+        catalog=catalog,
         user_msg=user_msg,
-        user_intent=user_intent,
-        recommended_products=selected_products,
+        current_turn=current_turn,
         adapt_level=adapt_level,
         calib_level=calib_level,
-        memory_profile=merged_profile,
-        previous_products=previous_recommended_products
+        involvement=involvement,
+        session_state=session_state,
+        previous_recommended_products=previous_recommended_products,
+        features=features
     )
+    plan.update(
+        adapt_level=adapt_level,
+        calib_level=calib_level,
+        session_state=session_state,
+        catalog_version=catalog.version
+    )
+    return plan
+
+
+def stream_ai_response(plan: Dict) -> Iterator[str]:
+    """
+    按回复计划逐段输出文本：无需调用模型时一次性输出 text，否则流式转发模型输出
+    """
+    if plan.get("llm_request") is None:
+        yield plan.get("text") or ""
+        return
+    yield from stream_deepseek_with_products(**plan["llm_request"])
+
+
+async def astream_ai_response(plan: Dict) -> AsyncIterator[str]:
+    """stream_ai_response 的异步版本（ASGI 模式）"""
+    if plan.get("llm_request") is None:
+        yield plan.get("text") or ""
+        return
+    async for token in astream_deepseek_with_products(**plan["llm_request"]):
+        yield token
+
+
+def get_ai_response(
+    user_msg: str,
+    group_id: str,
+    current_turn: int,
+    assigned_adaptivity: str,
+    assigned_calibration: str,
+    session_uuid: str,
+    previous_recommended_products: list = None,
+    session_state: SessionState = None,
+    preference_vector: Dict = None,
+    involvement: str = None,
+    features: MessageFeatures = None
+) -> Tuple[str, str, str, List[Dict]]:
+    """
+    返回:
+    (
+        ai_text,
+        adapt_level,
+        calib_level,
+        core_products
+    )
+
+    session_state 会被原地更新（合并本轮用户发言与 AI 推荐），
+    调用方负责把 session_state.to_dict() 写回 ExperimentSession.conversation_state
+    ASGI 模式没有对应的异步函数：asgi.py 的 /api/send、/api/send_stream 按同样的
+    prepare_ai_response -> 调用模型 -> apply_ai_turn 三步驱动（见 app.py 的 begin_send_turn / commit_ai_turn）
+    """
+    plan = prepare_ai_response(
+        user_msg=user_msg,
+        group_id=group_id,
+        current_turn=current_turn,
+        assigned_adaptivity=assigned_adaptivity,
+        assigned_calibration=assigned_calibration,
+        session_uuid=session_uuid,
+        previous_recommended_products=previous_recommended_products,
+        session_state=session_state,
+        preference_vector=preference_vector,
+        involvement=involvement,
+        features=features
+    )
+
+    if plan["llm_request"] is None:
+        ai_text = plan["text"]
+    else:
+        ai_text = call_deepseek_with_products(**plan["llm_request"])
 
-    core_products = extract_product_core_info(selected_products[:5])
+    plan["session_state"].apply_ai_turn(plan["products"])
 
-    return ai_text, adapt_level, calib_level, core_products
+    return ai_text, plan["adapt_level"], plan["calib_level"], plan["products"]
 
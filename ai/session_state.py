@@ -0,0 +1,225 @@
+from typing import Any, Dict, List, Optional, Set
+
+
+# 最近推荐商品环的容量（comparison 场景最多取 2 款，留一些余量）
+RECENT_PRODUCTS_CAPACITY = 5
+
+# 已推荐商品ID的保留上限：快照每轮整体写回，不能随会话长度无限增长；
+# 超出后丢弃最早的ID（这些商品之后可以再次被推荐），回放重建走同一逻辑，结果一致
+SEEN_PRODUCTS_CAPACITY = 200
+
+SIGNAL_KEYS = ("budget", "headset_type", "brand", "core_function", "scenario")
+
+
+def _safe_json_dict(value: Any) -> Dict:
+    return value if isinstance(value, dict) else {}
+
+
+def _safe_json_list(value: Any) -> List:
+    return value if isinstance(value, list) else []
+
+
+class SessionState:
+    """
+    会话级增量状态：历史记忆画像、跨轮稳定信号计数、已推荐商品ID、最近推荐商品环
+    每轮只做 O(1) 的增量更新，并以快照形式存到 ExperimentSession.conversation_state，
+    避免每轮都回放整段历史
+    """
+
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self):
+        self.max_price = None
+        self.headset_type = None
+        self.brand = None
+        self.core_functions: List[str] = []
+        self.scenarios: List[str] = []
+        self.stable_counts: Dict[str, int] = {k: 0 for k in SIGNAL_KEYS}
+        self.seen_product_ids: List[str] = []
+        self.recent_products: List[Dict] = []
+        self.user_turns = 0
+        self.ai_turns = 0
+        self._seen_set: Set[str] = set()
+
+    # ---------- 增量更新 ----------
+    def apply_user_turn(self, intent_details: Dict, preference_vector: Optional[Dict] = None) -> None:
+        """
+        合并一条用户发言：intent_details 为 _build_intent_details 的结果，
+        preference_vector 为 PreferenceAnalyzer.compute_vector 的结果
+        """
+        details = _safe_json_dict(intent_details)
+
+        if details.get("max_price") is not None:
+            self.max_price = details["max_price"]
+            self.stable_counts["budget"] += 1
+        if details.get("headset_type"):
+            self.headset_type = details["headset_type"]
+            self.stable_counts["headset_type"] += 1
+        if details.get("brand"):
+            self.brand = details["brand"]
+            self.stable_counts["brand"] += 1
+        if details.get("core_functions"):
+            self.stable_counts["core_function"] += 1
+        if details.get("scenarios"):
+            self.stable_counts["scenario"] += 1
+
+        for func in details.get("core_functions", []):
+            if func not in self.core_functions:
+                self.core_functions.append(func)
+        for s in details.get("scenarios", []):
+            if s not in self.scenarios:
+                self.scenarios.append(s)
+
+        vec = _safe_json_dict(preference_vector)
+        attrs = _safe_json_dict(vec.get("preferred_attributes"))
+
+        for func in _safe_json_list(attrs.get("core_function")):
+            if func not in self.core_functions:
+                self.core_functions.append(func)
+        for s in _safe_json_list(attrs.get("scenario")):
+            if s not in self.scenarios:
+                self.scenarios.append(s)
+
+        headset_types = _safe_json_list(attrs.get("headset_type"))
+        if not self.headset_type and headset_types:
+            self.headset_type = headset_types[0]
+
+        brands = _safe_json_list(attrs.get("brand"))
+        if not self.brand and brands:
+            self.brand = brands[0]
+
+        self.user_turns += 1
+
+    def apply_ai_turn(self, recommended_products: Optional[List[Dict]]) -> None:
+        """
+        合并一条 AI 回复中推荐的商品（extract_product_core_info 精简后的结构）
+        """
+        products = [
+            p for p in _safe_json_list(recommended_products)
+            if isinstance(p, dict) and p.get("product_id")
+        ]
+
+        for p in products:
+            pid = p["product_id"]
+            if pid not in self._seen_set:
+                self._seen_set.add(pid)
+                self.seen_product_ids.append(pid)
+        overflow = len(self.seen_product_ids) - SEEN_PRODUCTS_CAPACITY
+        if overflow > 0:
+            self._seen_set.difference_update(self.seen_product_ids[:overflow])
+            del self.seen_product_ids[:overflow]
+
+        # 最近推荐环：本轮商品在前，旧商品在后，按 product_id 去重后截断
+        if products:
+            ring = []
+            ring_ids = set()
+            for p in products + self.recent_products:
+                pid = p["product_id"]
+                if pid in ring_ids:
+                    continue
+                ring_ids.add(pid)
+                ring.append(p)
+                if len(ring) >= RECENT_PRODUCTS_CAPACITY:
+                    break
+            self.recent_products = ring
+
+        self.ai_turns += 1
+
+    # ---------- 读取 ----------
+    def memory_profile(self) -> Dict:
+        """
+        返回与旧版 _build_user_memory_profile 相同结构的历史记忆画像
+        """
+        memory = {
+            "max_price": self.max_price,
+            "headset_type": self.headset_type,
+            "brand": self.brand,
+            "core_functions": list(self.core_functions),
+            "scenarios": list(self.scenarios),
+            "known_slots": [],
+            "summary": "暂无明确历史需求",
+        }
+
+        if memory["max_price"] is not None:
+            memory["known_slots"].append("budget")
+        if memory["headset_type"]:
+            memory["known_slots"].append("headset_type")
+        if memory["brand"]:
+            memory["known_slots"].append("brand")
+        if memory["core_functions"]:
+            memory["known_slots"].append("core_function")
+        if memory["scenarios"]:
+            memory["known_slots"].append("scenario")
+
+        summary_parts = []
+        if memory["max_price"] is not None:
+            summary_parts.append(f"预算约{memory['max_price']}元")
+        if memory["headset_type"]:
+            summary_parts.append(f"偏好{memory['headset_type']}")
+        if memory["brand"]:
+            summary_parts.append(f"偏好品牌{memory['brand']}")
+        if memory["core_functions"]:
+            summary_parts.append(f"关注功能：{'、'.join(memory['core_functions'])}")
+        if memory["scenarios"]:
+            summary_parts.append(f"使用场景：{'、'.join(memory['scenarios'])}")
+
+        if summary_parts:
+            memory["summary"] = "；".join(summary_parts)
+
+        return memory
+
+    def stable_signal_counts(self) -> Dict:
+        return dict(self.stable_counts)
+
+    def history_product_ids(self) -> Set[str]:
+        return set(self._seen_set)
+
+    def recent_history_products(self, max_n: int = 3) -> List[Dict]:
+        return list(self.recent_products[:max_n])
+
+    # ---------- 快照 ----------
+    def to_dict(self) -> Dict:
+        return {
+            "version": self.SNAPSHOT_VERSION,
+            "max_price": self.max_price,
+            "headset_type": self.headset_type,
+            "brand": self.brand,
+            "core_functions": list(self.core_functions),
+            "scenarios": list(self.scenarios),
+            "stable_counts": dict(self.stable_counts),
+            "seen_product_ids": list(self.seen_product_ids),
+            "recent_products": list(self.recent_products),
+            "user_turns": self.user_turns,
+            "ai_turns": self.ai_turns,
+        }
+
+    @classmethod
+    def from_dict(cls, snapshot: Any) -> Optional["SessionState"]:
+        """
+        从快照恢复；快照缺失或版本不符时返回 None，由调用方回放历史重建
+        """
+        snapshot = _safe_json_dict(snapshot)
+        if snapshot.get("version") != cls.SNAPSHOT_VERSION:
+            return None
+
+        state = cls()
+        state.max_price = snapshot.get("max_price")
+        state.headset_type = snapshot.get("headset_type")
+        state.brand = snapshot.get("brand")
+        state.core_functions = list(_safe_json_list(snapshot.get("core_functions")))
+        state.scenarios = list(_safe_json_list(snapshot.get("scenarios")))
+
+        counts = _safe_json_dict(snapshot.get("stable_counts"))
+        state.stable_counts = {k: int(counts.get(k, 0) or 0) for k in SIGNAL_KEYS}
+
+        state.seen_product_ids = [
+            pid for pid in _safe_json_list(snapshot.get("seen_product_ids")) if pid
+        ][-SEEN_PRODUCTS_CAPACITY:]
+        state._seen_set = set(state.seen_product_ids)
+        state.recent_products = [
+            p for p in _safe_json_list(snapshot.get("recent_products"))
+            if isinstance(p, dict) and p.get("product_id")
+        ][:RECENT_PRODUCTS_CAPACITY]
+        state.user_turns = int(snapshot.get("user_turns", 0) or 0)
+        state.ai_turns = int(snapshot.get("ai_turns", 0) or 0)
+        return state
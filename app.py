@@ -1,13 +1,30 @@
 import json
+import queue
 import random
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from models.main import db,User,InteractionTurn,ExperimentSession, Survey
-from ai.logic import assign_group, get_ai_response, get_experiment_condition
+import threading
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, stream_with_context
+from models.main import db,User,InteractionTurn,ExperimentSession, SessionEvent, Survey
+from models.unit_of_work import SendTurnUnitOfWork
+from ai.logic import (
+    analyze_message,
+    assign_group,
+    clip_user_message,
+    get_analysis_memo_stats,
+    get_experiment_condition,
+    get_selection_cache_stats,
+    load_session_state,
+    preference_analyzer,
+    prepare_ai_response,
+    stream_ai_response,
+)
+from ai.session_state import SessionState
 import uuid
 import os
+import config
 from datetime import datetime
 from flask_migrate import Migrate
-from utils.preference_analyzer import PreferenceAnalyzer
+from utils.deepseek_client import call_deepseek_with_products, get_llm_cache_stats, get_llm_metrics
+from utils.lexicon import LEXICON_VERSION
 
 app = Flask(
     __name__,
@@ -15,20 +32,27 @@ app = Flask(
     static_url_path='/static'  # 前端访问静态文件的前缀（必须和前端src一致）
 )
 
-# 配置数据库路径
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
+# 配置数据库路径（未配置 DATABASE_URL 时回退到本地 SQLite，便于本地压测）
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or config.SQLALCHEMY_DATABASE_URI
 # 解决PostgreSQL的SSL连接问题（Render托管PostgreSQL强制SSL）
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'connect_args': {'sslmode': 'require'}
-}
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith(('postgres', 'postgresql')):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'connect_args': {'sslmode': os.environ.get('DATABASE_SSLMODE', 'require')}
+    }
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.secret_key = 'thesis_secret_key'  # 用于加密session
 
+# 流式回复心跳间隔（秒）
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', '10'))
+
+# 请求体大小上限（字节），超过时 Flask 直接返回 413，不读入内存；单条发言的字符上限见 MAX_MESSAGE_CHARS
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_REQUEST_BYTES', str(64 * 1024)))
+
 db.init_app(app)
 migrate = Migrate(app, db)
 
-# 初始化分析器
-analyzer = PreferenceAnalyzer()
+# 偏好分析器：与回复计划共用同一个实例（带文本分析结果缓存）
+analyzer = preference_analyzer
 
 # 初始化数据库（第一次运行时自动创建文件）
 with app.app_context():
@@ -119,12 +143,39 @@ def chat_page():
     return render_template('chat.html')
 
 
-@app.route('/api/send', methods=['POST'])
-def api_send():
-    # A. 获取前端传来的数据
-    data = request.json
-    user_msg = data.get('msg')
-
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({'error': 'Message too long'}), 413
+
+
+# =========================
+# 发送一轮对话的公共步骤：同步 /api/send、/api/send_stream 与 asgi.py 的异步 /api/send 共用
+# read_user_message -> begin_send_turn（提交用户发言）-> (调用模型) -> commit_ai_turn
+# 每轮两个事务：用户发言在调用模型之前就已落库，模型超时、出错或 worker 被杀都不会丢失用户输入；
+# 代价是多一次提交，且 AI 回复未落库时该轮只有用户发言（下一轮复用同一个轮次序号，与出错时的旧行为一致）
+# =========================
+def read_user_message():
+    """
+    读取 /api/send 与 /api/send_stream 的发言：msg 必须是字符串，超长时截断（分析、落库、prompt 都用截断后的文本）
+    返回 (user_msg, None) 或 (None, 错误响应)
+    """
+    data = request.get_json(silent=True)
+    user_msg = data.get('msg') if isinstance(data, dict) else None
+    if not isinstance(user_msg, str):
+        return None, (jsonify({'error': 'Invalid message'}), 400)
+
+    clipped_msg, clipped = clip_user_message(user_msg)
+    if clipped:
+        app.logger.warning(f"用户发言过长（{len(user_msg)} 字），已截断为 {len(clipped_msg)} 字")
+    return clipped_msg, None
+
+
+def begin_send_turn(user_msg: str):
+    """
+    /api/send 与 /api/send_stream 共用的前半段：
+    读取会话 -> 计算偏好指标 -> 登记用户发言与偏好事件 -> 生成回复计划（不调用模型）-> 提交用户发言
+    返回 (turn_ctx, None) 或 (None, 错误响应)
+    """
     # B. 获取 Session 中的实验状态
     user_uuid = session.get('user_uuid')
     session_uuid = session.get('session_uuid')
@@ -132,34 +183,29 @@ def api_send():
 
     # 安全检查：如果 Session 过期了，报错
     if not all([user_uuid, session_uuid, group_id]):
-        return jsonify({'error': 'Session expired, please refresh'}), 400
+        return None, (jsonify({'error': 'Session expired, please refresh'}), 400)
 
-    # C. 计算当前是第几轮 (Turn Index)
-    # 逻辑：总记录数除以2 + 1。例如：0条记录->第1轮；2条记录->第2轮
-    total_msgs = InteractionTurn.query.filter_by(session_uuid=session_uuid).count()
-    current_turn_index = (total_msgs // 2) + 1
+    # C. 一次查询取回会话行 + 上一轮 user / ai 发言，并计算当前是第几轮 (Turn Index)
+    uow = SendTurnUnitOfWork(session_uuid).load()
+    current_turn_index = uow.next_turn_index
 
     # ===============================================================
     # D. [核心步骤] 计算动态偏好指标 (Thesis Metric Calculation)
     # ===============================================================
 
-    # 1. 计算当前文本的特征向量
-    current_vector = analyzer.compute_vector(user_msg)
-    focus_dim = analyzer.identify_focus(user_msg)
+    # 1. 一次性分析当前文本：偏好向量、关注维度、意图、需求槽位、结束 / 决策信号（回复计划直接复用）
+    features = analyze_message(user_msg, analyzer)
+    current_vector = features.preference_vector
+    focus_dim = features.focus
     drift_score = 0.0  # 默认漂移为0
     trajectory_type = 'exploration'
     purchase_intent = current_vector.get('decision_readiness', 0.0)
 
-    # 2. 获取上一轮用户发言 (用于计算对比)
-    # 注意：只找 sender='user' 的最近一条
-    last_user_turn = InteractionTurn.query.filter_by(
-        session_uuid=session_uuid,
-        sender='user'
-    ).order_by(InteractionTurn.turn_index.desc()).first()
+    # 2. 上一轮用户发言的偏好向量 (用于计算对比)
+    last_vector = uow.last_user_vector
 
     # 3. 如果有上一轮，计算 Drift (欧氏距离)
-    if last_user_turn and last_user_turn.preference_vector:
-        last_vector = last_user_turn.preference_vector
+    if last_vector:
         # SQLAlchemy JSON类型通常自动转Dict，但为了保险起见处理一下
         if isinstance(last_vector, str):
             try:
@@ -168,11 +214,11 @@ def api_send():
                 last_vector = {}
 
         drift_score = analyzer.calculate_drift(current_vector, last_vector)
-        trajectory_type = analyzer.identify_trajectory(current_vector, last_vector, current_turn_index)
+        trajectory_type = analyzer.identify_trajectory(current_vector, last_vector, current_turn_index, drift_score)
         purchase_intent = current_vector.get('decision_readiness', 0.0)  # 意愿分数
 
     # ===============================================================
-    # E. 存储 USER 发言 (包含偏好数据)
+    # E. 登记 USER 发言 (包含偏好数据) 与会话更新，生成回复计划后、调用模型前提交
     # ===============================================================
     user_turn = InteractionTurn(
         session_uuid=session_uuid,
@@ -187,86 +233,115 @@ def api_send():
         focus_dimension=focus_dim,
         trajectory_type=trajectory_type,
         purchase_intent_score=purchase_intent,
+        lexicon_version=LEXICON_VERSION,
 
         # AI 的字段留空
         ai_adaptability_level=None,
         ai_calibration_level=None
     )
-    db.session.add(user_turn)
-    db.session.commit()  # 立即提交，防止后续出错导致用户输入丢失
-    exp_session = ExperimentSession.query.filter_by(session_uuid=session_uuid).first()
-    if exp_session:
-        # 偏好演化链条
-        if exp_session.preference_evolution_chain is None:
-            exp_session.preference_evolution_chain = []
-        new_chain = list(exp_session.preference_evolution_chain)
-        new_chain.append({
-            'turn': current_turn_index,
-            'vector': current_vector,
-            'drift': drift_score,
-            'trajectory': trajectory_type
-        })
-        exp_session.preference_evolution_chain = new_chain
-        # 决策路径序列
-        if exp_session.decision_path is None:
-            exp_session.decision_path = []
-        previous_path = exp_session.decision_path
-        current_readiness = current_vector.get('decision_readiness', 0.0)
-        exp_session.decision_path = analyzer.track_decision_path(current_readiness, previous_path)
-        # 如果用户说出决策关键词，记录效率轮次
-        if any(k in user_msg.lower() for k in analyzer.decision_keywords):
-            exp_session.decision_efficiency_turns = current_turn_index
-        db.session.commit()   # 统一提交一次
+    uow.add_turn(user_turn)
 
-    # ===============================================================
-    # F. 调用 AI 逻辑 (Experiment Manipulation)
-    # ===============================================================
-    # 获取上一轮AI推荐过的商品
-    last_ai_turn = InteractionTurn.query.filter_by(
+    # 偏好演化链条 + 决策路径序列：追加一行事件
+    uow.add_event(SessionEvent(
         session_uuid=session_uuid,
-        sender='ai'
-    ).order_by(InteractionTurn.turn_index.desc()).first()
+        turn_index=current_turn_index,
+        preference_vector=current_vector,
+        preference_drift=drift_score,
+        trajectory_type=trajectory_type,
+        decision_stage=analyzer.decision_stage(current_vector.get('decision_readiness', 0.0))
+    ))
+    # 如果用户说出决策关键词，记录效率轮次
+    if features.is_decision:
+        uow.update_session(decision_efficiency_turns=current_turn_index)
 
-    previous_products = []
-    if last_ai_turn and last_ai_turn.recommended_products:
-        # 如果上一轮有推荐商品，提取出来
-        # 此时取出来的是 list[dict] 格式
-        previous_products = last_ai_turn.recommended_products
+    # ===============================================================
+    # F. 生成回复计划 (Experiment Manipulation)
+    # ===============================================================
+    # 上一轮AI推荐过的商品（list[dict] 格式）
+    previous_products = uow.last_ai_products
+
+    # 会话增量状态：从快照恢复，避免每轮回放整段历史
+    if uow.has_history:
+        session_state = load_session_state(session_uuid, uow.conversation_state, current_turn_index)
+    else:
+        session_state = SessionState()
+
+    turn_ctx = {
+        'uow': uow,
+        'user_uuid': user_uuid,
+        'session_uuid': session_uuid,
+        'turn_index': current_turn_index,
+        'session_state': session_state,
+    }
 
-    # 将 previous_products 传入 get_ai_response
     assigned_adapt, assigned_calib = get_experiment_condition(group_id)
-    ai_text, adapt_level, calib_level, recommended_products = get_ai_response(
-        user_msg=user_msg,
-        group_id=group_id,
-        current_turn=current_turn_index,
-        assigned_adaptivity=assigned_adapt,
-        assigned_calibration=assigned_calib,
-        session_uuid=session_uuid,
-        previous_recommended_products=previous_products
-    )
+    try:
+        turn_ctx['plan'] = prepare_ai_response(
+            user_msg=user_msg,
+            group_id=group_id,
+            current_turn=current_turn_index,
+            assigned_adaptivity=assigned_adapt,
+            assigned_calibration=assigned_calib,
+            session_uuid=session_uuid,
+            previous_recommended_products=previous_products,
+            session_state=session_state,
+            preference_vector=current_vector,
+            involvement=uow.assigned_involvement,
+            features=features
+        )
+    except Exception:
+        # 回复计划失败时本轮发言未必已合并进会话状态：只提交用户发言与偏好事件，
+        # 会话快照保持上一轮的内容（与回放重建时跳过未得到回复的发言一致）
+        uow.commit()
+        raise
+
+    # 回复计划已把本轮发言合并进会话状态，快照随用户发言一起提交
+    _commit_user_turn(turn_ctx)
+    return turn_ctx, None
+
+
+def _commit_user_turn(turn_ctx: dict):
+    """提交用户发言、偏好事件与会话更新（含快照）：在调用模型之前单独一个事务"""
+    uow = turn_ctx['uow']
+    if uow.session_found:
+        uow.update_session(conversation_state=turn_ctx['session_state'].to_dict())
+    uow.commit()
+
+
+def commit_ai_turn(turn_ctx: dict, ai_text: str):
+    """
+    G. 存储 AI 回复，与合并了本轮推荐的会话快照同一事务提交
+    返回前端需要的商品列表
+    """
+    plan = turn_ctx['plan']
+    uow = turn_ctx['uow']
+    recommended_products = plan['products']
 
-    # ===============================================================
-    # G. 存储 AI 回复
-    # ===============================================================
     ai_turn = InteractionTurn(
-        session_uuid=session_uuid,
-        user_uuid=user_uuid,
+        session_uuid=turn_ctx['session_uuid'],
+        user_uuid=turn_ctx['user_uuid'],
         sender='ai',
         content=ai_text,
-        turn_index=current_turn_index,
+        turn_index=turn_ctx['turn_index'],
         recommended_products=recommended_products,
 
         # 记录 AI 当时的实验状态 (方便做 ANOVA 分析)
-        ai_adaptability_level=adapt_level,
-        ai_calibration_level=calib_level,
+        ai_adaptability_level=plan['adapt_level'],
+        ai_calibration_level=plan['calib_level'],
+        catalog_version=plan.get('catalog_version'),
 
         # AI 没有偏好向量，留空
         preference_vector=None,
         preference_drift=None,
         focus_dimension=None
     )
-    db.session.add(ai_turn)
-    db.session.commit()
+    uow.add_turn(ai_turn)
+
+    session_state = turn_ctx['session_state']
+    session_state.apply_ai_turn(recommended_products)
+    if uow.session_found:
+        uow.update_session(conversation_state=session_state.to_dict())
+    uow.commit()
 
     # H. 构造返回前端的数据
     frontend_products = []
@@ -281,10 +356,123 @@ def api_send():
                 'headset_type': p.get('headset_type'),
                 'core_function': p.get('core_function') or ''
             })
+    return frontend_products
+
+
+@app.route('/api/send', methods=['POST'])
+def api_send():
+    # A. 获取前端传来的数据
+    user_msg, error_response = read_user_message()
+    if error_response:
+        return error_response
+
+    turn_ctx, error_response = begin_send_turn(user_msg)
+    if error_response:
+        return error_response
+
+    # 调用模型（无需调用时直接使用计划中的回复）
+    plan = turn_ctx['plan']
+    if plan['llm_request'] is None:
+        ai_text = plan['text']
+    else:
+        ai_text = call_deepseek_with_products(**plan['llm_request'])
+
+    frontend_products = commit_ai_turn(turn_ctx, ai_text)
 
     # J. 返回结果给前端
     return jsonify({'response': ai_text, 'products':frontend_products})
 
+
+def sse_event(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@app.route('/api/send_stream', methods=['POST'])
+def api_send_stream():
+    """
+    流式回复（Server-Sent Events）：
+    - event: token  -> {"text": 增量文本}
+    - event: done   -> {"response": 完整文本, "products": [...]}
+    - event: error  -> {"error": ...}
+    - 注释行 ": ping" 为心跳，防止代理在模型首 token 之前断开连接
+    用户发言先落库；完整回复只在流正常结束后写入 InteractionTurn，前端中途断开则不写入
+    """
+    user_msg, error_response = read_user_message()
+    if error_response:
+        return error_response
+
+    turn_ctx, error_response = begin_send_turn(user_msg)
+    if error_response:
+        return error_response
+
+    token_queue = queue.Queue()
+    cancelled = threading.Event()
+    end_marker = object()
+
+    def produce_tokens():
+        tokens = stream_ai_response(turn_ctx['plan'])
+        try:
+            for token in tokens:
+                if cancelled.is_set():
+                    break
+                token_queue.put(token)
+        except Exception as e:
+            token_queue.put(e)
+        finally:
+            tokens.close()  # 断开时关闭上游模型连接
+            token_queue.put(end_marker)
+
+    threading.Thread(target=produce_tokens, daemon=True).start()
+
+    def generate():
+        parts = []
+        completed = False
+        try:
+            while True:
+                try:
+                    item = token_queue.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+
+                if item is end_marker:
+                    break
+                if isinstance(item, Exception):
+                    app.logger.error(f"流式回复失败：{item}")
+                    yield sse_event('error', {'error': '生成回复失败，请稍后再试'})
+                    return
+                parts.append(item)
+                yield sse_event('token', {'text': item})
+
+            ai_text = ''.join(parts).strip()
+            frontend_products = commit_ai_turn(turn_ctx, ai_text)
+            completed = True
+            yield sse_event('done', {'response': ai_text, 'products': frontend_products})
+        finally:
+            # 前端断开时 WSGI 服务器会 close() 本生成器，通知生产线程停止
+            cancelled.set()
+            if not completed:
+                app.logger.info(f"流式回复未完成，会话 {turn_ctx['session_uuid']} 第 {turn_ctx['turn_index']} 轮 AI 回复未落库")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/stats')
+def api_stats():
+    """
+    运行指标（当前 worker 进程内的计数，多 worker 部署时各自独立）：
+    LLM 调用结果 / 重试 / 对冲 / 熔断状态 / 延迟分位数，以及各级缓存命中情况
+    """
+    return jsonify({
+        'llm': get_llm_metrics(),
+        'llm_cache': get_llm_cache_stats(),
+        'selection_cache': get_selection_cache_stats(),
+        'analysis_memo': get_analysis_memo_stats(),
+    })
+
 @app.route('/survey')
 def survey():
     """问卷页（从聊天结束跳转）"""
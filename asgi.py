@@ -0,0 +1,244 @@
+"""
+ASGI 入口（异步模式）：
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+- /api/send 与 /api/send_stream 走原生 async：读写数据库的短阶段放到线程池执行，
+  等待 DeepSeek（整段回复或逐个 token）时只挂起协程、不占线程，单进程即可同时服务数百个等待模型的会话。
+  两者即 ai.logic.get_ai_response 在异步模式下的替代，按 begin_send_turn -> 调用模型 -> commit_ai_turn 驱动一轮
+- 其余路由（页面、问卷等）通过 asgiref 的 WsgiToAsgi 交给原 Flask 应用。
+  WsgiToAsgi 在同一个共享线程里依次运行同步视图，流式接口若走这条路，一个长流会阻塞其他所有请求
+
+同步入口（gunicorn app:app）保持不变。
+"""
+import asyncio
+import io
+import json
+import logging
+from typing import Optional
+
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask import jsonify
+
+from ai.logic import astream_ai_response
+from app import SSE_HEARTBEAT_SECONDS, app, begin_send_turn, commit_ai_turn, read_user_message, sse_event
+from utils.deepseek_client import acall_deepseek_with_products, aclose_async_deepseek_client
+
+logger = logging.getLogger(__name__)
+
+wsgi_application = WsgiToAsgi(app)
+
+_SSE_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+]
+
+
+async def _read_body(receive, max_bytes: int = None) -> Optional[bytes]:
+    """读完整个请求体；超过 max_bytes（与同步入口的 MAX_CONTENT_LENGTH 一致）时返回 None，不再继续缓冲"""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _send_response(send, response) -> None:
+    """把 Flask Response 按 ASGI 协议发出"""
+    body = response.get_data()
+    headers = [
+        (key.lower().encode("latin1"), value.encode("latin1"))
+        for key, value in response.headers.items()
+        if key.lower() != "content-length"
+    ]
+    headers.append((b"content-length", str(len(body)).encode("latin1")))
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json_error(send, status: int, message: str) -> None:
+    body = json.dumps({"error": message}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("latin1"))],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _begin_turn(scope, receive, send) -> Optional[dict]:
+    """
+    /api/send 与 /api/send_stream 共用的第一阶段；请求无效或出错时已发出错误响应，返回 None
+    """
+    body = await _read_body(receive, app.config.get('MAX_CONTENT_LENGTH'))
+    if body is None:
+        await _send_json_error(send, 413, "Message too long")
+        return None
+    instance = WsgiToAsgiInstance(app)
+    instance.scope = scope
+    environ = instance.build_environ(scope, io.BytesIO(body))
+
+    # 1) 读会话 + 计算偏好指标 + 回复计划 + 提交用户发言（线程池，毫秒级）
+    def begin():
+        with app.request_context(environ):
+            user_msg, error_response = read_user_message()
+            if error_response:
+                return None, app.make_response(error_response)
+            turn_ctx, error_response = begin_send_turn(user_msg)
+            if error_response:
+                return None, app.make_response(error_response)
+            return turn_ctx, None
+
+    try:
+        turn_ctx, error_response = await asyncio.to_thread(begin)
+    except Exception:
+        logger.exception("%s 处理失败", scope["path"])
+        await _send_json_error(send, 500, "Internal Server Error")
+        return None
+    if error_response is not None:
+        await _send_response(send, error_response)
+        return None
+    return turn_ctx
+
+
+async def _api_send(scope, receive, send) -> None:
+    turn_ctx = await _begin_turn(scope, receive, send)
+    if turn_ctx is None:
+        return
+
+    # 2) 调用模型：纯 await，不占线程
+    plan = turn_ctx['plan']
+    try:
+        if plan['llm_request'] is None:
+            ai_text = plan['text']
+        else:
+            ai_text = await acall_deepseek_with_products(**plan['llm_request'])
+    except Exception:
+        logger.exception("/api/send 生成回复失败")
+        await _send_json_error(send, 500, "Internal Server Error")
+        return
+
+    # 3) AI 回复 + 会话快照提交（线程池；用户发言已在 begin_send_turn 中提交）
+    def finish():
+        with app.app_context():
+            frontend_products = commit_ai_turn(turn_ctx, ai_text)
+            return jsonify({'response': ai_text, 'products': frontend_products})
+
+    try:
+        response = await asyncio.to_thread(finish)
+    except Exception:
+        logger.exception("/api/send 落库失败")
+        await _send_json_error(send, 500, "Internal Server Error")
+        return
+    await _send_response(send, response)
+
+
+async def _api_send_stream(scope, receive, send) -> None:
+    """
+    app.py 中 api_send_stream 的原生 async 版本，事件格式与心跳相同；
+    前端断开（http.disconnect）时关闭上游模型连接，AI 回复不落库
+    """
+    turn_ctx = await _begin_turn(scope, receive, send)
+    if turn_ctx is None:
+        return
+
+    await send({"type": "http.response.start", "status": 200, "headers": _SSE_HEADERS})
+
+    async def emit(text: str) -> None:
+        await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+    # 2) 转发模型输出：同时等下一个 token 和断开消息（请求体已读完，receive 只会再收到 http.disconnect）
+    tokens = astream_ai_response(turn_ctx['plan'])
+    disconnect = asyncio.ensure_future(receive())
+    next_token = None
+    parts = []
+    completed = False
+    try:
+        while True:
+            if next_token is None:
+                next_token = asyncio.ensure_future(tokens.__anext__())
+            done, _ = await asyncio.wait(
+                {next_token, disconnect}, timeout=SSE_HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnect in done:
+                return
+            if not done:
+                await emit(": ping\n\n")
+                continue
+
+            task, next_token = next_token, None
+            try:
+                token = task.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                logger.exception("/api/send_stream 流式回复失败")
+                await emit(sse_event('error', {'error': '生成回复失败，请稍后再试'}))
+                return
+            parts.append(token)
+            await emit(sse_event('token', {'text': token}))
+
+        # 3) AI 回复 + 会话快照提交（线程池）
+        ai_text = ''.join(parts).strip()
+
+        def finish():
+            with app.app_context():
+                return commit_ai_turn(turn_ctx, ai_text)
+
+        try:
+            frontend_products = await asyncio.to_thread(finish)
+        except Exception:
+            logger.exception("/api/send_stream 落库失败")
+            await emit(sse_event('error', {'error': '生成回复失败，请稍后再试'}))
+            return
+        completed = True
+        await emit(sse_event('done', {'response': ai_text, 'products': frontend_products}))
+    finally:
+        # 先等被取消的 __anext__ 结束，生成器不在运行中才能 aclose（关闭上游 HTTP 连接）
+        if next_token is not None and not next_token.done():
+            next_token.cancel()
+            await asyncio.wait({next_token})
+        await tokens.aclose()
+        if not completed:
+            logger.info(
+                "流式回复未完成，会话 %s 第 %s 轮 AI 回复未落库", turn_ctx['session_uuid'], turn_ctx['turn_index']
+            )
+        if not disconnect.done():
+            disconnect.cancel()
+            await send({"type": "http.response.body", "body": b""})
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await aclose_async_deepseek_client()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    if scope["type"] == "http" and scope["method"] == "POST":
+        if scope["path"] == "/api/send":
+            await _api_send(scope, receive, send)
+            return
+        if scope["path"] == "/api/send_stream":
+            await _api_send_stream(scope, receive, send)
+            return
+
+    await wsgi_application(scope, receive, send)
@@ -0,0 +1,81 @@
+"""
+文本分析结果缓存基准：模拟多名被试的会话，每轮
+- analyze_message 分析本轮发言（常见说法在被试之间大量重复）
+- 快照缺失时回放本轮之前的全部用户发言（_build_intent_details，逐轮 O(n²)）
+对比不缓存 / 缓存两种情况下的总耗时、每轮延迟和命中率，并校验两次运行的分析结果完全一致
+
+用法：
+    python benchmarks/bench_analysis_memo.py
+    python benchmarks/bench_analysis_memo.py --participants 500 --turns 12 --entries 2048
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from ai import logic  # noqa: E402
+from utils.memo_cache import MemoCache  # noqa: E402
+from bench_product_matching import percentile  # noqa: E402
+
+# 常见说法（被试之间高度重复）与个性化补充
+STOCK_PHRASES = [
+    "有什么推荐的吗", "就买这个吧", "可以了", "哪个好", "便宜一点的", "预算500以内",
+    "降噪好一点的", "通勤用", "打游戏用的", "有没有索尼的", "对比一下这两款", "续航长一点",
+]
+DETAILS = ["头戴式", "入耳式", "预算{}左右", "{}以内", "不超过{}", "跑步用", "开会用", "苹果", "华为", "音质好"]
+
+
+def conversations(rng: random.Random, participants: int, turns: int):
+    for _ in range(participants):
+        script = []
+        for _ in range(turns):
+            if rng.random() < 0.6:
+                script.append(rng.choice(STOCK_PHRASES))
+            else:
+                script.append("我想要" + rng.choice(DETAILS).format(rng.choice([300, 500, 800, 1000, 1500])))
+        yield script
+
+
+def run(scripts, entries: int):
+    memo = MemoCache(max_entries=entries)
+    logic.analysis_memo = memo
+    logic.preference_analyzer.memo = memo
+
+    latencies, results = [], []
+    started = time.perf_counter()
+    for script in scripts:
+        for i, message in enumerate(script):
+            t0 = time.perf_counter()
+            features = logic.analyze_message(message)
+            replayed = [logic._build_intent_details(logic._normalize_text(m)) for m in script[:i]]
+            latencies.append((time.perf_counter() - t0) * 1000)
+            results.append((features.preference_vector, features.intent, features.intent_details, replayed[-1:]))
+    return (time.perf_counter() - started) * 1000, latencies, results, memo.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本分析结果缓存基准")
+    parser.add_argument("--participants", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--entries", type=int, default=8192)
+    args = parser.parse_args()
+
+    scripts = list(conversations(random.Random(0), args.participants, args.turns))
+    baseline_ms, baseline_lat, baseline, _ = run(scripts, 0)
+    cached_ms, cached_lat, cached, stats = run(scripts, args.entries)
+
+    print(f"participants={args.participants} turns={args.turns} entries={args.entries}")
+    print(f"{'mode':>9} {'p50_ms':>8} {'p95_ms':>8} {'total_ms':>9}")
+    for mode, total, lat in (("uncached", baseline_ms, baseline_lat), ("cached", cached_ms, cached_lat)):
+        print(f"{mode:>9} {statistics.median(lat):>8.3f} {percentile(lat, 0.95):>8.3f} {total:>9.1f}")
+    print(f"hit_rate={stats['hit_rate']:.2%} entries={stats['entries']} evictions={stats['evictions']} "
+          f"identical={baseline == cached}")
+
+
+if __name__ == "__main__":
+    main()
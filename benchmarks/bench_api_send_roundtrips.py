@@ -0,0 +1,109 @@
+"""
+统计 /api/send 每次请求的数据库往返次数（SQL 语句 + COMMIT / ROLLBACK）
+
+用法：
+    python benchmarks/bench_api_send_roundtrips.py
+    python benchmarks/bench_api_send_roundtrips.py --turns 10 --group D
+
+选品阶段（ai.logic._plan_response，不访问数据库）替换为固定文本回复，
+其余逻辑走真实的 app.api_send
+
+当前每轮：6 条语句（读会话 1 + 用户发言 / 偏好事件 / 会话更新 3 + AI 回复 / 会话快照 2）
++ 2 次 COMMIT（用户发言在调用模型前单独提交）+ 1 次 ROLLBACK（结束读事务）= 9
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+_DB_FILE = os.path.join(tempfile.mkdtemp(), "bench_roundtrips.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_DB_FILE}")
+os.environ.setdefault("DEEPSEEK_API_KEY", "bench-placeholder")
+
+from sqlalchemy import event  # noqa: E402
+
+import ai.logic  # noqa: E402
+from app import app, db  # noqa: E402
+
+
+MESSAGES = [
+    "你好，想买个耳机",
+    "预算500以内",
+    "通勤用，最好降噪",
+    "入耳式的吧",
+    "有没有小米的",
+    "音质怎么样",
+    "续航多久",
+    "再看看别的",
+    "对比一下这几款",
+    "就买这个",
+]
+
+
+class RoundTripCounter:
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+        self.rollbacks = 0
+
+    def reset(self):
+        self.statements = self.commits = self.rollbacks = 0
+
+    @property
+    def total(self):
+        return self.statements + self.commits + self.rollbacks
+
+    def install(self, engine):
+        @event.listens_for(engine, "before_cursor_execute")
+        def _on_execute(conn, cursor, statement, parameters, context, executemany):
+            self.statements += 1
+
+        @event.listens_for(engine, "commit")
+        def _on_commit(conn):
+            self.commits += 1
+
+        @event.listens_for(engine, "rollback")
+        def _on_rollback(conn):
+            self.rollbacks += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/api/send 数据库往返次数统计")
+    parser.add_argument("--turns", type=int, default=len(MESSAGES))
+    parser.add_argument("--group", default="D", choices=["A", "B", "C", "D"])
+    args = parser.parse_args()
+
+    ai.logic._plan_response = lambda **kwargs: {
+        "text": "为你推荐以下几款耳机。", "llm_request": None, "products": []
+    }
+
+    counter = RoundTripCounter()
+    with app.app_context():
+        counter.install(db.engine)
+
+    client = app.test_client()
+    client.get("/")
+    with client.session_transaction() as sess:
+        sess["group_id"] = args.group
+
+    print(f"{'turn':>4} {'sql':>5} {'commit':>7} {'rollback':>9} {'total':>6}")
+    totals = []
+    for i in range(args.turns):
+        msg = MESSAGES[i % len(MESSAGES)]
+        counter.reset()
+        resp = client.post("/api/send", json={"msg": msg})
+        if resp.status_code != 200:
+            print(f"turn {i + 1} 失败：{resp.status_code} {resp.get_data(as_text=True)[:200]}")
+            break
+        totals.append(counter.total)
+        print(f"{i + 1:>4} {counter.statements:>5} {counter.commits:>7} {counter.rollbacks:>9} {counter.total:>6}")
+
+    if totals:
+        print(f"\n平均每次请求数据库往返：{sum(totals) / len(totals):.1f}")
+
+
+if __name__ == "__main__":
+    main()
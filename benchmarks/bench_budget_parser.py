@@ -0,0 +1,161 @@
+"""
+预算解析基准：对比原先逐条 re.search 的九个模式（legacy）与 utils.price_parser 的单个预编译正则
+- 正确性：常见预算写法（含区间、中文数字、量级后缀）逐条校验，不符直接报错
+- 常规消息：不同长度的随机消息每条耗时
+- 对抗输入：长数字串、重复关键词、长空白、重复区间分隔符、重复中文数字等，
+  长度每放大 10 倍耗时也应约放大 10 倍（超过 --max-growth 倍视为非线性，报错）
+
+用法：
+    python benchmarks/bench_budget_parser.py
+    python benchmarks/bench_budget_parser.py --sizes 1000 10000 100000 --legacy-max 10000 --max-growth 20
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from utils.price_parser import parse_budget  # noqa: E402
+
+LEGACY_PATTERNS = [
+    r"预算\s*(\d+)",
+    r"(\d+)\s*元?\s*以内",
+    r"(\d+)\s*元?\s*以下",
+    r"(\d+)\s*块?\s*以内",
+    r"不超过\s*(\d+)",
+    r"低于\s*(\d+)",
+    r"小于\s*(\d+)",
+    r"控制在\s*(\d+)",
+    r"(\d+)\s*左右",
+]
+
+
+def legacy_budget(text: str):
+    """原 ai.logic._extract_budget：按顺序逐条 re.search，第一个命中的模式生效"""
+    if not text:
+        return None
+    for pattern in LEGACY_PATTERNS:
+        m = re.search(pattern, text)
+        if m:
+            return int(m.group(1))
+    return None
+
+
+EXPECTED = {
+    "预算800": 800,
+    "500以内": 500,
+    "1000元以下": 1000,
+    "300块以内": 300,
+    "300块左右": 300,
+    "不超过2000": 2000,
+    "低于 500": 500,
+    "控制在1500左右": 1500,
+    "预算500-1000": 1000,
+    "500到1000元以内": 1000,
+    "预算两千": 2000,
+    "一千五左右": 1500,
+    "预算1.5k": 1500,
+    "1.2万以内": 12000,
+    "预算三千五百": 3500,
+    "一百零五以内": 105,
+    "一万二以下": 12000,
+    "1-2千以内": 2000,
+    "300以下 500块以内": 300,
+    "预算千万别太贵": None,
+    "一般般，十分想要降噪": None,
+    "我想要个降噪耳机": None,
+    "": None,
+}
+
+WORDS = ["预算", "以内", "以下", "左右", "不超过", "元", "块", "降噪", "耳机", "我想要", "，", "300", "800", "两千", "1.5k"]
+FILL = "的了我想要一个好耳机平时用吧呢吗"
+
+
+def random_message(rng: random.Random, length: int) -> str:
+    parts, size = [], 0
+    while size < length:
+        piece = rng.choice(WORDS) if rng.random() < 0.1 else rng.choice(FILL)
+        parts.append(piece)
+        size += len(piece)
+    return "".join(parts)[:length]
+
+
+ADVERSARIAL = {
+    "digits": lambda n: "1" * n,
+    "budget_keyword": lambda n: "预算" * (n // 2),
+    "digit_space": lambda n: "1 " * (n // 2),
+    "range_dash": lambda n: "1-" * (n // 2),
+    "long_whitespace": lambda n: "预算" + " " * n + "1" + " " * n + "x",
+    "chinese_number": lambda n: "一千" * (n // 2),
+    "suffix_only": lambda n: "以内" * (n // 2),
+    "digits_then_space": lambda n: "1" * (n // 2) + " " * (n // 2) + "元",
+    "mixed": lambda n: ("1.5k-两千 块 以" * n)[:n],
+}
+
+
+def best_seconds(fn, text: str, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def check_expected():
+    failures = [(text, parse_budget(text), want) for text, want in EXPECTED.items() if parse_budget(text) != want]
+    if failures:
+        raise AssertionError(f"预算解析结果不符: {failures}")
+    print(f"expected cases: {len(EXPECTED)} ok")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预算解析基准")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--legacy-max", type=int, default=1000, help="legacy 只跑到这个长度（对抗输入下为平方级）")
+    parser.add_argument("--max-growth", type=float, default=30.0, help="长度放大 10 倍时允许的最大耗时倍数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    check_expected()
+
+    rng = random.Random(0)
+    print(f"{'length':>7} {'legacy_us':>10} {'parser_us':>10}")
+    for length in args.lengths:
+        messages = [random_message(rng, length) for _ in range(args.messages)]
+        timings = []
+        for fn in (legacy_budget, parse_budget):
+            started = time.perf_counter()
+            for m in messages:
+                fn(m)
+            timings.append((time.perf_counter() - started) * 1e6 / len(messages))
+        print(f"{length:>7} {timings[0]:>10.2f} {timings[1]:>10.2f}")
+
+    print(f"{'input':>18} {'size':>7} {'legacy_ms':>10} {'parser_ms':>10} {'growth':>7}")
+    nonlinear = []
+    for name, build in ADVERSARIAL.items():
+        previous = None
+        for size in args.sizes:
+            text = build(size)
+            legacy_ms = best_seconds(legacy_budget, text, args.repeat) * 1000 if size <= args.legacy_max else None
+            parser_ms = best_seconds(parse_budget, text, args.repeat) * 1000
+            growth = parser_ms / previous[1] * previous[0] / size * 10 if previous else None
+            if growth is not None and growth > args.max_growth:
+                nonlinear.append((name, size, round(growth, 1)))
+            previous = (size, parser_ms)
+            print(f"{name:>18} {size:>7} {legacy_ms if legacy_ms is not None else float('nan'):>10.3f} "
+                  f"{parser_ms:>10.3f} {growth if growth is not None else float('nan'):>7.1f}")
+    if nonlinear:
+        raise AssertionError(f"耗时增长超出线性范围: {nonlinear}")
+    print("adversarial inputs: linear")
+
+
+if __name__ == "__main__":
+    main()
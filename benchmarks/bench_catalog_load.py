@@ -0,0 +1,94 @@
+"""
+商品目录加载基准：冷启动（解析 CSV + 向量化标准化 + 写列缓存）对比读缓存（内存映射 .npy 列）
+每种方式在独立子进程中测量，模拟 worker 启动；输出耗时和 RSS 增量
+
+用法：
+    python benchmarks/bench_catalog_load.py                  # 10 万行
+    python benchmarks/bench_catalog_load.py --rows 1000000 --repeat 3
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from utils import product_loader  # noqa: E402
+from utils.catalog_cache import CatalogCache  # noqa: E402
+from bench_product_sql import write_feed  # noqa: E402
+
+
+def rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def child(mode: str, feed: str, cache_dir: str):
+    """子进程：与 CatalogManager 相同，读文件算哈希后构建目录"""
+    before = rss_kb()
+    started = time.perf_counter()
+    with open(feed, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    cache = CatalogCache(cache_dir)
+    columns = cache.load(digest) if mode == "cached" else None
+    if columns is None:
+        columns = product_loader._read_columns(data)
+        cache.save(digest, columns)
+    catalog = product_loader._catalog_from_columns(columns)
+
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"seconds": elapsed, "rss_delta_kb": rss_kb() - before, "count": len(catalog)}))
+
+
+def run(mode: str, feed: str, cache_dir: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, "--feed", feed, "--cache", cache_dir],
+        capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    return json.loads(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商品目录冷启动 / 读缓存加载基准")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", choices=["cold", "cached"])
+    parser.add_argument("--feed")
+    parser.add_argument("--cache")
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.feed, args.cache)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        feed = os.path.join(tmp, "feed.csv")
+        write_feed(feed, args.rows)
+        print(f"rows={args.rows} csv={os.path.getsize(feed) / 1e6:.1f}MB repeat={args.repeat}")
+        print(f"{'mode':>7} {'seconds_p50':>12} {'rss_delta_MB':>13}")
+
+        for mode in ("cold", "cached"):
+            results = []
+            for i in range(args.repeat):
+                # 冷启动每次用新的缓存目录；读缓存复用第一次冷启动写好的缓存
+                cache_dir = os.path.join(tmp, f"cache_{i}") if mode == "cold" else os.path.join(tmp, "cache_0")
+                results.append(run(mode, feed, cache_dir))
+            print(
+                f"{mode:>7} {statistics.median(r['seconds'] for r in results):>12.3f} "
+                f"{statistics.median(r['rss_delta_kb'] for r in results) / 1e3:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+超长输入基准：一条用户发言从 1k 放大到 1M 字时单轮文本分析的耗时
+- unbounded：不截断直接分析整段文本（引入 MAX_MESSAGE_CHARS 之前的行为）
+- clipped：analyze_message + 历史回放用的 _build_intent_details，发言先按 MAX_MESSAGE_CHARS 截断
+关闭文本分析结果缓存，测的是实际分析耗时；clipped 在超过上限后应基本持平，
+超过 --max-ratio 倍于上限长度时的耗时视为无界，报错
+
+用法：
+    python benchmarks/bench_input_limits.py
+    python benchmarks/bench_input_limits.py --sizes 1000 100000 1000000 --max-ratio 3
+"""
+import argparse
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from ai import logic  # noqa: E402
+from utils.memo_cache import MemoCache  # noqa: E402
+
+# 病态输入：关键词密集、长数字串、长空白、重复预算表达式
+PATHOLOGICAL = {
+    "keywords": lambda n: ("降噪入耳式索尼预算以内就买对比" * n)[:n],
+    "digits": lambda n: "预算" + "9" * n,
+    "whitespace": lambda n: "预算" + " " * n + "1",
+    "budgets": lambda n: ("500-1000以内 " * n)[:n],
+}
+
+
+def best_ms(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def clipped(message: str):
+    features = logic.analyze_message(message)
+    logic._build_intent_details(message)
+    return features
+
+
+def unbounded(message: str):
+    text = (message or "").strip().lower()
+    return logic._compute_features(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="超长输入基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--unbounded-max", type=int, default=100000, help="unbounded 只跑到这个长度")
+    parser.add_argument("--max-ratio", type=float, default=5.0,
+                        help="任意长度的 clipped 耗时不得超过上限长度耗时的这么多倍")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logic.analysis_memo = MemoCache(max_entries=0)
+    logic.preference_analyzer.memo = logic.analysis_memo
+    limit = logic.MAX_MESSAGE_CHARS
+
+    print(f"MAX_MESSAGE_CHARS={limit}")
+    print(f"{'input':>11} {'size':>8} {'unbounded_ms':>13} {'clipped_ms':>11}")
+    unbounded_inputs = []
+    for name, build in PATHOLOGICAL.items():
+        reference = best_ms(lambda: clipped(build(limit)), args.repeat)
+        for size in args.sizes:
+            message = build(size)
+            unbounded_ms = best_ms(lambda: unbounded(message), args.repeat) if size <= args.unbounded_max else None
+            clipped_ms = best_ms(lambda: clipped(message), args.repeat)
+            if limit > 0 and clipped_ms > reference * args.max_ratio:
+                unbounded_inputs.append((name, size, round(clipped_ms, 3)))
+            print(f"{name:>11} {size:>8} {unbounded_ms if unbounded_ms is not None else float('nan'):>13.3f} "
+                  f"{clipped_ms:>11.3f}")
+    if unbounded_inputs:
+        raise AssertionError(f"截断后单轮分析耗时仍随输入增长: {unbounded_inputs}")
+    print("per-turn analysis cost: bounded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+关键词匹配基准：对比逐个关键词子串查找（原先 any(k in text) 的做法）与 Aho-Corasick 自动机单遍扫描，
+在不同消息长度、不同词表规模（实际词表 + 随机扩充的合成关键词）下每条消息的耗时，
+以及一条消息完整文本分析（偏好向量 + 关注维度 + 需求抽取 + 意图 + 停止判断）的耗时
+
+用法：
+    python benchmarks/bench_keyword_matching.py
+    python benchmarks/bench_keyword_matching.py --lengths 20 200 2000 --extra 0 2000 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from utils import lexicon  # noqa: E402
+from utils.keyword_matcher import KeywordMatcher  # noqa: E402
+from utils.preference_analyzer import PreferenceAnalyzer  # noqa: E402
+from ai import logic  # noqa: E402
+
+# 常用汉字片段，拼接成消息和合成关键词
+_CHARS = "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会家可下而过天去能对小多然于心学么之都好看起发当没成只如事把还用第样道想作种开美总从无情己面最女但现前些所同日手又行意动方期它头经长儿回位分爱老因很给名法间斯知世什两次使身者被高已亲其进此话常与活正感"
+
+
+def random_keywords(rng: random.Random, n: int):
+    return ["".join(rng.choice(_CHARS) for _ in range(rng.randint(2, 4))) for _ in range(n)]
+
+
+def random_message(rng: random.Random, length: int, words):
+    """随机汉字中按约 1/10 的比例插入真实关键词"""
+    parts, size = [], 0
+    while size < length:
+        piece = rng.choice(words) if rng.random() < 0.1 else rng.choice(_CHARS)
+        parts.append(piece)
+        size += len(piece)
+    return "".join(parts)[:length]
+
+
+def naive_scan(text: str, lexicons):
+    """旧做法：每个词表逐个关键词子串查找"""
+    text = text.lower()
+    return {category: [w[0] if isinstance(w, tuple) else w for w in words
+                       if (w[0] if isinstance(w, tuple) else w) in text]
+            for category, words in lexicons.items()}
+
+
+def per_message_us(fn, messages, repeat: int = 3) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for m in messages:
+            fn(m)
+    return (time.perf_counter() - started) * 1e6 / (repeat * len(messages))
+
+
+def full_analysis(analyzer: PreferenceAnalyzer, message: str):
+    """一次 /api/send 里对用户消息做的全部分析，共用一次扫描结果"""
+    hits = lexicon.scan_keywords(message)
+    analyzer.compute_vector(hits)
+    analyzer.identify_focus(hits)
+    hits.has("decision")
+    logic._build_intent_details(message, hits)
+    logic._detect_user_intent(hits)
+    logic._is_explicit_finish_intent(hits)
+    logic._is_need_clear_enough({}, 0, hits, {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="关键词匹配基准")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[20, 100, 500, 2000])
+    parser.add_argument("--extra", type=int, nargs="+", default=[0, 1000, 10000],
+                        help="在实际词表之外追加的合成关键词数")
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    real_words = [w[0] if isinstance(w, tuple) else w for words in lexicon.LEXICONS.values() for w in words]
+
+    print(f"{'keywords':>9} {'build_ms':>9} {'length':>7} {'naive_us':>9} {'automaton_us':>13}")
+    for extra in args.extra:
+        lexicons = dict(lexicon.LEXICONS)
+        if extra:
+            lexicons["synthetic"] = random_keywords(rng, extra)
+        started = time.perf_counter()
+        matcher = KeywordMatcher(lexicons)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        for length in args.lengths:
+            messages = [random_message(rng, length, real_words) for _ in range(args.messages)]
+            naive_us = per_message_us(lambda m: naive_scan(m, lexicons), messages)
+            automaton_us = per_message_us(lambda m: matcher.scan(m.lower()), messages)
+            print(f"{len(matcher.patterns):>9} {build_ms:>9.1f} {length:>7} {naive_us:>9.1f} {automaton_us:>13.1f}")
+
+    analyzer = PreferenceAnalyzer()
+    messages = [random_message(rng, rng.randint(10, 60), real_words) for _ in range(args.messages)]
+    print(f"full analysis per message (10-60 chars): {per_message_us(lambda m: full_analysis(analyzer, m), messages):.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+单条消息分析基准：一次 /api/send 中对用户消息做的全部文本分析
+- separate：各环节各自拿原文分析（偏好向量、关注维度、轨迹里再算一次关注维度和漂移、
+  需求槽位、意图、结束 / 停止判断、决策关键词），即引入 MessageFeatures 之前的调用方式
+- features：analyze_message 一次算出 MessageFeatures，后续环节直接取字段
+并校验两种方式得到的结果一致（关闭文本分析结果缓存，测的是实际分析耗时，缓存见 bench_analysis_memo.py）
+
+用法：
+    python benchmarks/bench_message_features.py
+    python benchmarks/bench_message_features.py --messages 5000 --lengths 20 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from ai import logic  # noqa: E402
+from utils.memo_cache import MemoCache  # noqa: E402
+from utils.preference_analyzer import PreferenceAnalyzer  # noqa: E402
+
+WORDS = ["降噪", "入耳式", "头戴", "索尼", "sony", "便宜", "预算", "以内", "就买", "对比", "哪个好",
+         "通勤", "跑步", "有什么", "推荐", "音质", "续航", "蓝牙", "可以了", "800"]
+FILL = "的了我想要一个好耳机平时用吧呢吗，。"
+
+
+def random_message(rng: random.Random, length: int) -> str:
+    parts, size = [], 0
+    while size < length:
+        piece = rng.choice(WORDS) if rng.random() < 0.15 else rng.choice(FILL)
+        parts.append(piece)
+        size += len(piece)
+    return "".join(parts)
+
+
+def separate(analyzer: PreferenceAnalyzer, message: str, last_vector: dict):
+    vector = analyzer.compute_vector(message)
+    focus = analyzer.identify_focus(message)
+    analyzer.identify_focus("")  # 轨迹识别里多算的一次关注维度
+    drift = analyzer.calculate_drift(vector, last_vector)
+    trajectory = analyzer.identify_trajectory(vector, last_vector, 3)
+    is_decision = any(k in message.lower() for k in analyzer.decision_keywords)
+    details = logic._build_intent_details(message)
+    intent = logic._detect_user_intent(message)
+    is_finish = logic._is_explicit_finish_intent(message)
+    logic._is_need_clear_enough({}, 0, message, {})
+    return vector, focus, drift, trajectory, is_decision, details, intent, is_finish
+
+
+def with_features(analyzer: PreferenceAnalyzer, message: str, last_vector: dict):
+    features = logic.analyze_message(message, analyzer)
+    vector = features.preference_vector
+    drift = analyzer.calculate_drift(vector, last_vector)
+    trajectory = analyzer.identify_trajectory(vector, last_vector, 3, drift)
+    logic._is_need_clear_enough({}, 0, features.keyword_hits, {})
+    return (vector, features.focus, drift, trajectory, features.is_decision,
+            features.intent_details, features.intent, features.is_finish)
+
+
+def per_message_us(fn, analyzer, messages, last_vector, repeat: int = 5) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for m in messages:
+            fn(analyzer, m, last_vector)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6 / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单条消息分析基准")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[20, 60, 200])
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    logic.analysis_memo = MemoCache(max_entries=0)
+    logic.preference_analyzer.memo = logic.analysis_memo
+
+    rng = random.Random(0)
+    analyzer = PreferenceAnalyzer()
+    last_vector = analyzer.compute_vector("我想要一个降噪的耳机，预算800以内")
+
+    print(f"{'length':>7} {'separate_us':>12} {'features_us':>12} {'identical':>10}")
+    for length in args.lengths:
+        messages = [random_message(rng, length) for _ in range(args.messages)]
+        identical = all(
+            separate(analyzer, m, last_vector) == with_features(analyzer, m, last_vector) for m in messages
+        )
+        separate_us = per_message_us(separate, analyzer, messages, last_vector)
+        features_us = per_message_us(with_features, analyzer, messages, last_vector)
+        print(f"{length:>7} {separate_us:>12.1f} {features_us:>12.1f} {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+历史偏好指标重算基准：在临时 SQLite 库里生成若干会话的用户发言和偏好事件，对比
+- replay：逐会话逐轮回放（analyze_message + calculate_drift + identify_trajectory），每条发言单独 UPDATE
+- recompute：utils.preference_recompute（按会话分页、漂移 / 轨迹整块向量化、批量 UPDATE，可选进程池）
+并校验两种方式写回的 interaction_turns / session_events 完全一致（漂移按浮点逐位比较）
+
+用法：
+    python benchmarks/bench_preference_recompute.py
+    python benchmarks/bench_preference_recompute.py --sessions 2000 --turns 12 --workers 4
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from sqlalchemy import create_engine, insert, select, update  # noqa: E402
+
+from ai.logic import analysis_memo, analyze_message, preference_analyzer  # noqa: E402
+from models.main import InteractionTurn, SessionEvent, db  # noqa: E402
+from utils.preference_recompute import recompute_preferences  # noqa: E402
+
+TURNS = InteractionTurn.__table__
+EVENTS = SessionEvent.__table__
+
+PHRASES = [
+    "有什么推荐的吗", "就买这个吧", "可以了", "哪个好", "便宜一点的", "预算500以内", "降噪好一点的",
+    "通勤用", "打游戏用的", "有没有索尼的", "对比一下这两款", "续航长一点", "头戴式的", "入耳式 华为",
+    "跑步用 运动 防水", "性价比高的 小米", "苹果和索尼哪个好", "高端 旗舰 音质", "再看看别的", "考虑一下",
+]
+
+
+def build_db(path: str, sessions: int, turns: int, seed: int = 0) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine, tables=[TURNS, EVENTS])
+    rng = random.Random(seed)
+    turn_rows, event_rows = [], []
+    for s in range(sessions):
+        session_uuid = f"s{s:06d}"
+        for t in range(1, turns + 1):
+            content = " ".join(rng.choice(PHRASES) for _ in range(rng.randint(1, 3)))
+            turn_rows.append({"session_uuid": session_uuid, "sender": "user", "content": content, "turn_index": t})
+            turn_rows.append({"session_uuid": session_uuid, "sender": "ai", "content": "好的", "turn_index": t})
+            event_rows.append({"session_uuid": session_uuid, "turn_index": t})
+    with engine.begin() as conn:
+        conn.execute(insert(TURNS), turn_rows)
+        conn.execute(insert(EVENTS), event_rows)
+    engine.dispose()
+
+
+def replay(engine) -> int:
+    """旧做法：逐会话逐轮回放，每条发言两次单行 UPDATE"""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(TURNS.c.id, TURNS.c.session_uuid, TURNS.c.turn_index, TURNS.c.content)
+            .where(TURNS.c.sender == "user")
+            .order_by(TURNS.c.session_uuid, TURNS.c.turn_index, TURNS.c.id)
+        ).all()
+    last_session, last_vector = None, None
+    with engine.begin() as conn:
+        for row in rows:
+            features = analyze_message(row.content or "", preference_analyzer)
+            vector = json.loads(json.dumps(features.preference_vector))
+            if row.session_uuid != last_session:
+                last_vector = None
+            drift, trajectory = 0.0, "exploration"
+            if last_vector:
+                drift = preference_analyzer.calculate_drift(vector, last_vector)
+                trajectory = preference_analyzer.identify_trajectory(vector, last_vector, row.turn_index, drift)
+            readiness = vector["decision_readiness"]
+            conn.execute(update(TURNS).where(TURNS.c.id == row.id).values(
+                preference_vector=vector, preference_drift=drift, focus_dimension=features.focus,
+                trajectory_type=trajectory, purchase_intent_score=readiness))
+            conn.execute(update(EVENTS).where(
+                EVENTS.c.session_uuid == row.session_uuid, EVENTS.c.turn_index == row.turn_index
+            ).values(preference_vector=vector, preference_drift=drift, trajectory_type=trajectory,
+                     decision_stage=preference_analyzer.decision_stage(readiness)))
+            last_session, last_vector = row.session_uuid, vector
+    return len(rows)
+
+
+def snapshot(engine):
+    with engine.connect() as conn:
+        turns = conn.execute(
+            select(TURNS.c.id, TURNS.c.preference_vector, TURNS.c.preference_drift, TURNS.c.focus_dimension,
+                   TURNS.c.trajectory_type, TURNS.c.purchase_intent_score).order_by(TURNS.c.id)
+        ).all()
+        events = conn.execute(
+            select(EVENTS.c.id, EVENTS.c.preference_vector, EVENTS.c.preference_drift, EVENTS.c.trajectory_type,
+                   EVENTS.c.decision_stage).order_by(EVENTS.c.id)
+        ).all()
+    return [tuple(r) for r in turns], [tuple(r) for r in events]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="历史偏好指标重算基准")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--page-sessions", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="recompute_bench_")
+    try:
+        source = os.path.join(workdir, "source.db")
+        build_db(source, args.sessions, args.turns)
+
+        path = os.path.join(workdir, "replay.db")
+        shutil.copy(source, path)
+        engine = create_engine(f"sqlite:///{path}")
+        analysis_memo.clear()
+        started = time.perf_counter()
+        turns = replay(engine)
+        replay_s = time.perf_counter() - started
+        expected = snapshot(engine)
+        engine.dispose()
+
+        print(f"sessions={args.sessions} user_turns={turns}")
+        print(f"{'mode':>14} {'seconds':>8} {'turns_per_s':>12} {'identical':>10}")
+        print(f"{'replay':>14} {replay_s:>8.2f} {turns / replay_s:>12.0f} {'-':>10}")
+        for workers in args.workers:
+            path = os.path.join(workdir, f"recompute_{workers}.db")
+            shutil.copy(source, path)
+            engine = create_engine(f"sqlite:///{path}")
+            analysis_memo.clear()
+            started = time.perf_counter()
+            stats = recompute_preferences(engine, page_sessions=args.page_sessions, workers=workers)
+            elapsed = time.perf_counter() - started
+            identical = snapshot(engine) == expected and stats["turns"] == turns
+            rerun = recompute_preferences(engine, page_sessions=args.page_sessions, workers=workers)
+            engine.dispose()
+            print(f"{'recompute/' + str(workers):>14} {elapsed:>8.2f} {turns / elapsed:>12.0f} {str(identical):>10}")
+            if not identical:
+                raise AssertionError(f"workers={workers} 重算结果与逐轮回放不一致")
+            if rerun["turns"]:
+                raise AssertionError(f"workers={workers} 已是当前词表版本的会话被重复重算：{rerun}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
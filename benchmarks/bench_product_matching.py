@@ -0,0 +1,123 @@
+"""
+商品匹配基准：把 data/product_list.csv 复制扩充到指定规模（改写 product_id），
+测量 get_matching_products / get_random_products 在各类意图下的延迟分布，
+以及每轮构造商品池（涉入度分区 + 排除历史）的耗时，对比按行布尔掩码逐步组合的旧做法
+
+用法：
+    python benchmarks/bench_product_matching.py                    # 85 / 1 万 / 5 万行
+    python benchmarks/bench_product_matching.py --sizes 100000 --queries 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from utils import product_loader  # noqa: E402
+from utils.product_catalog import ProductCatalog  # noqa: E402
+
+
+INTENTS = ["price_sensitive", "recommendation", "comparison", "exploration"]
+FUNCTIONS = [None, "降噪", "蓝牙", "续航", "防水", "低延迟"]
+BUDGETS = [None, 300, 800, 1500, 3000]
+
+
+def build_catalog(base_products, size: int) -> ProductCatalog:
+    """按原始商品循环复制到 size 行，价格 / 销量加少量扰动"""
+    rng = random.Random(size)
+    products = []
+    for i in range(size):
+        p = base_products[i % len(base_products)]
+        products.append(p.replace(
+            product_id=f"EAR{i + 1:06d}",
+            price=round(p["price"] * rng.uniform(0.8, 1.2), 2),
+            sales_volume_num=int(p["sales_volume_num"] * rng.uniform(0.5, 1.5)),
+        ))
+    return ProductCatalog(products)
+
+
+def random_query(rng: random.Random, catalog: ProductCatalog):
+    details = {
+        "max_price": rng.choice(BUDGETS),
+        "headset_type": rng.choice(list(catalog.headset_type_vocab) + [None]),
+        "brand": rng.choice(list(catalog.brand_vocab) + [None, None, None]),
+        "core_function": rng.choice(FUNCTIONS),
+    }
+    return rng.choice(INTENTS), {k: v for k, v in details.items() if v is not None}
+
+
+def mask_pool(catalog: ProductCatalog, involvement: str, exclude_ids) -> np.ndarray:
+    """旧做法：每轮解包涉入度位图、生成排除掩码再组合，均为 O(目录) 的整列操作"""
+    pool = np.unpackbits(catalog.posting("involvement", involvement)[1], count=len(catalog)).view(bool).copy()
+    if not pool.any():
+        pool = np.ones(len(catalog), dtype=bool)
+    excluded = np.zeros(len(catalog), dtype=bool)
+    rows = [catalog.row_by_id[pid] for pid in exclude_ids if pid in catalog.row_by_id]
+    if rows:
+        excluded[rows] = True
+    filtered = pool & ~excluded
+    return filtered if filtered.any() else pool
+
+
+def time_us(fn, repeat: int = 200) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) * 1e6 / repeat
+
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商品匹配延迟基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[85, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    base_products = product_loader.load_products_from_csv()
+
+    print(
+        f"{'rows':>8} {'build_ms':>9} {'match_p50':>10} {'match_p95':>10} {'random_p50':>11}  (ms)"
+        f" {'pool_us':>8} {'mask_pool_us':>13}"
+    )
+    for size in args.sizes:
+        started = time.perf_counter()
+        catalog = build_catalog(base_products, size)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        rng = random.Random(0)
+        # 模拟“涉入度 + 排除历史”之后的商品池（排除最近推荐过的 20 款）
+        history = catalog.product_ids[:20]
+        pool = catalog.candidate_pool("high", history)
+        pool_us = time_us(lambda: catalog.candidate_pool("high", history))
+        mask_pool_us = time_us(lambda: mask_pool(catalog, "high", history))
+
+        match_ms, random_ms = [], []
+        for _ in range(args.queries):
+            intent, details = random_query(rng, catalog)
+            t0 = time.perf_counter()
+            product_loader.get_matching_products(intent, details, top_n=10, candidates=pool, catalog=catalog)
+            match_ms.append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            product_loader.get_random_products(top_n=10, candidates=pool, catalog=catalog)
+            random_ms.append((time.perf_counter() - t0) * 1000)
+
+        print(
+            f"{size:>8} {build_ms:>9.1f} {statistics.median(match_ms):>10.3f} "
+            f"{percentile(match_ms, 0.95):>10.3f} {statistics.median(random_ms):>11.3f}"
+            f"       {pool_us:>8.1f} {mask_pool_us:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
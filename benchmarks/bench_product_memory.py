@@ -0,0 +1,157 @@
+"""
+商品记录内存基准：对比
+- legacy：每个商品一个 dict（整行原始字段 + 标准化字段），随机推荐时 deepcopy 整个商品池再 shuffle
+- records：不可变 ProductRecord（__slots__ + 驻留字符串），随机推荐时 random.sample 行号
+输出商品池常驻内存（tracemalloc）、每次请求分配量与耗时，以及独立子进程中的 RSS 增量
+
+用法：
+    python benchmarks/bench_product_memory.py
+    python benchmarks/bench_product_memory.py --rows 50000 --requests 20
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from utils import product_loader  # noqa: E402
+from utils.product_catalog import ProductCatalog  # noqa: E402
+
+
+def raw_rows(size: int):
+    """把 CSV 原始行复制扩充到 size 行（与 load_products_from_csv 读到的结构一致）"""
+    df = pd.read_csv(product_loader.PRODUCT_CSV_PATH, encoding="utf-8")
+    df["core_function"] = df["core_function"].str.replace("，", ",")
+    df["price_band"] = df["price_band"].map(lambda x: product_loader.PRICE_BAND_MAP.get(str(x).strip(), "low"))
+    base = df.to_dict("records")
+
+    rows = []
+    for i in range(size):
+        row = dict(base[i % len(base)])
+        # 模拟从大 CSV 解析：每行都是独立的字符串对象；名称各不相同，品牌 / 类型 / 功能取值高度重复
+        row["product_id"] = f"EAR{i + 1:06d}"
+        row["product_name"] = f"{row['product_name']} #{i}"
+        row["brand"] = "".join(row["brand"])
+        row["headset_type"] = "".join(row["headset_type"])
+        row["core_function"] = "".join(row["core_function"])
+        row["scenario"] = "".join(row["scenario"])
+        rows.append(row)
+    return rows
+
+
+def legacy_normalize(record):
+    """旧版 _normalize_record：复制整行再覆盖 / 追加标准化字段"""
+    r = dict(record)
+    r["product_id"] = product_loader._safe_str(r.get("product_id"))
+    r["product_name"] = product_loader._safe_str(r.get("product_name"))
+    r["brand"] = product_loader._safe_str(r.get("brand"))
+    r["headset_type"] = product_loader._safe_str(r.get("headset_type"))
+    r["core_function"] = product_loader._safe_str(r.get("core_function"))
+    r["scenario"] = product_loader._safe_str(r.get("scenario"))
+    r["involvement_level"] = product_loader._safe_lower(r.get("involvement_level"))
+    r["price"] = product_loader._normalize_price(r.get("price"))
+    r["sales_volume_num"] = product_loader._normalize_sales_volume(r.get("sales_volume"))
+    r["core_function_list"] = product_loader._normalize_core_function_list(r.get("core_function"))
+    r["scenario_list"] = product_loader._normalize_scenario_list(r.get("scenario"))
+    return r
+
+
+def build(mode: str, rows):
+    if mode == "legacy":
+        return [legacy_normalize(r) for r in rows]
+    return [product_loader._normalize_record(r) for r in rows]
+
+
+def legacy_random_request(pool, top_n: int = 10):
+    temp_pool = copy.deepcopy(pool)
+    random.shuffle(temp_pool)
+    return temp_pool[:top_n]
+
+
+def records_random_request(catalog, pool, top_n: int = 10):
+    return product_loader.get_random_products(top_n=top_n, candidates=pool, catalog=catalog)
+
+
+def rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def child(mode: str, size: int):
+    """子进程：只测量构建商品池前后的 RSS"""
+    rows = raw_rows(size)
+    before = rss_kb()
+    products = build(mode, rows)
+    del rows
+    after = rss_kb()
+    print(json.dumps({"rss_delta_kb": after - before, "count": len(products)}))
+
+
+def measure(mode: str, size: int, requests: int):
+    rows = raw_rows(size)
+
+    tracemalloc.start()
+    products = build(mode, rows)
+    resident = tracemalloc.get_traced_memory()[0]
+
+    if mode == "legacy":
+        pool = [p for p in products if p["involvement_level"] == "high"]
+        request = lambda: legacy_random_request(pool)  # noqa: E731
+    else:
+        catalog = ProductCatalog(products)
+        pool = catalog.candidate_pool("high")
+        request = lambda: records_random_request(catalog, pool)  # noqa: E731
+
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for _ in range(requests):
+        request()
+    elapsed_ms = (time.perf_counter() - started) * 1000 / requests
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, "--rows", str(size)],
+        capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    rss_delta = json.loads(out)["rss_delta_kb"]
+
+    return resident, peak, elapsed_ms, rss_delta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商品记录内存 / 分配基准")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--child", choices=["legacy", "records"])
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.rows)
+        return
+
+    print(f"rows={args.rows} requests={args.requests}")
+    print(f"{'mode':>8} {'resident_MB':>12} {'per_req_peak_KB':>16} {'per_req_ms':>11} {'rss_delta_MB':>13}")
+    for mode in ("legacy", "records"):
+        resident, peak, elapsed_ms, rss_delta = measure(mode, args.rows, args.requests)
+        print(
+            f"{mode:>8} {resident / 1e6:>12.1f} {peak / 1e3:>16.1f} "
+            f"{elapsed_ms:>11.3f} {rss_delta / 1e3:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
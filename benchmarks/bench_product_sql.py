@@ -0,0 +1,101 @@
+"""
+SQL 商品目录基准：把 data/product_list.csv 复制扩充到指定规模写成临时 CSV，
+用 ingest_products 导入临时 SQLite（或 --database-url 指定的库），
+测量导入吞吐，以及 SqlProductCatalog 上 get_matching_products / get_random_products 的延迟分布
+
+用法：
+    python benchmarks/bench_product_sql.py                         # 1 万 / 10 万行，临时 SQLite
+    python benchmarks/bench_product_sql.py --sizes 1000000 --queries 200
+    python benchmarks/bench_product_sql.py --database-url postgresql://...   # 会清空该库的 products 表
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from models.main import Product, ProductFunctionTag  # noqa: E402
+from utils import product_loader  # noqa: E402
+from utils.product_store import get_sql_catalog, ingest_products  # noqa: E402
+from bench_product_matching import FUNCTIONS, INTENTS, BUDGETS, percentile  # noqa: E402
+
+
+def write_feed(path: str, size: int):
+    """按原始 CSV 循环复制到 size 行，改写 product_id，价格 / 销量加少量扰动"""
+    base = pd.read_csv(product_loader.PRODUCT_CSV_PATH, encoding="utf-8", dtype=str)
+    rng = random.Random(size)
+    df = base.iloc[[i % len(base) for i in range(size)]].reset_index(drop=True)
+    df["product_id"] = [f"EAR{i + 1:07d}" for i in range(size)]
+    df["price"] = [str(round(float(p) * rng.uniform(0.8, 1.2), 2)) for p in df["price"]]
+    df["sales_volume"] = [str(int(rng.uniform(50, 20000))) for _ in range(size)]
+    df.to_csv(path, index=False, encoding="utf-8")
+    return sorted(base["headset_type"].dropna().unique()), sorted(base["brand"].dropna().unique())
+
+
+def random_query(rng: random.Random, types, brands):
+    details = {
+        "max_price": rng.choice(BUDGETS),
+        "headset_type": rng.choice(list(types) + [None]),
+        "brand": rng.choice(list(brands) + [None, None, None]),
+        "core_function": rng.choice(FUNCTIONS),
+    }
+    return rng.choice(INTENTS), {k: v for k, v in details.items() if v is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQL 商品目录导入 / 查询基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--database-url", default=None, help="默认每个规模一个临时 SQLite 文件")
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'ingest_s':>9} {'rows/s':>9} {'match_p50':>10} {'match_p95':>10} {'random_p50':>11}  (ms)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            feed = os.path.join(tmp, f"feed_{size}.csv")
+            types, brands = write_feed(feed, size)
+
+            url = args.database_url or f"sqlite:///{os.path.join(tmp, f'products_{size}.db')}"
+            engine = create_engine(url)
+            for table in (Product.__table__, ProductFunctionTag.__table__):
+                table.create(engine, checkfirst=True)
+
+            started = time.perf_counter()
+            total, _ = ingest_products(engine, feed, batch_size=args.batch_size)
+            ingest_s = time.perf_counter() - started
+
+            rng = random.Random(0)
+            match_ms, random_ms = [], []
+            with Session(engine) as session:
+                catalog = get_sql_catalog(session)
+                # 模拟“涉入度 + 排除历史”之后的商品池
+                pool = catalog.candidate_pool("high", [f"EAR{i:07d}" for i in range(1, 6)])
+                for _ in range(args.queries):
+                    intent, details = random_query(rng, types, brands)
+                    t0 = time.perf_counter()
+                    product_loader.get_matching_products(intent, details, top_n=10, candidates=pool, catalog=catalog)
+                    match_ms.append((time.perf_counter() - t0) * 1000)
+
+                    t0 = time.perf_counter()
+                    product_loader.get_random_products(top_n=10, candidates=pool, catalog=catalog)
+                    random_ms.append((time.perf_counter() - t0) * 1000)
+
+            engine.dispose()
+            print(
+                f"{size:>9} {ingest_s:>9.1f} {total / ingest_s:>9.0f} {statistics.median(match_ms):>10.3f} "
+                f"{percentile(match_ms, 0.95):>10.3f} {statistics.median(random_ms):>11.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+HIGH 校准选品缓存基准：模拟多名被试的对话（首轮需求高度重合，之后逐轮排除已推荐商品），
+对比不缓存 / 缓存两种情况下 _select_products_by_calibration 的延迟和命中率，并校验结果一致
+
+用法：
+    python benchmarks/bench_selection_cache.py                       # 1 万行目录，500 名被试
+    python benchmarks/bench_selection_cache.py --rows 100000 --participants 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from ai import logic  # noqa: E402
+from utils import product_loader  # noqa: E402
+from utils.selection_cache import SelectionCache  # noqa: E402
+from bench_product_matching import build_catalog, percentile  # noqa: E402
+
+# 常见首轮需求（真实实验里大部分被试第一句话落在少数几种说法上）
+FIRST_TURNS = [
+    ("recommendation", {}),
+    ("recommendation", {"max_price": 500}),
+    ("recommendation", {"core_function": "降噪"}),
+    ("price_sensitive", {"max_price": 300}),
+    ("recommendation", {"max_price": 1000, "headset_type": "头戴式"}),
+    ("comparison", {"brand": "Sony"}),
+]
+
+
+def conversations(rng: random.Random, participants: int, turns: int):
+    """每名被试：(涉入度, [(意图, 画像), ...])；后续轮在首轮画像上随机补一个条件"""
+    extras = [("core_function", "蓝牙"), ("max_price", 800), ("headset_type", "入耳式"), ("brand", "华为")]
+    for _ in range(participants):
+        intent, profile = rng.choice(FIRST_TURNS)
+        profile = dict(profile)
+        script = [(intent, dict(profile))]
+        for _ in range(turns - 1):
+            key, value = rng.choice(extras)
+            profile[key] = value
+            script.append((rng.choice(["recommendation", "comparison", intent]), dict(profile)))
+        yield rng.choice(["high", "low"]), script
+
+
+def run(catalog, scripts, cache: SelectionCache):
+    logic.selection_cache = cache
+    # 匹配为空时的随机兜底不缓存；两次运行用同一随机种子，结果应完全一致
+    random.seed(0)
+    latencies, results = [], []
+    for involvement, script in scripts:
+        history = set()
+        for intent, profile in script:
+            t0 = time.perf_counter()
+            selected = logic._select_products_by_calibration(
+                catalog, involvement, intent, profile, "HIGH", set(history), top_n=5
+            )
+            latencies.append((time.perf_counter() - t0) * 1000)
+            results.append([p["product_id"] for p in selected])
+            history.update(p["product_id"] for p in selected)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HIGH 校准选品缓存基准")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--participants", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=4)
+    args = parser.parse_args()
+
+    catalog = build_catalog(product_loader.load_products_from_csv(), args.rows)
+    catalog.version = f"bench-{args.rows}"
+    scripts = list(conversations(random.Random(0), args.participants, args.turns))
+
+    baseline_ms, baseline = run(catalog, scripts, SelectionCache(max_entries=0))
+    cache = SelectionCache()
+    cached_ms, cached = run(catalog, scripts, cache)
+
+    stats = cache.stats()
+    print(f"rows={args.rows} participants={args.participants} turns={args.turns}")
+    print(f"{'mode':>9} {'p50_ms':>8} {'p95_ms':>8} {'total_ms':>9}")
+    for mode, ms in (("uncached", baseline_ms), ("cached", cached_ms)):
+        print(f"{mode:>9} {statistics.median(ms):>8.3f} {percentile(ms, 0.95):>8.3f} {sum(ms):>9.1f}")
+    print(f"hit_rate={stats['hit_rate']:.2%} entries={stats['entries']} identical={baseline == cached}")
+
+
+if __name__ == "__main__":
+    main()
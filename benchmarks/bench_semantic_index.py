@@ -0,0 +1,83 @@
+"""
+语义索引基准：把 data/product_list.csv 复制扩充到指定规模，每行商品名追加随机型号使文本各不相同，
+测量 SemanticIndex 建索引耗时 / 大小，以及自由文本查询（相似度 + 商品池内 top-k）的延迟分布
+
+用法：
+    python benchmarks/bench_semantic_index.py                    # 1 万 / 10 万行
+    python benchmarks/bench_semantic_index.py --sizes 1000000 --queries 500
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from utils import product_loader  # noqa: E402
+from utils.product_catalog import ProductCatalog, semantic_text  # noqa: E402
+from utils.semantic_index import SemanticIndex  # noqa: E402
+from bench_product_matching import percentile  # noqa: E402
+
+# 没有命中关键词词表、只能靠语义兜底的说法
+QUERIES = [
+    "我想要个打游戏不延迟的",
+    "通勤地铁用，安静点",
+    "苹果的那种",
+    "有没有适合学生的",
+    "跑步健身戴着不掉",
+    "开会打电话用",
+    "睡觉戴的舒服一点",
+    "音质好听歌用",
+]
+
+
+def build_catalog(base_products, size: int) -> ProductCatalog:
+    rng = random.Random(size)
+    products = []
+    for i in range(size):
+        p = base_products[i % len(base_products)]
+        suffix = "".join(rng.choice(string.ascii_lowercase) for _ in range(4))
+        products.append(p.replace(product_id=f"EAR{i + 1:07d}", product_name=f"{p['product_name']} {suffix}"))
+    return ProductCatalog(products)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语义索引建索引 / 查询基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    base_products = product_loader.load_products_from_csv()
+
+    print(f"{'rows':>8} {'build_s':>8} {'index_MB':>9} {'terms':>7} {'query_p50':>10} {'query_p95':>10}  (ms)")
+    for size in args.sizes:
+        catalog = build_catalog(base_products, size)
+        texts = [semantic_text(p) for p in catalog.products]
+
+        started = time.perf_counter()
+        index = SemanticIndex.build(texts)
+        build_s = time.perf_counter() - started
+        catalog._semantic = index
+        index_mb = sum(a.nbytes for a in index.to_columns().values()) / 1e6
+
+        rng = random.Random(0)
+        bits = catalog.candidate_pool("high", catalog.product_ids[:20]).bits()
+        latencies = []
+        for _ in range(args.queries):
+            query = rng.choice(QUERIES)
+            t0 = time.perf_counter()
+            catalog.top_by_similarity(bits, query, 10, max_price=rng.choice([None, 500.0, 1500.0]))
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+        print(
+            f"{size:>8} {build_s:>8.2f} {index_mb:>9.1f} {index.vocab.size:>7} "
+            f"{statistics.median(latencies):>10.3f} {percentile(latencies, 0.95):>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
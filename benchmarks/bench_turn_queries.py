@@ -0,0 +1,170 @@
+"""
+interaction_turns 热点查询基准：
+灌入大量轮次数据，分别在“无索引 / 有复合索引”两种状态下
+输出 api_send 热点查询的执行计划（EXPLAIN）和延迟分布
+
+用法：
+    python benchmarks/bench_turn_queries.py                       # 本地 SQLite，默认 200 万行
+    python benchmarks/bench_turn_queries.py --database-url postgresql://user:pw@host/db
+    python benchmarks/bench_turn_queries.py --sessions 5000 --turns 20 --reuse
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+from sqlalchemy import create_engine, insert, text
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from models.main import db, InteractionTurn  # noqa: E402
+
+
+INDEX_NAMES = [
+    "ix_interaction_turns_session_sender_turn",
+    "ix_interaction_turns_session_turn",
+]
+
+# api_send / ai.logic 每轮都会执行的查询
+HOT_QUERIES = {
+    "count_by_session": (
+        "SELECT count(*) FROM interaction_turns WHERE session_uuid = :sid"
+    ),
+    "last_user_turn": (
+        "SELECT * FROM interaction_turns WHERE session_uuid = :sid AND sender = 'user' "
+        "ORDER BY turn_index DESC LIMIT 1"
+    ),
+    "last_ai_turn": (
+        "SELECT * FROM interaction_turns WHERE session_uuid = :sid AND sender = 'ai' "
+        "ORDER BY turn_index DESC LIMIT 1"
+    ),
+    "replay_history": (
+        "SELECT * FROM interaction_turns WHERE session_uuid = :sid "
+        "ORDER BY turn_index ASC, id ASC"
+    ),
+}
+
+
+def _seed(engine, sessions: int, turns: int, batch_size: int = 20000):
+    """灌入 sessions × turns × 2 行（每轮一条 user + 一条 ai）"""
+    table = InteractionTurn.__table__
+    session_ids = [str(uuid.uuid4()) for _ in range(sessions)]
+    rows = []
+    total = 0
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        for turn_index in range(1, turns + 1):
+            # 按轮次外层循环，使同一会话的行在物理上分散，贴近线上写入顺序
+            for sid in session_ids:
+                for sender in ("user", "ai"):
+                    rows.append({
+                        "session_uuid": sid,
+                        "user_uuid": sid,
+                        "sender": sender,
+                        "content": "预算500以内的降噪耳机" if sender == "user" else "为你推荐……",
+                        "turn_index": turn_index,
+                        "preference_drift": 0.0,
+                        "purchase_intent_score": 0.3,
+                    })
+                if len(rows) >= batch_size:
+                    conn.execute(insert(table), rows)
+                    total += len(rows)
+                    rows = []
+        if rows:
+            conn.execute(insert(table), rows)
+            total += len(rows)
+
+    print(f"已灌入 {total} 行，用时 {time.perf_counter() - started:.1f}s")
+    return session_ids
+
+
+def _drop_indexes(engine):
+    with engine.begin() as conn:
+        for name in INDEX_NAMES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _create_indexes(engine):
+    for index in InteractionTurn.__table__.indexes:
+        if index.name in INDEX_NAMES:
+            index.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE" if engine.dialect.name == "sqlite" else "ANALYZE interaction_turns"))
+
+
+def _explain(engine, sql: str, sid: str) -> str:
+    if engine.dialect.name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif engine.dialect.name == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    else:
+        prefix = "EXPLAIN "
+    with engine.connect() as conn:
+        rows = conn.execute(text(prefix + sql), {"sid": sid}).fetchall()
+    return "\n".join("    " + " | ".join(str(c) for c in row) for row in rows)
+
+
+def _measure(engine, sql: str, session_ids, repeat: int):
+    stmt = text(sql)
+    latencies = []
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            sid = random.choice(session_ids)
+            t0 = time.perf_counter()
+            conn.execute(stmt, {"sid": sid}).fetchall()
+            latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "max": latencies[-1],
+    }
+
+
+def _report(engine, label: str, session_ids, repeat: int):
+    print(f"\n===== {label} =====")
+    sample_sid = session_ids[len(session_ids) // 2]
+    for name, sql in HOT_QUERIES.items():
+        stats = _measure(engine, sql, session_ids, repeat)
+        print(f"[{name}] p50={stats['p50']:.3f}ms p95={stats['p95']:.3f}ms max={stats['max']:.3f}ms")
+        print(_explain(engine, sql, sample_sid))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="interaction_turns 热点查询索引基准")
+    parser.add_argument("--database-url", default=os.environ.get(
+        "BENCH_DATABASE_URL", "sqlite:////tmp/bench_turn_queries.db"))
+    parser.add_argument("--sessions", type=int, default=50000)
+    parser.add_argument("--turns", type=int, default=20, help="每个会话的轮数（每轮 2 行）")
+    parser.add_argument("--repeat", type=int, default=50, help="每条查询的采样次数")
+    parser.add_argument("--reuse", action="store_true", help="复用已灌好的数据，不重新灌入")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+
+    if args.reuse:
+        with engine.connect() as conn:
+            session_ids = [r[0] for r in conn.execute(text(
+                "SELECT DISTINCT session_uuid FROM interaction_turns LIMIT 10000"))]
+    else:
+        db.metadata.drop_all(engine, tables=[InteractionTurn.__table__])
+        db.metadata.create_all(engine)
+        _drop_indexes(engine)
+        session_ids = _seed(engine, args.sessions, args.turns)
+
+    _drop_indexes(engine)
+    _report(engine, "迁移前（无复合索引）", session_ids, args.repeat)
+
+    t0 = time.perf_counter()
+    _create_indexes(engine)
+    print(f"\n建索引用时 {time.perf_counter() - t0:.1f}s")
+    _report(engine, "迁移后（复合索引）", session_ids, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
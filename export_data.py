@@ -3,6 +3,7 @@ import pandas as pd
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from models.main import db, User, InteractionTurn, ExperimentSession  # 注意路径：如果 models/main.py 是你的模型文件
+from models.session_events import build_preference_evolution_chain, build_decision_path
 import json
 from datetime import datetime
 
@@ -31,9 +32,42 @@ def flatten_json(df, json_cols):
     return df
 
 
+def attach_session_chains(df):
+    """
+    由只追加的 session_events 重建每个会话的 preference_evolution_chain / decision_path，
+    列格式与旧版 JSON 数组一致（旧数据保留在前）
+    """
+    try:
+        events = pd.read_sql_query(
+            "SELECT * FROM session_events ORDER BY session_uuid, turn_index, id", ENGINE
+        )
+    except Exception:
+        return df  # 尚未迁移的旧库没有 session_events 表
+
+    events_by_session = {
+        sid: group.to_dict('records') for sid, group in events.groupby('session_uuid')
+    }
+
+    chains, paths = [], []
+    for _, row in df.iterrows():
+        session_events = events_by_session.get(row['session_uuid'], [])
+        chains.append(json.dumps(
+            build_preference_evolution_chain(session_events, row.get('preference_evolution_chain')),
+            ensure_ascii=False
+        ))
+        paths.append(json.dumps(
+            build_decision_path(session_events, row.get('decision_path')),
+            ensure_ascii=False
+        ))
+    df['preference_evolution_chain'] = chains
+    df['decision_path'] = paths
+    return df
+
+
 def export_sessions():
     """导出会话元数据"""
     query = pd.read_sql_query("SELECT * FROM experiment_session", ENGINE)
+    query = attach_session_chains(query)
     query['start_time'] = pd.to_datetime(query['start_time'])
     query['end_time'] = pd.to_datetime(query['end_time'])
     outfile = os.path.join(EXPORT_DIR, f'sessions_{TIMESTAMP}.csv')
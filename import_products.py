@@ -0,0 +1,50 @@
+"""
+把商品 CSV 批量导入 products 表（整表替换，同一事务内完成）
+
+用法：
+    python import_products.py                                   # 导入 data/product_list.csv
+    python import_products.py --csv feed.csv --batch-size 20000
+    DATABASE_URL=postgresql://... python import_products.py     # PostgreSQL 下走 COPY
+
+导入后设置 PRODUCT_CATALOG_BACKEND=sql，推荐直接查询 products 表
+"""
+import argparse
+import os
+import time
+
+from sqlalchemy import create_engine
+
+import config
+from models.main import Product, ProductFunctionTag
+from utils.product_loader import PRODUCT_CSV_PATH
+from utils.product_store import ingest_products
+
+
+def make_engine(url: str = None):
+    """与 app.py 相同的库选择：DATABASE_URL 优先，否则本地 SQLite"""
+    url = url or os.environ.get('DATABASE_URL') or config.SQLALCHEMY_DATABASE_URI
+    if url.startswith(('postgres', 'postgresql')):
+        return create_engine(url, connect_args={'sslmode': os.environ.get('DATABASE_SSLMODE', 'require')})
+    return create_engine(url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="商品 CSV 批量导入 products 表")
+    parser.add_argument("--csv", default=PRODUCT_CSV_PATH, help="商品 CSV 路径")
+    parser.add_argument("--database-url", default=None, help="默认取 DATABASE_URL / config.py")
+    parser.add_argument("--batch-size", type=int, default=5000, help="每批读取 / 写入的行数")
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url)
+    # 新库可能还没建表（正常由 app.py 的 db.create_all() 或迁移创建）
+    for table in (Product.__table__, ProductFunctionTag.__table__):
+        table.create(engine, checkfirst=True)
+
+    started = time.perf_counter()
+    total, version = ingest_products(engine, args.csv, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"商品导入完成：{total} 款，版本 {version}，耗时 {elapsed:.1f}s（{total / max(elapsed, 1e-9):.0f} 行/秒）")
+
+
+if __name__ == "__main__":
+    main()
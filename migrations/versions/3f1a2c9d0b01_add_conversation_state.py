@@ -0,0 +1,32 @@
+"""add experiment_session.conversation_state snapshot
+
+Revision ID: 3f1a2c9d0b01
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a2c9d0b01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    inspector = sa.inspect(op.get_bind())
+    return column in {c['name'] for c in inspector.get_columns(table)}
+
+
+def upgrade():
+    # app.py 启动时会 db.create_all()，新库可能已经带上该列
+    if not _has_column('experiment_session', 'conversation_state'):
+        op.add_column('experiment_session', sa.Column('conversation_state', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    if _has_column('experiment_session', 'conversation_state'):
+        op.drop_column('experiment_session', 'conversation_state')
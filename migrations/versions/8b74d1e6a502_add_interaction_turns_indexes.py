@@ -0,0 +1,56 @@
+"""add composite indexes for interaction_turns hot queries
+
+Revision ID: 8b74d1e6a502
+Revises: 3f1a2c9d0b01
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b74d1e6a502'
+down_revision = '3f1a2c9d0b01'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_interaction_turns_session_sender_turn', ['session_uuid', 'sender', 'turn_index']),
+    ('ix_interaction_turns_session_turn', ['session_uuid', 'turn_index', 'id']),
+]
+
+
+def _existing_indexes():
+    inspector = sa.inspect(op.get_bind())
+    return {ix['name'] for ix in inspector.get_indexes('interaction_turns')}
+
+
+def upgrade():
+    existing = _existing_indexes()
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+
+    for name, columns in INDEXES:
+        if name in existing:
+            continue
+        if is_postgres:
+            # CREATE INDEX CONCURRENTLY 不能在事务内执行，也不会阻塞写入
+            with op.get_context().autocommit_block():
+                op.create_index(name, 'interaction_turns', columns, postgresql_concurrently=True)
+        else:
+            op.create_index(name, 'interaction_turns', columns)
+
+
+def downgrade():
+    existing = _existing_indexes()
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+
+    for name, _ in reversed(INDEXES):
+        if name not in existing:
+            continue
+        if is_postgres:
+            with op.get_context().autocommit_block():
+                op.drop_index(name, table_name='interaction_turns', postgresql_concurrently=True)
+        else:
+            op.drop_index(name, table_name='interaction_turns')
@@ -0,0 +1,48 @@
+"""move products.function_tags into the product_function_tags child table
+
+Revision ID: a8d2e4f6b1c9
+Revises: f19b6d4c2a73
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d2e4f6b1c9'
+down_revision = 'f19b6d4c2a73'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(table):
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def _has_column(table, column):
+    inspector = sa.inspect(op.get_bind())
+    return column in {c['name'] for c in inspector.get_columns(table)}
+
+
+def upgrade():
+    # app.py 启动时会 db.create_all()，新库可能已经建好子表
+    if not _has_table('product_function_tags'):
+        op.create_table(
+            'product_function_tags',
+            sa.Column('tag', sa.String(length=255), nullable=False),
+            sa.Column('product_id', sa.String(length=64), nullable=False),
+            sa.ForeignKeyConstraint(['product_id'], ['products.product_id']),
+            sa.PrimaryKeyConstraint('tag', 'product_id'),
+        )
+    # 标签改由子表保存，旧列不再写入；重新运行 import_products.py 回填子表
+    if _has_table('products') and _has_column('products', 'function_tags'):
+        op.drop_column('products', 'function_tags')
+
+
+def downgrade():
+    # 旧列降级后为空，需重新导入商品
+    if _has_table('products') and not _has_column('products', 'function_tags'):
+        op.add_column('products', sa.Column('function_tags', sa.String(length=512), nullable=True))
+    if _has_table('product_function_tags'):
+        op.drop_table('product_function_tags')
@@ -0,0 +1,47 @@
+"""add append-only session_events table
+
+Revision ID: c52e09a7f4d3
+Revises: 8b74d1e6a502
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e09a7f4d3'
+down_revision = '8b74d1e6a502'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(table):
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade():
+    # app.py 启动时会 db.create_all()，新库可能已经建好该表
+    if _has_table('session_events'):
+        return
+    op.create_table(
+        'session_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('session_uuid', sa.String(length=64), nullable=False),
+        sa.Column('turn_index', sa.Integer(), nullable=True),
+        sa.Column('preference_vector', sa.JSON(), nullable=True),
+        sa.Column('preference_drift', sa.Float(), nullable=True),
+        sa.Column('trajectory_type', sa.String(length=50), nullable=True),
+        sa.Column('decision_stage', sa.String(length=20), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['session_uuid'], ['experiment_session.session_uuid']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_session_events_session_turn', 'session_events', ['session_uuid', 'turn_index', 'id'])
+
+
+def downgrade():
+    if not _has_table('session_events'):
+        return
+    op.drop_index('ix_session_events_session_turn', table_name='session_events')
+    op.drop_table('session_events')
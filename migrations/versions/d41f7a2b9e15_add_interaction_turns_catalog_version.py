@@ -0,0 +1,32 @@
+"""add interaction_turns.catalog_version
+
+Revision ID: d41f7a2b9e15
+Revises: c52e09a7f4d3
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f7a2b9e15'
+down_revision = 'c52e09a7f4d3'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    inspector = sa.inspect(op.get_bind())
+    return column in {c['name'] for c in inspector.get_columns(table)}
+
+
+def upgrade():
+    # app.py 启动时会 db.create_all()，新库可能已经带上该列
+    if not _has_column('interaction_turns', 'catalog_version'):
+        op.add_column('interaction_turns', sa.Column('catalog_version', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    if _has_column('interaction_turns', 'catalog_version'):
+        op.drop_column('interaction_turns', 'catalog_version')
@@ -0,0 +1,74 @@
+"""add products catalog columns and indexes for the SQL catalog backend
+
+Revision ID: e7a3c5d1f208
+Revises: d41f7a2b9e15
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3c5d1f208'
+down_revision = 'd41f7a2b9e15'
+branch_labels = None
+depends_on = None
+
+
+NEW_COLUMNS = [
+    ('involvement_level', sa.String(length=10)),
+    ('sales_volume_num', sa.Integer()),
+    ('brand_key', sa.String(length=64)),
+    ('function_tags', sa.String(length=512)),
+    ('catalog_version', sa.String(length=32)),
+]
+
+# products 表此前从未写入，直接建索引即可，无需 CONCURRENTLY
+INDEXES = [
+    ('ix_products_involvement_sales', ['involvement_level', 'sales_volume_num', 'id']),
+    ('ix_products_involvement_price', ['involvement_level', 'price']),
+    ('ix_products_headset_type', ['headset_type']),
+    ('ix_products_brand_key', ['brand_key']),
+]
+
+
+def _has_table(table):
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def _has_column(table, column):
+    inspector = sa.inspect(op.get_bind())
+    return column in {c['name'] for c in inspector.get_columns(table)}
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    return {ix['name'] for ix in inspector.get_indexes(table)}
+
+
+def upgrade():
+    # products 表由 app.py 的 db.create_all() 创建，新库可能已经带上这些列和索引
+    if not _has_table('products'):
+        return
+    for name, column_type in NEW_COLUMNS:
+        if not _has_column('products', name):
+            op.add_column('products', sa.Column(name, column_type, nullable=True))
+
+    existing = _existing_indexes('products')
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'products', columns)
+
+
+def downgrade():
+    if not _has_table('products'):
+        return
+    existing = _existing_indexes('products')
+    for name, _ in reversed(INDEXES):
+        if name in existing:
+            op.drop_index(name, table_name='products')
+
+    for name, _ in reversed(NEW_COLUMNS):
+        if _has_column('products', name):
+            op.drop_column('products', name)
@@ -0,0 +1,32 @@
+"""add interaction_turns.lexicon_version
+
+Revision ID: f19b6d4c2a73
+Revises: e7a3c5d1f208
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f19b6d4c2a73'
+down_revision = 'e7a3c5d1f208'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    inspector = sa.inspect(op.get_bind())
+    return column in {c['name'] for c in inspector.get_columns(table)}
+
+
+def upgrade():
+    # app.py 启动时会 db.create_all()，新库可能已经带上该列
+    if not _has_column('interaction_turns', 'lexicon_version'):
+        op.add_column('interaction_turns', sa.Column('lexicon_version', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    if _has_column('interaction_turns', 'lexicon_version'):
+        op.drop_column('interaction_turns', 'lexicon_version')
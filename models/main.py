@@ -14,6 +14,12 @@ class User(db.Model):
 
 class InteractionTurn(db.Model):
     __tablename__ = 'interaction_turns'
+    __table_args__ = (
+        # api_send 取上一轮 user/ai 发言：filter(session_uuid, sender).order_by(turn_index)
+        db.Index('ix_interaction_turns_session_sender_turn', 'session_uuid', 'sender', 'turn_index'),
+        # 按会话计数 / 按轮次回放历史：filter(session_uuid).order_by(turn_index, id)
+        db.Index('ix_interaction_turns_session_turn', 'session_uuid', 'turn_index', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     session_uuid = db.Column(db.String(64), db.ForeignKey('experiment_session.session_uuid'))
     user_uuid = db.Column(db.String(64), db.ForeignKey('users.user_uuid'))
@@ -40,6 +46,8 @@ class InteractionTurn(db.Model):
     recommended_products = db.Column(JSON, nullable=True)  # 存储推荐商品的JSON数据（AI回复时才有值，用户消息为None）
     trajectory_type = db.Column(db.String(50))
     purchase_intent_score = db.Column(db.Float, default=0.0)
+    catalog_version = db.Column(db.String(32))  # AI 回复所用商品目录版本（CSV 内容哈希前缀）
+    lexicon_version = db.Column(db.String(32))  # 用户发言偏好指标所用词表版本（utils.lexicon.LEXICON_VERSION）
 
 class ExperimentSession(db.Model):
     __tablename__ = 'experiment_session'
@@ -55,13 +63,40 @@ class ExperimentSession(db.Model):
 
     start_time = db.Column(db.DateTime, default=datetime.utcnow)
     end_time = db.Column(db.DateTime)
+    # 旧版按整段 JSON 数组存储；新数据写入 session_events，用 models.session_events 重建
     preference_evolution_chain = db.Column(db.JSON, default=[])
     decision_path = db.Column(db.JSON, default=[])  # 决策路径序列
     decision_efficiency_turns = db.Column(db.Integer, default=0)  # 效率轮次
     decision_efficiency_time = db.Column(db.Float, default=0.0)  # 效率时长 (秒)
+    conversation_state = db.Column(db.JSON, nullable=True)  # 会话增量状态快照（SessionState.to_dict）
+
+class SessionEvent(db.Model):
+    """
+    会话偏好事件（只追加）：每轮用户发言写一行，
+    取代每轮整体重写 ExperimentSession.preference_evolution_chain / decision_path 的 JSON 数组
+    """
+    __tablename__ = 'session_events'
+    __table_args__ = (
+        db.Index('ix_session_events_session_turn', 'session_uuid', 'turn_index', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    session_uuid = db.Column(db.String(64), db.ForeignKey('experiment_session.session_uuid'), nullable=False)
+    turn_index = db.Column(db.Integer)  # 第几轮对话
+    preference_vector = db.Column(db.JSON)  # 本轮偏好向量
+    preference_drift = db.Column(db.Float, default=0.0)  # 本轮漂移
+    trajectory_type = db.Column(db.String(50))  # 本轮轨迹类型
+    decision_stage = db.Column(db.String(20))  # 决策阶段：exploration / consideration / decision
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Product(db.Model):
     __tablename__ = 'products'  # 数据库表名：products
+    __table_args__ = (
+        # SQL 商品目录：涉入度商品池内按销量 / 价格取 top-k
+        db.Index('ix_products_involvement_sales', 'involvement_level', 'sales_volume_num', 'id'),
+        db.Index('ix_products_involvement_price', 'involvement_level', 'price'),
+        db.Index('ix_products_headset_type', 'headset_type'),
+        db.Index('ix_products_brand_key', 'brand_key'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.String(64), unique=True, nullable=False)  # 商品唯一标识（EAR001）
     product_name = db.Column(db.String(255), nullable=False)  # 商品名称
@@ -73,8 +108,18 @@ class Product(db.Model):
     battery_life = db.Column(db.Integer)  # 续航时长
     sales_volume = db.Column(db.String(10))  # 销量（5000+）
     scenario = db.Column(db.String(20))  # 使用场景（通勤/游戏）
+    involvement_level = db.Column(db.String(10))  # 涉入度（high/low）
+    sales_volume_num = db.Column(db.Integer, default=0)  # 销量数值（5000+ -> 5000），排序用
+    brand_key = db.Column(db.String(64))  # 小写品牌，品牌过滤 / 对比去重用
+    catalog_version = db.Column(db.String(32))  # 导入批次版本（商品CSV内容哈希前缀）
     created_at = db.Column(db.DateTime, default=datetime.utcnow)  # 入库时间
 
+class ProductFunctionTag(db.Model):
+    __tablename__ = 'product_function_tags'  # 商品功能标签：一行一个（标签, 商品），功能匹配用
+    # 主键以 tag 开头，按标签集合 IN 查商品 ID 直接走主键索引
+    tag = db.Column(db.String(255), primary_key=True)  # 小写功能标签（降噪）
+    product_id = db.Column(db.String(64), db.ForeignKey('products.product_id'), primary_key=True)
+
 class Survey(db.Model):
     __tablename__ = 'surveys'
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,71 @@
+import json
+from typing import Any, Dict, Iterable, List, Tuple
+
+from models.main import SessionEvent, ExperimentSession
+
+
+# =========================
+# 兼容访问：由 session_events 重建旧版 JSON 链条
+# =========================
+def _as_json(value: Any, default):
+    if value is None:
+        return default
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return default
+    return value
+
+
+def _event_field(event: Any, name: str):
+    # 同时兼容 ORM 对象和 pandas / DB-API 行字典
+    if isinstance(event, dict):
+        return event.get(name)
+    return getattr(event, name, None)
+
+
+def build_preference_evolution_chain(events: Iterable[Any], legacy_chain: Any = None) -> List[Dict]:
+    """
+    返回与旧版 ExperimentSession.preference_evolution_chain 相同结构的列表：
+    [{'turn', 'vector', 'drift', 'trajectory'}, ...]
+    迁移前写入的旧链条保留在前（迁移后不再写 JSON 数组，两者不会重叠），之后的轮次由事件补齐
+    """
+    chain = list(_as_json(legacy_chain, []) or [])
+    for event in events:
+        chain.append({
+            'turn': _event_field(event, 'turn_index'),
+            'vector': _as_json(_event_field(event, 'preference_vector'), {}),
+            'drift': _event_field(event, 'preference_drift'),
+            'trajectory': _event_field(event, 'trajectory_type'),
+        })
+    return chain
+
+
+def build_decision_path(events: Iterable[Any], legacy_path: Any = None) -> List[str]:
+    """
+    返回与旧版 ExperimentSession.decision_path 相同结构的阶段序列
+    """
+    path = list(_as_json(legacy_path, []) or [])
+    for event in events:
+        stage = _event_field(event, 'decision_stage')
+        if stage:
+            path.append(stage)
+    return path
+
+
+def get_session_chains(session_uuid: str) -> Tuple[List[Dict], List[str]]:
+    """
+    (preference_evolution_chain, decision_path)，需在 Flask app context 中调用
+    """
+    exp_session = ExperimentSession.query.filter_by(session_uuid=session_uuid).first()
+    events = SessionEvent.query.filter_by(
+        session_uuid=session_uuid
+    ).order_by(SessionEvent.turn_index.asc(), SessionEvent.id.asc()).all()
+
+    legacy_chain = exp_session.preference_evolution_chain if exp_session else None
+    legacy_path = exp_session.decision_path if exp_session else None
+    return (
+        build_preference_evolution_chain(events, legacy_chain),
+        build_decision_path(events, legacy_path),
+    )
@@ -0,0 +1,117 @@
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import aliased
+
+from models.main import db, InteractionTurn, ExperimentSession, SessionEvent
+
+
+def _latest_turn_id(sender: str):
+    """同一会话下某个 sender 的最近一条发言（走 ix_interaction_turns_session_sender_turn）"""
+    return (
+        select(InteractionTurn.id)
+        .where(
+            InteractionTurn.session_uuid == ExperimentSession.session_uuid,
+            InteractionTurn.sender == sender,
+        )
+        .order_by(InteractionTurn.turn_index.desc(), InteractionTurn.id.desc())
+        .limit(1)
+        .correlate(ExperimentSession)
+        .scalar_subquery()
+    )
+
+
+class SendTurnUnitOfWork:
+    """
+    /api/send 的请求级工作单元：
+    1. load()：一条 SELECT 取回会话行 + 上一轮 user / ai 发言，随后立即结束读事务，
+       避免 LLM 调用期间一直占着数据库连接
+    2. add_turn() / add_event() / update_session()：只在内存里登记
+    3. commit()：把当前已登记的 INSERT 与会话 UPDATE 放在一个事务里提交，随后清空登记
+    每轮调用两次 commit()（两个事务）：调用模型前提交用户发言 + 偏好事件 + 会话更新，
+    回复生成后提交 AI 回复 + 会话快照；合计 6 条语句 + 2 次 COMMIT + 1 次 ROLLBACK = 9 次往返
+    （见 benchmarks/bench_api_send_roundtrips.py）
+    """
+
+    def __init__(self, session_uuid: str):
+        self.session_uuid = session_uuid
+
+        self.session_found = False
+        self.assigned_involvement: Optional[str] = None
+        self.conversation_state: Optional[Dict] = None
+
+        self.has_history = False
+        self.last_turn_index = 0
+        self.last_user_vector: Optional[Dict] = None
+        self.last_ai_products: List[Dict] = []
+
+        self._pending: List[db.Model] = []
+        self._session_changes: Dict[str, Any] = {}
+
+    # ---------- 读取 ----------
+    def load(self) -> "SendTurnUnitOfWork":
+        last_user = aliased(InteractionTurn)
+        last_ai = aliased(InteractionTurn)
+
+        stmt = (
+            select(ExperimentSession, last_user, last_ai)
+            .select_from(ExperimentSession)
+            .outerjoin(last_user, last_user.id == _latest_turn_id("user"))
+            .outerjoin(last_ai, last_ai.id == _latest_turn_id("ai"))
+            .where(ExperimentSession.session_uuid == self.session_uuid)
+        )
+        row = db.session.execute(stmt).first()
+
+        if row is not None:
+            exp_session, user_turn, ai_turn = row
+            self.session_found = True
+            self.assigned_involvement = exp_session.assigned_involvement
+            self.conversation_state = exp_session.conversation_state
+
+            self.has_history = user_turn is not None or ai_turn is not None
+            if user_turn is not None:
+                self.last_user_vector = user_turn.preference_vector
+            if ai_turn is not None:
+                self.last_ai_products = ai_turn.recommended_products or []
+                self.last_turn_index = ai_turn.turn_index or 0
+
+        # 只读事务到此结束，后面的 LLM 调用不再持有连接
+        db.session.rollback()
+        return self
+
+    @property
+    def next_turn_index(self) -> int:
+        # 等价于旧逻辑“总记录数 // 2 + 1”：AI 回复失败时本轮序号会被下一次请求复用
+        return self.last_turn_index + 1
+
+    # ---------- 登记写入 ----------
+    def add_turn(self, turn: InteractionTurn) -> None:
+        self._pending.append(turn)
+
+    def add_event(self, event: SessionEvent) -> None:
+        """偏好演化 / 决策路径只追加一行事件，不再整体重写 JSON 数组"""
+        if self.session_found:
+            self._pending.append(event)
+
+    def update_session(self, **fields) -> None:
+        self._session_changes.update(fields)
+
+    # ---------- 提交 ----------
+    def commit(self) -> None:
+        """把当前已登记的轮次和会话字段写入一个事务（每轮两次，见类说明）"""
+        try:
+            if self._pending:
+                db.session.add_all(self._pending)
+            if self.session_found and self._session_changes:
+                db.session.execute(
+                    update(ExperimentSession)
+                    .where(ExperimentSession.session_uuid == self.session_uuid)
+                    .values(**self._session_changes)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            self._pending = []
+            self._session_changes = {}
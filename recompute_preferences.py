@@ -0,0 +1,53 @@
+"""
+改词表（utils.lexicon）后离线重算历史用户发言的偏好指标：
+preference_vector / preference_drift / focus_dimension / trajectory_type / purchase_intent_score，
+并同步 session_events，写入词表版本 interaction_turns.lexicon_version
+
+用法：
+    python recompute_preferences.py                          # 只重算词表版本不是当前版本的会话
+    python recompute_preferences.py --workers 8 --page-sessions 500
+    python recompute_preferences.py --all --dry-run          # 全量重算但不写库，只看耗时
+    DATABASE_URL=postgresql://... python recompute_preferences.py
+
+运行前先执行数据库迁移（flask db upgrade），确保 lexicon_version 列存在
+"""
+import argparse
+import logging
+import os
+import time
+
+from import_products import make_engine
+from utils.lexicon import LEXICON_VERSION
+from utils.preference_recompute import recompute_preferences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="历史用户发言偏好指标批量重算")
+    parser.add_argument("--database-url", default=None, help="默认取 DATABASE_URL / config.py")
+    parser.add_argument("--page-sessions", type=int, default=200, help="每页读取 / 写回的会话数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="文本分析进程数，<= 1 时在主进程内分析")
+    parser.add_argument("--version", default=LEXICON_VERSION, help="写入的词表版本标记，默认为当前词表内容哈希")
+    parser.add_argument("--all", action="store_true", help="重算全部会话（默认只重算版本不一致的会话）")
+    parser.add_argument("--dry-run", action="store_true", help="只计算不写库")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    engine = make_engine(args.database_url)
+
+    started = time.perf_counter()
+    stats = recompute_preferences(
+        engine,
+        page_sessions=args.page_sessions,
+        workers=args.workers,
+        version=args.version,
+        only_stale=not args.all,
+        dry_run=args.dry_run,
+    )
+    elapsed = time.perf_counter() - started
+    print(f"偏好指标重算完成：{stats['sessions']} 个会话，{stats['turns']} 条发言，{stats['pages']} 页，"
+          f"版本 {args.version}，耗时 {elapsed:.1f}s（{stats['turns'] / max(elapsed, 1e-9):.0f} 条/秒）"
+          f"{'（dry-run，未写库）' if args.dry_run else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+测试入口：在项目根目录运行
+
+    pip install pytest
+    python -m pytest -q
+"""
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+
+import pytest  # noqa: E402
+
+from utils.fake_deepseek_server import start_fake_server  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """
+    临时 SQLite + 本地 DeepSeek 替身服务；环境变量须在首次导入 app 之前设置，
+    整个测试会话共用同一个 Flask 应用
+    """
+    tmp = tmp_path_factory.mktemp("app")
+    server, base_url = start_fake_server()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("DATABASE_URL", f"sqlite:///{tmp / 'app.db'}")
+        mp.setenv("LLM_CACHE_PATH", str(tmp / "llm_cache.sqlite3"))
+        mp.setenv("DEEPSEEK_BASE_URL", base_url)
+        mp.delenv("DEEPSEEK_API_KEY", raising=False)
+        from app import app as flask_app
+        yield flask_app
+    server.shutdown()
+
+
+@pytest.fixture
+def client(app):
+    """新的浏览器会话：访问首页即分配实验会话"""
+    client = app.test_client()
+    client.get("/")
+    return client
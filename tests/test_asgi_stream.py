@@ -0,0 +1,146 @@
+import asyncio
+import importlib
+import json
+
+import pytest
+
+from utils import deepseek_client
+from utils.fake_deepseek_server import start_fake_server
+
+
+@pytest.fixture
+def asgi_application(app):
+    return importlib.import_module("asgi").application
+
+
+@pytest.fixture
+def slow_stream_server(monkeypatch, app):
+    """逐 token 带延迟的替身服务；异步客户端单例重置为指向它"""
+    server, base_url = start_fake_server(token_delay=0.02)
+    monkeypatch.setenv("DEEPSEEK_BASE_URL", base_url)
+    monkeypatch.setattr(deepseek_client, "_async_client", None)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def always_stream_llm(monkeypatch, app):
+    """回复计划无论是否需要模型都走流式模型调用"""
+    app_module = importlib.import_module("app")
+    prepare = app_module.prepare_ai_response
+
+    def prepare_with_llm(**kwargs):
+        plan = prepare(**kwargs)
+        plan["llm_request"] = plan["llm_request"] or {
+            "user_msg": kwargs["user_msg"],
+            "user_intent": "recommendation",
+            "recommended_products": [],
+            "adapt_level": plan["adapt_level"],
+            "calib_level": plan["calib_level"],
+        }
+        return plan
+
+    monkeypatch.setattr(app_module, "prepare_ai_response", prepare_with_llm)
+
+
+def _scope(app, client, method, path, body=b""):
+    cookie = client.get_cookie(app.config["SESSION_COOKIE_NAME"])
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "http_version": "1.1",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"cookie", f"{cookie.key}={cookie.value}".encode()),
+        ],
+    }
+
+
+async def _request(application, scope, body, on_body=None, disconnected=None):
+    """驱动一次 ASGI 请求，返回 (状态码, 响应体)；disconnected 被 set 后客户端发出 http.disconnect"""
+    disconnected = disconnected or asyncio.Event()
+    messages = [{"type": "http.request", "body": body}]
+    status, chunks = None, []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        else:
+            chunks.append(message.get("body", b""))
+            if on_body:
+                on_body(b"".join(chunks))
+
+    await application(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+def _ai_turns(app, client):
+    from models.main import InteractionTurn
+    with client.session_transaction() as flask_session:
+        session_uuid = flask_session["session_uuid"]
+    with app.app_context():
+        return InteractionTurn.query.filter_by(session_uuid=session_uuid, sender="ai").count()
+
+
+def test_stream_does_not_block_other_requests(app, client, asgi_application, slow_stream_server, always_stream_llm):
+    body = json.dumps({"msg": "预算800以内的降噪耳机"}).encode()
+
+    async def scenario():
+        first_token = asyncio.Event()
+        stream = asyncio.ensure_future(_request(
+            asgi_application, _scope(app, client, "POST", "/api/send_stream", body), body,
+            on_body=lambda data: b"event: token" in data and first_token.set()
+        ))
+        try:
+            await asyncio.wait_for(first_token.wait(), 10)
+            stats_status, _ = await _request(asgi_application, _scope(app, client, "GET", "/api/stats"), b"")
+            stream_still_open = not stream.done()
+            return stats_status, stream_still_open, await stream
+        finally:
+            await deepseek_client.aclose_async_deepseek_client()
+
+    stats_status, stream_still_open, (status, events) = asyncio.run(scenario())
+
+    assert stats_status == 200
+    assert stream_still_open
+    assert status == 200
+    assert b"event: done" in events
+    assert _ai_turns(app, client) == 1
+
+
+def test_disconnected_stream_does_not_commit_the_ai_turn(
+    app, client, asgi_application, slow_stream_server, always_stream_llm
+):
+    body = json.dumps({"msg": "预算800以内的降噪耳机"}).encode()
+
+    async def scenario():
+        disconnected = asyncio.Event()
+        try:
+            return await asyncio.wait_for(_request(
+                asgi_application, _scope(app, client, "POST", "/api/send_stream", body), body,
+                on_body=lambda data: b"event: token" in data and disconnected.set(),
+                disconnected=disconnected
+            ), 10)
+        finally:
+            await deepseek_client.aclose_async_deepseek_client()
+
+    status, events = asyncio.run(scenario())
+
+    assert status == 200
+    assert b"event: token" in events
+    assert b"event: done" not in events
+    assert _ai_turns(app, client) == 0
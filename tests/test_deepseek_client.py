@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from utils import deepseek_client
+from utils.fake_deepseek_server import start_fake_server
+
+CALL_KWARGS = {
+    "user_msg": "预算800以内的降噪耳机",
+    "user_intent": "recommend",
+    "recommended_products": [],
+    "adapt_level": "HIGH",
+    "calib_level": "HIGH",
+}
+
+
+@pytest.fixture
+def null_content_server(monkeypatch):
+    """替身服务总是返回 200 + content: null；客户端单例重置为指向它"""
+    server, base_url = start_fake_server(null_content_rate=1.0)
+    monkeypatch.setenv("DEEPSEEK_BASE_URL", base_url)
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    monkeypatch.setattr(deepseek_client, "_client", None)
+    monkeypatch.setattr(deepseek_client, "_async_client", None)
+    yield server
+    server.shutdown()
+
+
+def test_null_content_falls_back(null_content_server):
+    assert deepseek_client.call_deepseek_with_products(**CALL_KWARGS) == deepseek_client.ERROR_FALLBACK_TEXT
+    assert null_content_server.fake_config.stats["injected_null_contents"] == 1
+
+
+def test_null_content_falls_back_async(null_content_server):
+    async def call():
+        try:
+            return await deepseek_client.acall_deepseek_with_products(**CALL_KWARGS)
+        finally:
+            await deepseek_client.aclose_async_deepseek_client()
+
+    assert asyncio.run(call()) == deepseek_client.ERROR_FALLBACK_TEXT
+    assert null_content_server.fake_config.stats["injected_null_contents"] == 1
@@ -0,0 +1,60 @@
+import pytest
+
+
+def _last_user_turn(app):
+    from models.main import InteractionTurn
+    with app.app_context():
+        return InteractionTurn.query.filter_by(sender="user").order_by(InteractionTurn.id.desc()).first()
+
+
+def test_oversized_body_is_rejected_with_413(app, client):
+    body = {"msg": "降噪" * app.config["MAX_CONTENT_LENGTH"]}
+    response = client.post("/api/send", json=body)
+    assert response.status_code == 413
+    assert response.get_json() == {"error": "Message too long"}
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"json": {}},
+    {"json": {"msg": None}},
+    {"json": {"msg": 123}},
+    {"json": {"msg": ["预算800"]}},
+    {"json": [1]},
+    {"data": '{"msg": 1', "content_type": "application/json"},
+    {"data": "msg=预算800"},
+])
+def test_invalid_message_is_rejected_with_400(client, kwargs):
+    response = client.post("/api/send", **kwargs)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid message"}
+
+
+def test_long_message_is_clipped_before_analysis_and_storage(app, client):
+    from ai.logic import MAX_MESSAGE_CHARS, _CLIP_MARKER
+
+    message = "预算800" + "a" * (MAX_MESSAGE_CHARS * 5) + "就买这个吧"
+    response = client.post("/api/send", json={"msg": message})
+    assert response.status_code == 200
+
+    stored = _last_user_turn(app).content
+    assert len(stored) <= MAX_MESSAGE_CHARS
+    assert _CLIP_MARKER in stored
+    assert stored.startswith("预算800")
+    assert stored.endswith("就买这个吧")
+
+
+def test_short_message_is_stored_unchanged(app, client):
+    response = client.post("/api/send", json={"msg": "预算800以内的降噪耳机"})
+    assert response.status_code == 200
+    assert _last_user_turn(app).content == "预算800以内的降噪耳机"
+
+
+def test_clip_user_message():
+    from ai.logic import _CLIP_MARKER, clip_user_message
+
+    assert clip_user_message("降噪耳机", max_chars=10) == ("降噪耳机", False)
+    max_chars = len(_CLIP_MARKER) + 30
+    clipped, was_clipped = clip_user_message("a" * 600 + "b" * 400, max_chars=max_chars)
+    assert was_clipped
+    assert clipped == "a" * 20 + _CLIP_MARKER + "b" * 10
+    assert len(clipped) == max_chars
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from utils.price_parser import parse_amount, parse_budget, parse_range
+
+
+@pytest.mark.parametrize("text, expected", [
+    # 阿拉伯数字 + 前缀 / 后缀
+    ("预算800", 800),
+    ("500以内", 500),
+    ("1000元以下", 1000),
+    ("300块以内", 300),
+    ("300块左右", 300),
+    ("不超过2000", 2000),
+    ("低于 500", 500),
+    ("控制在1500左右", 1500),
+    # 区间取上限
+    ("预算500-1000", 1000),
+    ("500到1000元以内", 1000),
+    ("1-2千以内", 2000),
+    # 中文数字与量级后缀
+    ("预算两千", 2000),
+    ("一千五左右", 1500),
+    ("预算三千五百", 3500),
+    ("一百零五以内", 105),
+    ("一万二以下", 12000),
+    ("预算1.5k", 1500),
+    ("1.2万以内", 12000),
+    # 多个表达式时按优先级取
+    ("300以下 500块以内", 300),
+    # 阿拉伯数字后的千 / 万 / 百 是下一个词的开头时不是量级后缀
+    ("预算1000千万别超", 1000),
+    ("预算500 万一不够呢", 500),
+    ("预算300百搭款", 300),
+    ("预算1万的耳机", 10000),
+    ("预算2千，要降噪", 2000),
+    # 不是预算
+    ("预算千万别太贵", None),
+    ("一般般，十分想要降噪", None),
+    ("我想要个降噪耳机", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_budget(text, expected):
+    assert parse_budget(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("800", 800),
+    ("1.5k", 1500),
+    ("2千", 2000),
+    ("1.2万", 12000),
+    ("两千", 2000),
+    ("一百零五", 105),
+])
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == expected
+
+
+def test_parse_amount_keeps_long_digit_strings_exact():
+    assert parse_amount("12345678901234567890") == 12345678901234567890
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("500-1000", 1000),
+    ("500到1000", 1000),
+    ("1-2千", 2000),
+    ("800", 800),
+])
+def test_parse_range_returns_upper_bound(text, expected):
+    assert parse_range(text) == expected
+
+
+# 对抗输入：长度放大 10 倍，耗时也应约放大 10 倍（平方级实现会放大约 100 倍）
+ADVERSARIAL = {
+    "digits": lambda n: "1" * n,
+    "budget_keyword": lambda n: "预算" * (n // 2),
+    "digit_space": lambda n: "1 " * (n // 2),
+    "range_dash": lambda n: "1-" * (n // 2),
+    "long_whitespace": lambda n: "预算" + " " * n + "1" + " " * n + "x",
+    "chinese_number": lambda n: "一千" * (n // 2),
+    "digits_then_space": lambda n: "1" * (n // 2) + " " * (n // 2) + "元",
+}
+
+
+def _best_seconds(text: str, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parse_budget(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@pytest.mark.parametrize("name", sorted(ADVERSARIAL))
+def test_parse_budget_is_linear_on_adversarial_input(name):
+    build = ADVERSARIAL[name]
+    small = _best_seconds(build(10000))
+    large = _best_seconds(build(100000))
+    assert large < max(small, 1e-4) * 30, f"{name}: {small * 1000:.3f}ms -> {large * 1000:.3f}ms"
@@ -0,0 +1,80 @@
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def app_module(app):
+    return importlib.import_module("app")
+
+
+def _session_rows(app, client):
+    from models.main import ExperimentSession, InteractionTurn
+    with client.session_transaction() as flask_session:
+        session_uuid = flask_session["session_uuid"]
+    with app.app_context():
+        turns = InteractionTurn.query.filter_by(session_uuid=session_uuid).order_by(InteractionTurn.id).all()
+        exp_session = ExperimentSession.query.filter_by(session_uuid=session_uuid).one()
+        return [(t.sender, t.turn_index) for t in turns], exp_session.conversation_state
+
+
+@pytest.fixture
+def always_call_llm(monkeypatch, app_module):
+    """回复计划无论是否需要模型都走 LLM 调用，便于观察调用前后的落库状态"""
+    prepare = app_module.prepare_ai_response
+
+    def prepare_with_llm(**kwargs):
+        plan = prepare(**kwargs)
+        plan["llm_request"] = plan["llm_request"] or {}
+        return plan
+
+    monkeypatch.setattr(app_module, "prepare_ai_response", prepare_with_llm)
+
+
+def test_user_turn_is_committed_before_the_model_call(app, client, app_module, always_call_llm, monkeypatch):
+    seen = []
+
+    def call_llm(**kwargs):
+        seen.append(_session_rows(app, client)[0])
+        return "好的"
+
+    monkeypatch.setattr(app_module, "call_deepseek_with_products", call_llm)
+    response = client.post("/api/send", json={"msg": "预算800以内的降噪耳机"})
+
+    assert response.status_code == 200
+    assert seen == [[("user", 1)]]
+    turns, state = _session_rows(app, client)
+    assert turns == [("user", 1), ("ai", 1)]
+    assert state["user_turns"] == 1 and state["ai_turns"] == 1
+
+
+def test_user_turn_survives_a_failed_model_call(app, client, app_module, always_call_llm, monkeypatch):
+    def call_llm(**kwargs):
+        raise RuntimeError("worker killed")
+
+    monkeypatch.setattr(app_module, "call_deepseek_with_products", call_llm)
+    response = client.post("/api/send", json={"msg": "预算800以内的降噪耳机"})
+
+    assert response.status_code == 500
+    turns, state = _session_rows(app, client)
+    assert turns == [("user", 1)]
+    assert state["user_turns"] == 1 and state["ai_turns"] == 0
+
+
+def test_failed_plan_commits_the_user_turn_without_the_snapshot(app, client, app_module, monkeypatch):
+    assert client.post("/api/send", json={"msg": "预算800以内的降噪耳机"}).status_code == 200
+    _, snapshot_before = _session_rows(app, client)
+
+    prepare = app_module.prepare_ai_response
+
+    def prepare_fails(**kwargs):
+        prepare(**kwargs)  # 会话状态已合并本轮发言后才失败
+        raise RuntimeError("plan failed")
+
+    monkeypatch.setattr(app_module, "prepare_ai_response", prepare_fails)
+    response = client.post("/api/send", json={"msg": "有没有索尼的"})
+
+    assert response.status_code == 500
+    turns, snapshot_after = _session_rows(app, client)
+    assert turns == [("user", 1), ("ai", 1), ("user", 2)]
+    assert snapshot_after == snapshot_before
@@ -0,0 +1,70 @@
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 缓存格式版本：列定义 / 标准化规则变化时加一，旧缓存自动失效
+CACHE_FORMAT = 2
+
+
+class CatalogCache:
+    """
+    商品目录列缓存：CSV 内容哈希 -> 一个目录，每列一个 .npy 文件
+    - 只存数值数组和定长 Unicode 数组（无 pickle），worker 启动时 np.load(mmap_mode="r") 直接映射
+    - 先写临时目录再整体 rename，多个 worker 同时冷启动也不会读到写了一半的缓存
+    - 只保留最近 keep 份，CSV 反复修改时不无限增长
+    """
+
+    def __init__(self, root: str, keep: int = 3):
+        self.root = root
+        self.keep = keep
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, f"{digest[:16]}-v{CACHE_FORMAT}")
+
+    def load(self, digest: str) -> Optional[Dict[str, np.ndarray]]:
+        """命中返回 {列名: 只读内存映射数组}，未命中或缓存损坏返回 None"""
+        path = self._path(digest)
+        if not os.path.isdir(path):
+            return None
+        try:
+            return {
+                name[:-len(".npy")]: np.load(os.path.join(path, name), mmap_mode="r")
+                for name in os.listdir(path) if name.endswith(".npy")
+            }
+        except Exception:
+            logger.warning("商品目录缓存损坏，改为重新解析：%s", path, exc_info=True)
+            return None
+
+    def save(self, digest: str, columns: Dict[str, np.ndarray]) -> None:
+        """写入失败只记日志，不影响本次加载"""
+        path = self._path(digest)
+        if os.path.isdir(path):
+            return
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.root)
+            for name, array in columns.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), array, allow_pickle=False)
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                # 另一个 worker 已经写好了同一份缓存
+                shutil.rmtree(tmp, ignore_errors=True)
+            self._prune()
+        except Exception:
+            logger.warning("商品目录缓存写入失败：%s", path, exc_info=True)
+
+    def _prune(self) -> None:
+        entries = [
+            os.path.join(self.root, name) for name in os.listdir(self.root)
+            if not name.startswith(".")
+        ]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for stale in entries[self.keep:]:
+            shutil.rmtree(stale, ignore_errors=True)
@@ -0,0 +1,122 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Callable, Optional, Tuple
+
+from utils.product_catalog import ProductCatalog
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogManager:
+    """
+    商品目录热更新（写时复制）：
+    - 后台线程每 poll_seconds 检查一次 CSV 的 mtime / 大小，变化后再比对内容哈希，哈希变了才重建
+    - 新目录连同全部派生索引在后台线程完整构建好，再用一次引用赋值发布；
+      请求线程只读取 self._catalog，拿到的要么是旧目录、要么是新目录，不会看到构建到一半的状态
+    - 重建失败时继续使用旧目录，文件再次变化后再试
+    - 目录版本 = 文件内容 sha256 的前 12 位，记录在每轮 AI 回复上
+    - build_fn(文件内容, 完整 sha256)：哈希可用作构建缓存的键
+    """
+
+    def __init__(
+        self,
+        path: str,
+        build_fn: Callable[[bytes, str], ProductCatalog],
+        poll_seconds: float = 5.0
+    ):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self._build = build_fn
+
+        self._catalog: Optional[ProductCatalog] = None
+        self._file_signature: Optional[Tuple[int, int]] = None
+        self._digest: Optional[str] = None
+
+        self._reload_lock = threading.Lock()  # 只在写者之间互斥，读者不加锁
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ---------- 读 ----------
+    def current(self) -> ProductCatalog:
+        """当前目录；首次调用时同步加载并启动后台监视线程"""
+        catalog = self._catalog
+        if catalog is None:
+            self.reload()
+            self.start_watcher()
+            catalog = self._catalog
+        return catalog
+
+    @property
+    def version(self) -> Optional[str]:
+        catalog = self._catalog
+        return catalog.version if catalog is not None else None
+
+    # ---------- 写 ----------
+    def _signature(self) -> Tuple[int, int]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"商品CSV文件未找到，请检查路径：{self.path}")
+        return st.st_mtime_ns, st.st_size
+
+    def reload(self, force: bool = False) -> bool:
+        """文件有变化时重建并发布新目录；返回是否发布了新版本"""
+        with self._reload_lock:
+            signature = self._signature()
+            if not force and self._catalog is not None and signature == self._file_signature:
+                return False
+
+            with open(self.path, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+
+            if not force and self._catalog is not None and digest == self._digest:
+                # 只是 touch / 原样保存，内容没变
+                self._file_signature = signature
+                return False
+
+            # 先记下签名：构建失败时不在每次轮询重复报错，等文件再次变化再试
+            self._file_signature = signature
+            catalog = self._build(data, digest)
+            catalog.version = digest[:12]
+
+            self._digest = digest
+            previous = self._catalog
+            self._catalog = catalog  # 原子发布
+
+        if previous is not None:
+            logger.info(
+                "商品目录已更新：%s (%d 款) -> %s (%d 款)",
+                previous.version, len(previous), catalog.version, len(catalog)
+            )
+        return True
+
+    def publish(self, catalog: ProductCatalog, version: Optional[str] = None) -> None:
+        """直接发布一个已构建好的目录（基准测试 / 脚本用）"""
+        if version is not None:
+            catalog.version = version
+        with self._reload_lock:
+            self._catalog = catalog
+
+    # ---------- 后台监视 ----------
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("商品目录重建失败，继续使用版本 %s", self.version)
+
+    def start_watcher(self) -> None:
+        if self.poll_seconds <= 0:
+            return
+        with self._reload_lock:
+            if self._watcher is not None and self._watcher.is_alive():
+                return
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="catalog-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
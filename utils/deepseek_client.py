@@ -1,18 +1,14 @@
+import asyncio
 import os
 import logging
+import threading
 import httpx
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 
-from openai import OpenAI
-from openai._exceptions import OpenAIError
+from openai import AsyncOpenAI, OpenAI
 
-try:
-    from openai._exceptions import Timeout
-except ImportError:
-    try:
-        from openai._exceptions import timeout as Timeout
-    except ImportError:
-        Timeout = OpenAIError
+from utils.llm_cache import LLMResponseCache
+from utils.llm_resilience import CircuitOpenError, ResilientCaller, is_timeout_error
 
 try:
     from dotenv import load_dotenv
@@ -27,14 +23,62 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+DEEPSEEK_MODEL = "deepseek-chat"
+DEEPSEEK_TEMPERATURE = 0.3
+
+# LLM 回复缓存：按实验条件显式开启，保证操控变量受控
+# LLM_CACHE_CONDITIONS 格式为 "适应性:校准"，逗号分隔，例如 "LOW:LOW,LOW:HIGH"；为空则不缓存
+LLM_CACHE_CONDITIONS = {
+    tuple(x.strip() for x in part.upper().split(":", 1))
+    for part in os.environ.get("LLM_CACHE_CONDITIONS", "").split(",")
+    if ":" in part
+}
+llm_cache = LLMResponseCache(
+    db_path=os.environ.get(
+        "LLM_CACHE_PATH",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "llm_cache.sqlite3")
+    ),
+    max_memory_entries=int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", "1024")),
+    max_disk_entries=int(os.environ.get("LLM_CACHE_DISK_ENTRIES", "50000")),
+    ttl_seconds=float(os.environ.get("LLM_CACHE_TTL_SECONDS", "86400")),
+)
+
 
-def init_deepseek_client():
+_LOCAL_HOSTS = ("localhost", "127.0.0.1", "0.0.0.0", "::1")
+
+
+def _is_local_base_url(base_url: str) -> bool:
+    """指向本地替身服务（utils/fake_deepseek_server.py）时不需要真实 key"""
+    return httpx.URL(base_url).host in _LOCAL_HOSTS
+
+
+# 调用容错：总时限、重试、对冲请求、熔断（见 utils/llm_resilience.py）
+# 对冲请求会重复消耗 token，默认关闭；DEEPSEEK_HEDGE=1 开启
+llm_caller = ResilientCaller(
+    deadline_seconds=float(os.environ.get("DEEPSEEK_DEADLINE_SECONDS", "25")),
+    max_attempts=int(os.environ.get("DEEPSEEK_MAX_ATTEMPTS", "3")),
+    retry_base_delay=float(os.environ.get("DEEPSEEK_RETRY_BASE_DELAY", "0.25")),
+    hedge_enabled=os.environ.get("DEEPSEEK_HEDGE", "0") not in ("0", "false", "False", ""),
+    hedge_min_samples=int(os.environ.get("DEEPSEEK_HEDGE_MIN_SAMPLES", "20")),
+    breaker_failures=int(os.environ.get("DEEPSEEK_BREAKER_FAILURES", "5")),
+    breaker_reset_seconds=float(os.environ.get("DEEPSEEK_BREAKER_RESET_SECONDS", "30")),
+)
+
+
+def _deepseek_settings():
+    base_url = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
     api_key = os.environ.get("DEEPSEEK_API_KEY")
     if not api_key:
+        if _is_local_base_url(base_url):
+            return "local-fake-key", base_url
         logger.error("❌ 未配置 DEEPSEEK_API_KEY 环境变量！")
         raise ValueError("请在 Render 控制台 -> Environment 添加 DEEPSEEK_API_KEY")
 
-    base_url = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+    return api_key, base_url
+
+
+def init_deepseek_client():
+    api_key, base_url = _deepseek_settings()
 
     http_client = httpx.Client(
         timeout=30.0,
@@ -46,7 +90,8 @@ def init_deepseek_client():
         client = OpenAI(
             api_key=api_key,
             base_url=base_url,
-            http_client=http_client
+            http_client=http_client,
+            max_retries=0  # 重试由 llm_caller 按剩余时限控制
         )
         logger.info("✅ DeepSeek 客户端初始化成功")
         return client
@@ -55,7 +100,64 @@ def init_deepseek_client():
         raise
 
 
-client = init_deepseek_client()
+def init_async_deepseek_client():
+    """
+    异步客户端（ASGI 模式使用）：单进程内可同时挂起大量等待 DeepSeek 的请求，
+    连接池上限由 DEEPSEEK_MAX_CONNECTIONS 控制
+    """
+    api_key, base_url = _deepseek_settings()
+    max_connections = int(os.environ.get("DEEPSEEK_MAX_CONNECTIONS", "500"))
+
+    http_client = httpx.AsyncClient(
+        timeout=30.0,
+        proxies=None,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    )
+
+    try:
+        async_client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=0  # 重试由 llm_caller 按剩余时限控制
+        )
+        logger.info("✅ DeepSeek 异步客户端初始化成功")
+        return async_client
+    except Exception as e:
+        logger.error(f"❌ 异步客户端初始化失败：{str(e)}")
+        raise
+
+
+# 客户端首次调用时再创建：导入本模块不再要求已配置 DEEPSEEK_API_KEY
+_client = None
+_client_lock = threading.Lock()
+
+# 异步客户端需绑定到 ASGI 服务器的事件循环，首次使用时再创建
+_async_client = None
+
+
+def get_deepseek_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = init_deepseek_client()
+    return _client
+
+
+def get_async_deepseek_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = init_async_deepseek_client()
+    return _async_client
+
+
+async def aclose_async_deepseek_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
 
 
 def _format_product_text(recommended_products: List[Dict], previous_products: Optional[List[Dict]] = None) -> str:
@@ -147,7 +249,46 @@ def _build_system_prompt(adapt_level: str, calib_level: str) -> str:
 """
 
 
-def call_deepseek_with_products(
+def llm_cache_enabled(adapt_level: str, calib_level: str) -> bool:
+    return ((adapt_level or "").upper(), (calib_level or "").upper()) in LLM_CACHE_CONDITIONS
+
+
+def get_llm_cache_stats() -> Dict:
+    return llm_cache.stats()
+
+
+def get_llm_metrics() -> Dict:
+    return llm_caller.get_metrics()
+
+
+def _fallback_text(error: Exception) -> str:
+    if isinstance(error, CircuitOpenError):
+        logger.warning("DeepSeek 熔断中，直接返回兜底回复")
+        return ERROR_FALLBACK_TEXT
+    if is_timeout_error(error):
+        logger.error(f"DeepSeek API 超时：{error!r}")
+        return TIMEOUT_FALLBACK_TEXT
+    logger.error(f"DeepSeek API 调用失败：{error!r}")
+    return ERROR_FALLBACK_TEXT
+
+
+def _response_text(response) -> str:
+    """取出非流式回复的文本；choices 为空、content 为 null 等畸形回复在这里抛出，由调用方转成兜底文案"""
+    return response.choices[0].message.content.strip()
+
+
+def _llm_cache_key(messages: List[Dict], adapt_level: str, calib_level: str) -> Optional[str]:
+    """当前实验条件未开启缓存时返回 None"""
+    if not llm_cache_enabled(adapt_level, calib_level):
+        return None
+    return LLMResponseCache.make_key(messages, DEEPSEEK_MODEL, DEEPSEEK_TEMPERATURE)
+
+
+TIMEOUT_FALLBACK_TEXT = "抱歉，我这边刚刚响应有点慢。你前面提到的需求我会继续沿用，你可以再发一句，我接着帮你看。"
+ERROR_FALLBACK_TEXT = "抱歉，我暂时无法继续推荐。不过你前面提到的需求我会按原条件理解，你可以稍后再试一次。"
+
+
+def build_deepseek_messages(
     user_msg: str,
     user_intent: str,
     recommended_products: list,
@@ -155,7 +296,7 @@ def call_deepseek_with_products(
     calib_level: str,
     memory_profile: Optional[Dict] = None,
     previous_products: Optional[List[Dict]] = None
-) -> str:
+) -> List[Dict]:
     product_text = _format_product_text(recommended_products, previous_products)
     memory_text = _format_memory_text(memory_profile)
     system_prompt = _build_system_prompt(adapt_level, calib_level)
@@ -172,25 +313,223 @@ def call_deepseek_with_products(
 - 如果当前只是初步需求，不要表现得过早确定。
 - 如果需要追问，只能问最关键的缺失项。"""
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def call_deepseek_with_products(
+    user_msg: str,
+    user_intent: str,
+    recommended_products: list,
+    adapt_level: str,
+    calib_level: str,
+    memory_profile: Optional[Dict] = None,
+    previous_products: Optional[List[Dict]] = None
+) -> str:
+    messages = build_deepseek_messages(
+        user_msg, user_intent, recommended_products, adapt_level, calib_level,
+        memory_profile, previous_products
+    )
+
+    cache_key = _llm_cache_key(messages, adapt_level, calib_level)
+    if cache_key:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    def request(timeout: float):
+        return get_deepseek_client().chat.completions.create(
+            model=DEEPSEEK_MODEL,
+            messages=messages,
+            stream=False,
+            temperature=DEEPSEEK_TEMPERATURE,
+            timeout=timeout
+        )
+
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
+        ai_text = _response_text(llm_caller.call(request))
+    except Exception as e:
+        return _fallback_text(e)
+
+    if cache_key:
+        llm_cache.set(cache_key, ai_text)
+    return ai_text
+
+
+async def acall_deepseek_with_products(
+    user_msg: str,
+    user_intent: str,
+    recommended_products: list,
+    adapt_level: str,
+    calib_level: str,
+    memory_profile: Optional[Dict] = None,
+    previous_products: Optional[List[Dict]] = None
+) -> str:
+    """
+    call_deepseek_with_products 的异步版本，等待模型期间不占用线程
+    回复缓存的磁盘层是同步 SQLite 读写，放到线程池执行，慢盘 / 锁库不阻塞事件循环上的其他会话
+    """
+    messages = build_deepseek_messages(
+        user_msg, user_intent, recommended_products, adapt_level, calib_level,
+        memory_profile, previous_products
+    )
+
+    cache_key = _llm_cache_key(messages, adapt_level, calib_level)
+    if cache_key:
+        cached = await asyncio.to_thread(llm_cache.get, cache_key)
+        if cached is not None:
+            return cached
+
+    async def request(timeout: float):
+        return await get_async_deepseek_client().chat.completions.create(
+            model=DEEPSEEK_MODEL,
+            messages=messages,
             stream=False,
-            temperature=0.3
+            temperature=DEEPSEEK_TEMPERATURE,
+            timeout=timeout
+        )
+
+    try:
+        ai_text = _response_text(await llm_caller.acall(request))
+    except Exception as e:
+        return _fallback_text(e)
+
+    if cache_key:
+        await asyncio.to_thread(llm_cache.set, cache_key, ai_text)
+    return ai_text
+
+
+def stream_deepseek_with_products(
+    user_msg: str,
+    user_intent: str,
+    recommended_products: list,
+    adapt_level: str,
+    calib_level: str,
+    memory_profile: Optional[Dict] = None,
+    previous_products: Optional[List[Dict]] = None
+) -> Iterator[str]:
+    """
+    流式版本：逐段 yield 模型输出的文本增量
+    - 首个 token 之前出错：yield 与非流式版本相同的兜底文案
+    - 输出中途出错：记录日志并结束，已输出的部分即为本轮回复
+    - 调用方提前 close() 生成器（例如前端断开）时，关闭上游 HTTP 连接
+    """
+    messages = build_deepseek_messages(
+        user_msg, user_intent, recommended_products, adapt_level, calib_level,
+        memory_profile, previous_products
+    )
+
+    cache_key = _llm_cache_key(messages, adapt_level, calib_level)
+    if cache_key:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    def request(timeout: float):
+        return get_deepseek_client().chat.completions.create(
+            model=DEEPSEEK_MODEL,
+            messages=messages,
+            stream=True,
+            temperature=DEEPSEEK_TEMPERATURE,
+            timeout=timeout
         )
-        return response.choices[0].message.content.strip()
 
-    except Timeout as e:
-        logger.error(f"DeepSeek API 超时：{str(e)}")
-        return "抱歉，我这边刚刚响应有点慢。你前面提到的需求我会继续沿用，你可以再发一句，我接着帮你看。"
+    try:
+        stream = llm_caller.open_stream(request)
+    except Exception as e:
+        yield _fallback_text(e)
+        return
+
+    emitted = False
+    parts = []
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                emitted = True
+                parts.append(delta)
+                yield delta
+
+        # 只有完整输出的回复才进缓存
+        if cache_key and parts:
+            llm_cache.set(cache_key, "".join(parts).strip())
 
     except Exception as e:
-        logger.error(f"DeepSeek API 调用失败：{str(e)}")
-        return "抱歉，我暂时无法继续推荐。不过你前面提到的需求我会按原条件理解，你可以稍后再试一次。"
+        llm_caller.report_stream_failure(e)
+        fallback = _fallback_text(e)
+        if not emitted:
+            yield fallback
+
+    finally:
+        stream.response.close()
 
 
+async def astream_deepseek_with_products(
+    user_msg: str,
+    user_intent: str,
+    recommended_products: list,
+    adapt_level: str,
+    calib_level: str,
+    memory_profile: Optional[Dict] = None,
+    previous_products: Optional[List[Dict]] = None
+) -> AsyncIterator[str]:
+    """
+    stream_deepseek_with_products 的异步版本（ASGI 模式），出错与断开的处理相同；
+    等待 token 期间只挂起协程，不占线程
+    """
+    messages = build_deepseek_messages(
+        user_msg, user_intent, recommended_products, adapt_level, calib_level,
+        memory_profile, previous_products
+    )
+
+    cache_key = _llm_cache_key(messages, adapt_level, calib_level)
+    if cache_key:
+        cached = await asyncio.to_thread(llm_cache.get, cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    async def request(timeout: float):
+        return await get_async_deepseek_client().chat.completions.create(
+            model=DEEPSEEK_MODEL,
+            messages=messages,
+            stream=True,
+            temperature=DEEPSEEK_TEMPERATURE,
+            timeout=timeout
+        )
+
+    try:
+        stream = await llm_caller.aopen_stream(request)
+    except Exception as e:
+        yield _fallback_text(e)
+        return
+
+    emitted = False
+    parts = []
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                emitted = True
+                parts.append(delta)
+                yield delta
+
+        # 只有完整输出的回复才进缓存
+        if cache_key and parts:
+            await asyncio.to_thread(llm_cache.set, cache_key, "".join(parts).strip())
+
+    except Exception as e:
+        llm_caller.report_stream_failure(e)
+        fallback = _fallback_text(e)
+        if not emitted:
+            yield fallback
 
+    finally:
+        await stream.response.aclose()
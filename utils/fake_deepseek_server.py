@@ -0,0 +1,348 @@
+"""
+本地 DeepSeek 替身服务（OpenAI 兼容接口），用于压测 / 基准测试 / 无外网的本地运行：
+
+    python -m utils.fake_deepseek_server --port 8765 --latency lognormal:0.8,0.4 --error-rate 0.02
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8765 python app.py
+
+- POST /chat/completions、/v1/chat/completions：支持 stream=true（SSE，逐 token 输出）
+- GET  /models、/v1/models：返回 deepseek-chat
+- GET  /_fake/stats：请求数、注入的错误 / 超时 / 空回复次数
+- --null-content-rate：按概率返回 200 但 content 为 null 的畸形回复，用于验证兜底文案
+- 回复内容只由 messages 决定（同样的 prompt 得到同样的回复），并引用 prompt 中候选商品的 Product ID
+- 延迟分布：fixed:S、uniform:A,B、normal:MU,SIGMA、lognormal:MU,SIGMA、exponential:MEAN（单位秒）
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+FAKE_MODEL = "deepseek-chat"
+
+# "1. 索尼 WH-1000XM5 [EAR001] | ¥2499 | ..." 这样的候选商品行
+_PRODUCT_LINE_RE = re.compile(r"^\s*\d+\.\s*(?P<name>.+?)\s*\[(?P<pid>[A-Za-z]+\d+)\]", re.M)
+_NEW_CANDIDATES_MARK = "【本轮允许推荐的新候选商品】"
+
+_OPENINGS = [
+    "我先按你目前的需求大致筛了一下，",
+    "结合你前面提到的情况，",
+    "我目前大致理解你的方向了，",
+    "按这个思路给你挑了几款，",
+]
+_CLOSINGS = [
+    "你更在意哪一点，我可以再帮你细看。",
+    "如果预算或类型有变化，随时告诉我。",
+    "要不要我再对比一下它们的差异？",
+    "你可以先看看，有问题继续问我。",
+]
+
+
+# =========================
+# 延迟分布
+# =========================
+def parse_latency_spec(spec: str) -> Callable[[random.Random], float]:
+    """把 "lognormal:0.8,0.4" 之类的描述转成采样函数（返回秒，不小于 0）"""
+    name, _, raw_args = (spec or "fixed:0").partition(":")
+    args = [float(x) for x in raw_args.split(",") if x.strip()]
+    name = name.strip().lower()
+
+    if name == "fixed":
+        value = args[0] if args else 0.0
+        return lambda rng: max(0.0, value)
+    if name == "uniform":
+        low, high = (args + [0.0, 0.0])[:2]
+        return lambda rng: max(0.0, rng.uniform(low, high))
+    if name == "normal":
+        mu, sigma = (args + [0.0, 0.0])[:2]
+        return lambda rng: max(0.0, rng.gauss(mu, sigma))
+    if name == "lognormal":
+        # 参数为分布的中位数（秒）和对数标准差，长尾更贴近真实 LLM 延迟
+        median, sigma = (args + [1.0, 0.5])[:2]
+        mu = math.log(max(median, 1e-6))
+        return lambda rng: max(0.0, rng.lognormvariate(mu, sigma))
+    if name == "exponential":
+        mean = args[0] if args else 1.0
+        return lambda rng: max(0.0, rng.expovariate(1.0 / mean)) if mean > 0 else 0.0
+    raise ValueError(f"未知的延迟分布：{spec}")
+
+
+# =========================
+# 确定性回复
+# =========================
+def _extract_candidates(prompt: str) -> List[Tuple[str, str]]:
+    """优先取本轮新候选商品；没有时退回 prompt 中出现的全部商品"""
+    section = prompt.split(_NEW_CANDIDATES_MARK, 1)
+    source = section[1] if len(section) == 2 else prompt
+    seen = set()
+    candidates = []
+    for match in _PRODUCT_LINE_RE.finditer(source):
+        pid = match.group("pid")
+        if pid not in seen:
+            seen.add(pid)
+            candidates.append((match.group("name"), pid))
+    return candidates
+
+
+def build_fake_reply(messages: List[Dict]) -> str:
+    """同样的 messages 总是得到同样的回复"""
+    digest = hashlib.sha256(
+        json.dumps(messages, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    ).digest()
+    rng = random.Random(digest)
+
+    prompt = "\n".join(str(m.get("content", "")) for m in messages if m.get("role") == "user")
+    candidates = _extract_candidates(prompt)
+
+    if not candidates:
+        return "目前店里暂时没有特别吻合的款式，你可以说说预算或者更看重的功能，我再帮你找找。"
+
+    picks = candidates[:min(len(candidates), rng.randint(1, 3))]
+    cited = "；".join(f"{name} [{pid}]" for name, pid in picks)
+    return f"{rng.choice(_OPENINGS)}比较推荐这几款：{cited}。{rng.choice(_CLOSINGS)}"
+
+
+def _split_tokens(text: str, size: int = 2) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# =========================
+# HTTP 服务
+# =========================
+class FakeDeepSeekConfig:
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        token_delay: float = 0.0,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        hang_seconds: float = 120.0,
+        seed: Optional[int] = None,
+        null_content_rate: float = 0.0
+    ):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency_spec(latency)
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.null_content_rate = null_content_rate
+        self.hang_seconds = hang_seconds
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "stream_requests": 0,
+            "injected_errors": 0,
+            "injected_timeouts": 0,
+            "injected_null_contents": 0,
+        }
+
+    def draw(self) -> Tuple[str, float]:
+        """一次抽样：返回 (结果类型 ok/error/timeout/null_content, 首 token 前延迟)"""
+        with self.lock:
+            roll = self.rng.random()
+            latency = self.sample_latency(self.rng)
+        if roll < self.error_rate:
+            return "error", latency
+        if roll < self.error_rate + self.timeout_rate:
+            return "timeout", latency
+        if roll < self.error_rate + self.timeout_rate + self.null_content_rate:
+            return "null_content", latency
+        return "ok", latency
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] += 1
+
+
+class _FakeDeepSeekHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeDeepSeek/1.0"
+
+    @property
+    def config(self) -> FakeDeepSeekConfig:
+        return self.server.fake_config
+
+    def log_message(self, format, *args):
+        pass  # 压测时不刷屏
+
+    def _send_json(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # 客户端已放弃（超时 / 对冲请求被取消）
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path in ("/models", "/v1/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": FAKE_MODEL, "object": "model", "owned_by": "fake"}]})
+        elif path == "/_fake/stats":
+            with self.config.lock:
+                stats = dict(self.config.stats)
+            self._send_json(200, stats)
+        else:
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+
+        if path not in ("/chat/completions", "/v1/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+
+        try:
+            payload = json.loads(raw or b"{}")
+            messages = payload.get("messages") or []
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid json", "type": "invalid_request_error"}})
+            return
+
+        stream = bool(payload.get("stream"))
+        self.config.count("requests")
+        if stream:
+            self.config.count("stream_requests")
+
+        outcome, latency = self.config.draw()
+        if outcome == "timeout":
+            # 超时注入：一直不回，直到客户端放弃或 hang_seconds 到期
+            self.config.count("injected_timeouts")
+            time.sleep(self.config.hang_seconds)
+            self.close_connection = True
+            return
+
+        time.sleep(latency)
+        if outcome == "error":
+            self.config.count("injected_errors")
+            self._send_json(503, {"error": {"message": "injected upstream error", "type": "server_error"}})
+            return
+
+        reply = build_fake_reply(messages)
+        if outcome == "null_content":
+            self.config.count("injected_null_contents")
+            reply = None
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = payload.get("model") or FAKE_MODEL
+
+        if stream:
+            self._stream_reply(reply, completion_id, created, model)
+            return
+
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_chars,
+                "completion_tokens": len(reply or ""),
+                "total_tokens": prompt_chars + len(reply or ""),
+            },
+        })
+
+    def _stream_reply(self, reply: Optional[str], completion_id: str, created: int, model: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta: Dict, finish_reason: Optional[str] = None) -> bytes:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        try:
+            self.wfile.write(chunk({"role": "assistant", "content": ""}))
+            if reply is None:
+                self.wfile.write(chunk({"content": None}))
+            for token in _split_tokens(reply or ""):
+                if self.config.token_delay:
+                    time.sleep(self.config.token_delay)
+                self.wfile.write(chunk({"content": token}))
+                self.wfile.flush()
+            self.wfile.write(chunk({}, "stop"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端中途断开
+
+
+def make_fake_server(host: str = "127.0.0.1", port: int = 0, **config_kwargs) -> ThreadingHTTPServer:
+    """port=0 时由系统分配端口，实际地址见 server.server_address"""
+    server = ThreadingHTTPServer((host, port), _FakeDeepSeekHandler)
+    server.daemon_threads = True
+    server.fake_config = FakeDeepSeekConfig(**config_kwargs)
+    return server
+
+
+def start_fake_server(host: str = "127.0.0.1", port: int = 0, **config_kwargs) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    在后台线程启动替身服务，返回 (server, base_url)，供基准脚本直接使用；
+    用完调用 server.shutdown()
+    """
+    server = make_fake_server(host, port, **config_kwargs)
+    thread = threading.Thread(target=server.serve_forever, name="fake-deepseek", daemon=True)
+    thread.start()
+    bound_host, bound_port = server.server_address[:2]
+    return server, f"http://{bound_host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 DeepSeek 替身服务（OpenAI 兼容）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="fixed:0", help="首 token 前延迟分布，如 lognormal:0.8,0.4")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="流式输出时每个 token 的间隔（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的概率")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="挂起不回的概率")
+    parser.add_argument("--hang-seconds", type=float, default=120.0, help="超时注入时挂起的秒数")
+    parser.add_argument("--null-content-rate", type=float, default=0.0, help="返回 content 为 null 的概率")
+    parser.add_argument("--seed", type=int, default=None, help="延迟 / 故障抽样的随机种子")
+    args = parser.parse_args()
+
+    server = make_fake_server(
+        args.host, args.port,
+        latency=args.latency,
+        token_delay=args.token_delay,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang_seconds,
+        seed=args.seed,
+        null_content_rate=args.null_content_rate,
+    )
+    print(f"Fake DeepSeek listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+from collections import deque
+from typing import Any, Dict, Iterable, List, NamedTuple, Sequence, Tuple, Union
+
+
+class KeywordHit(NamedTuple):
+    """一次命中：text[start:end] == keyword，属于词表 category 的第 rank 项，规范值为 value"""
+    start: int
+    end: int
+    keyword: str
+    category: str
+    rank: int
+    value: Any
+
+
+class KeywordHits:
+    """
+    一条文本在全部词表上的命中结果，按词表（category）查询：
+    - has / count：是否命中 / 命中了词表中几项（与 any(k in text) / sum(1 for k in text) 等价）
+    - first：词表中排在最前的命中项的规范值（与按词表顺序遍历、取第一个命中等价）
+    - values：按词表顺序排列的命中规范值（可去重）
+    查询代价只与命中数有关，与词表大小无关
+    """
+
+    __slots__ = ("text", "_spans", "_patterns", "_by_category")
+
+    def __init__(self, text: str, spans: List[Tuple[int, int]], patterns: Sequence[Tuple[str, tuple]]):
+        self.text = text  # 被扫描的文本（调用方规范化之后的）
+        self._spans = spans  # (结束位置, 关键词编号)
+        self._patterns = patterns
+        # category -> {rank: value}，同一关键词在文本中出现多次只记一次
+        by_category: Dict[str, Dict[int, Any]] = {}
+        for pid in {pid for _, pid in spans} if spans else ():
+            for category, rank, value in patterns[pid][1]:
+                ranks = by_category.get(category)
+                if ranks is None:
+                    by_category[category] = {rank: value}
+                else:
+                    ranks[rank] = value
+        self._by_category = by_category
+
+    def __iter__(self):
+        """全部命中（含重叠、重复出现），按结束位置排列"""
+        for end, pid in self._spans:
+            keyword, entries = self._patterns[pid]
+            for category, rank, value in entries:
+                yield KeywordHit(end - len(keyword), end, keyword, category, rank, value)
+
+    def has(self, *categories: str) -> bool:
+        for category in categories:
+            if category in self._by_category:
+                return True
+        return False
+
+    def count(self, *categories: str) -> int:
+        total = 0
+        for category in categories:
+            ranks = self._by_category.get(category)
+            if ranks:
+                total += len(ranks)
+        return total
+
+    def first(self, category: str, default: Any = None) -> Any:
+        ranks = self._by_category.get(category)
+        if not ranks:
+            return default
+        return ranks[min(ranks)]
+
+    def values(self, category: str, unique: bool = False) -> List[Any]:
+        ranks = self._by_category.get(category)
+        if not ranks:
+            return []
+        ordered = [ranks[r] for r in sorted(ranks)] if len(ranks) > 1 else list(ranks.values())
+        if not unique or len(ordered) == 1:
+            return ordered
+        found = []
+        for value in ordered:
+            if value not in found:
+                found.append(value)
+        return found
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick 多模式匹配：所有词表编译成一个自动机，文本只扫描一遍即得到全部命中
+    - lexicons：category -> 关键词列表，或 (关键词, 规范值) 列表；列表顺序即优先级（rank）
+    - 同一关键词可出现在多个词表中，命中时各词表分别记录
+    - 构建时把失败链展开成完整转移表，扫描每个字符只做一次字典查找
+    匹配区分大小写，调用方按需先规范化文本（如统一小写）
+    """
+
+    def __init__(self, lexicons: Dict[str, Iterable[Union[str, Tuple[str, Any]]]]):
+        pattern_ids: Dict[str, int] = {}
+        entries: List[List[tuple]] = []
+        for category, words in lexicons.items():
+            for rank, word in enumerate(words):
+                keyword, value = word if isinstance(word, tuple) else (word, word)
+                if not keyword:
+                    continue
+                if keyword not in pattern_ids:
+                    pattern_ids[keyword] = len(entries)
+                    entries.append([])
+                entries[pattern_ids[keyword]].append((category, rank, value))
+        self.patterns: Tuple[Tuple[str, tuple], ...] = tuple(
+            (keyword, tuple(entries[pid])) for keyword, pid in pattern_ids.items()
+        )
+        self._build()
+
+    # ---------- 构建 ----------
+    def _build(self) -> None:
+        # 1. 字典树
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for pid, (keyword, _) in enumerate(self.patterns):
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(pid)
+
+        # 2. 按层（BFS）计算失败指针，同时把失败状态的转移和输出并入当前状态
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [None] * (len(goto) - 1)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            transitions = dict(delta[fail[state]])
+            for ch, nxt in goto[state].items():
+                # 根的直接子节点失败指针为根，其余沿父状态的失败转移（更浅的状态已处理完）
+                fail[nxt] = delta[fail[state]].get(ch, 0)
+                transitions[ch] = nxt
+                queue.append(nxt)
+            delta[state] = transitions
+            outputs[state] = outputs[state] + outputs[fail[state]]
+
+        self._delta = delta
+        self._outputs = [tuple(out) for out in outputs]
+
+    # ---------- 扫描 ----------
+    def scan(self, text: str) -> KeywordHits:
+        text = text or ""
+        delta, outputs = self._delta, self._outputs
+        spans: List[Tuple[int, int]] = []
+        state = end = 0
+        for ch in text:
+            end += 1
+            state = delta[state].get(ch, 0)
+            if state and outputs[state]:
+                for pid in outputs[state]:
+                    spans.append((end, pid))
+        return KeywordHits(text, spans, self.patterns)
@@ -0,0 +1,175 @@
+import hashlib
+import json
+from typing import Union
+
+from utils.keyword_matcher import KeywordHits, KeywordMatcher
+
+
+# =========================
+# 文本分析用到的全部关键词表：偏好向量（PreferenceAnalyzer）和需求抽取 / 意图识别（ai.logic）共用
+# 列表顺序即优先级；带规范值的写成 (关键词, 规范值)
+# 所有词表编译进同一个自动机，一条消息只扫描一遍（文本统一转小写后匹配，
+# 含大写字母的关键词因此不会命中，与原先逐个 `k in text.lower()` 的行为一致）
+# =========================
+
+# ---------- 偏好向量 ----------
+# 从CSV提取的关键词
+HEADSET_TYPES = ["头戴式", "入耳式", "半入耳式", "颈挂式"]
+CORE_FUNCTIONS = [
+    "降噪", "无线蓝牙", "超长续航", "防水", "游戏低延迟", "空间音频",
+    "快充", "重低音", "高解析", "RGB灯效", "触控", "降噪麦克风"
+]
+BRANDS = [
+    "索尼", "苹果", "小米", "漫步者", "雷柏", "华为", "森海塞尔", "倍思",
+    "荣耀", "JBL", "西伯利亚", "OPPO", "vivo", "铁三角", "Skullcandy",
+    "先锋", "三星", "微软", "HyperX", "飞利浦", "Bose", "Anker", "Beats"
+]
+SCENARIOS = ["通勤", "日常", "运动", "游戏", "办公", "音乐"]
+
+# 价格相关关键词（电商常见表达）
+PRICE_LOW_KEYWORDS = ['便宜', '性价比', '实惠', '划算', '低价', '学生', '百元', '200以内', '300以下', '预算低']
+PRICE_MID_KEYWORDS = ['中等', '中端', '千元', '500-1000', '平衡']
+PRICE_HIGH_KEYWORDS = ['贵', '好一点', '预算充足', '顶级', '旗舰', '高端', '不差钱', '1000以上', '2000以上']
+
+# 决策阶段关键词（从探索→考虑→决策）
+EXPLORATION_KEYWORDS = ['推荐', '有什么', '有哪些', '介绍', '看看', '了解']
+CONSIDERATION_KEYWORDS = ['对比', '区别', '哪个好', '优缺点', '参数', '怎么样']
+DECISION_KEYWORDS = ['就买', '下单', '链接', '决定', '就要', '购买', '买这个']
+
+# 明确度：除类型 / 功能 / 品牌外额外计入的属性词
+SPECIFIC_EXTRA_KEYWORDS = ['预算', '价格', '续航', '音质', '佩戴']
+# 关注维度：价格 / 功能维度额外的提示词
+FOCUS_PRICE_KEYWORDS = ['预算', '价格']
+FOCUS_FUNCTION_KEYWORDS = ['音质', '佩戴', '续航', '参数']
+
+# ---------- 需求抽取（规范值与商品目录字段一致） ----------
+SLOT_HEADSET_TYPES = [
+    ("头戴式", "头戴式"),
+    ("头戴", "头戴式"),
+    ("入耳式", "入耳式"),
+    ("入耳", "入耳式"),
+    ("半入耳式", "半入耳式"),
+    ("半入耳", "半入耳式"),
+]
+SLOT_CORE_FUNCTIONS = [
+    ("主动降噪", "降噪"),
+    ("降噪", "降噪"),
+    ("无线", "无线蓝牙"),
+    ("蓝牙", "无线蓝牙"),
+    ("续航", "长续航"),
+    ("长续航", "长续航"),
+    ("游戏", "游戏低延迟"),
+    ("低延迟", "游戏低延迟"),
+    ("音质", "高音质"),
+    ("重低音", "重低音"),
+    ("通话", "高清通话"),
+    ("麦克风", "高清通话"),
+    ("运动", "运动防水"),
+    ("防水", "运动防水"),
+    ("舒适", "佩戴舒适"),
+    ("佩戴", "佩戴舒适"),
+]
+SLOT_BRANDS = [
+    ("sony", "索尼"),
+    ("索尼", "索尼"),
+    ("apple", "苹果"),
+    ("苹果", "苹果"),
+    ("huawei", "华为"),
+    ("华为", "华为"),
+    ("xiaomi", "小米"),
+    ("小米", "小米"),
+    ("edifier", "漫步者"),
+    ("漫步者", "漫步者"),
+    ("bose", "Bose"),
+    ("博士", "Bose"),
+    ("jbl", "JBL"),
+    ("beats", "Beats"),
+    ("sennheiser", "森海塞尔"),
+    ("森海塞尔", "森海塞尔"),
+    ("oppo", "OPPO"),
+    ("vivo", "vivo"),
+]
+SLOT_SCENARIOS = [
+    ("通勤", "通勤"),
+    ("地铁", "通勤"),
+    ("上班", "办公"),
+    ("办公", "办公"),
+    ("开会", "办公"),
+    ("学习", "学习"),
+    ("运动", "运动"),
+    ("跑步", "运动"),
+    ("健身", "运动"),
+    ("游戏", "游戏"),
+    ("手游", "游戏"),
+    ("打游戏", "游戏"),
+    ("睡觉", "助眠"),
+    ("日常", "日常"),
+    ("出差", "通勤"),
+]
+
+# ---------- 意图识别 / 停止条件 ----------
+INTENT_COMPARISON_KEYWORDS = ["对比", "比较", "区别", "哪个好", "哪款好", "怎么选"]
+INTENT_PRICE_KEYWORDS = ["便宜", "预算", "以内", "以下", "不超过", "性价比"]
+INTENT_EXPLORATION_KEYWORDS = ["随便看看", "都有哪些", "有什么", "推荐几款", "先看看"]
+FINISH_KEYWORDS = [
+    "可以了", "就这样", "没问题了", "不用再推荐了", "不用推荐了",
+    "我已经决定了", "决定好了", "就买这个", "买这个", "就这个",
+    "可以结束了", "结束吧", "开始答题", "去答题", "填写问卷",
+    "我要答题", "进入问卷"
+]
+STOP_DECISION_KEYWORDS = [
+    "就买", "下单", "决定", "买这个", "就这个",
+    "直接买", "可以了", "够了", "不用再推荐"
+]
+
+LEXICONS = {
+    "headset_type": HEADSET_TYPES,
+    "core_function": CORE_FUNCTIONS,
+    "brand": BRANDS,
+    "scenario": SCENARIOS,
+    "price_low": PRICE_LOW_KEYWORDS,
+    "price_mid": PRICE_MID_KEYWORDS,
+    "price_high": PRICE_HIGH_KEYWORDS,
+    "exploration": EXPLORATION_KEYWORDS,
+    "consideration": CONSIDERATION_KEYWORDS,
+    "decision": DECISION_KEYWORDS,
+    "specific_extra": SPECIFIC_EXTRA_KEYWORDS,
+    "focus_price": FOCUS_PRICE_KEYWORDS,
+    "focus_function": FOCUS_FUNCTION_KEYWORDS,
+    "slot_headset_type": SLOT_HEADSET_TYPES,
+    "slot_core_function": SLOT_CORE_FUNCTIONS,
+    "slot_brand": SLOT_BRANDS,
+    "slot_scenario": SLOT_SCENARIOS,
+    "intent_comparison": INTENT_COMPARISON_KEYWORDS,
+    "intent_price": INTENT_PRICE_KEYWORDS,
+    "intent_exploration": INTENT_EXPLORATION_KEYWORDS,
+    "finish": FINISH_KEYWORDS,
+    "stop_decision": STOP_DECISION_KEYWORDS,
+}
+
+# 进程内只编译一次
+keyword_matcher = KeywordMatcher(LEXICONS)
+
+# 词表版本：全部词表（含顺序）内容哈希前 12 位，写入 InteractionTurn.lexicon_version，
+# 改词表后 recompute_preferences.py 据此找出需要重算偏好指标的历史轮次
+LEXICON_VERSION = hashlib.sha256(json.dumps(LEXICONS, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+
+def scan_keywords(text: str) -> KeywordHits:
+    """一条消息在全部词表上的命中（转小写后单遍扫描）"""
+    return keyword_matcher.scan((text or "").lower())
+
+
+def as_keyword_hits(text: Union[str, KeywordHits]) -> KeywordHits:
+    """分析函数既可传原文，也可传已扫描好的命中结果（同一条消息只扫描一遍）"""
+    return text if isinstance(text, KeywordHits) else scan_keywords(text)
+
+
+def normalize_text(text: Union[str, KeywordHits]) -> str:
+    """
+    文本分析结果缓存的键：去首尾空白并转小写
+    （所有分析都在小写文本上做子串 / 正则匹配，首尾空白不影响结果）
+    """
+    if isinstance(text, KeywordHits):
+        return text.text.strip()
+    return (text or "").strip().lower()
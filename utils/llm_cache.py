@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from utils.lru import BoundedLRU
+
+
+class LLMResponseCache:
+    """
+    两级 LLM 回复缓存：
+    - 内存 LRU：进程内命中，按条数上限淘汰
+    - 磁盘 SQLite：跨进程 / 重启后仍可命中，按条数上限淘汰最久未访问的记录
+    两级都按 TTL 过期；只缓存模型正常返回的文本，不缓存兜底文案
+    内存层用 BoundedLRU（自带锁），self._lock 只保护统计；
+    磁盘读写在锁外进行，每个线程使用自己的 SQLite 连接（WAL + busy timeout），
+    磁盘出错（如其他进程锁库）时当作未命中，不影响请求
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_memory_entries: int = 1024,
+        max_disk_entries: int = 50000,
+        ttl_seconds: float = 86400.0
+    ):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._memory = BoundedLRU(max_memory_entries)  # key -> (response, created_at)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes_since_evict = 0
+
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "disk_evictions": 0,
+            "expired": 0,
+        }
+
+    # ---------- 键 ----------
+    @staticmethod
+    def make_key(messages: List[Dict], model: str, temperature: float) -> str:
+        """system prompt + user prompt + 模型 + 温度 的哈希"""
+        payload = json.dumps(
+            {
+                "messages": [(m.get("role"), m.get("content")) for m in messages],
+                "model": model,
+                "temperature": temperature,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # ---------- 磁盘层 ----------
+    def _disk(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " cache_key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed ON llm_cache (accessed_at)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _evict_disk(self) -> None:
+        conn = self._disk()
+        now = time.time()
+        expired = conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        total = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = total - self.max_disk_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE cache_key IN ("
+                " SELECT cache_key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+        conn.commit()
+        with self._lock:
+            self._stats["disk_evictions"] += max(overflow, 0)
+            self._stats["expired"] += max(expired, 0)
+
+    # ---------- 读写 ----------
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            response, created_at = entry
+            if now - created_at <= self.ttl_seconds:
+                with self._lock:
+                    self._stats["memory_hits"] += 1
+                return response
+            self._memory.pop(key)
+            with self._lock:
+                self._stats["expired"] += 1
+
+        row, expired = None, False
+        try:
+            conn = self._disk()
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                # 过期记录在这里直接删掉，不等批量淘汰
+                conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (key,))
+                row, expired = None, True
+            elif row is not None:
+                conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE cache_key = ?", (now, key))
+            conn.commit()
+        except sqlite3.Error:
+            row = None  # 磁盘层不可用（如被其他进程锁住）时当作未命中
+
+        with self._lock:
+            if expired:
+                self._stats["expired"] += 1
+            self._stats["misses" if row is None else "disk_hits"] += 1
+        if row is None:
+            return None
+        self._memory.set(key, (row[0], row[1]))
+        return row[0]
+
+    def set(self, key: str, response: str) -> None:
+        if not response:
+            return
+        now = time.time()
+        self._memory.set(key, (response, now))
+        with self._lock:
+            self._stats["sets"] += 1
+            self._writes_since_evict += 1
+            # 批量淘汰，避免每次写入都 COUNT(*)
+            evict = self._writes_since_evict >= max(1, self.max_disk_entries // 100)
+            if evict:
+                self._writes_since_evict = 0
+
+        try:
+            conn = self._disk()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (cache_key, response, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            conn.commit()
+            if evict:
+                self._evict_disk()
+        except sqlite3.Error:
+            pass  # 磁盘层不可用时退化为纯内存缓存
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        memory = self._memory.stats()
+        stats["memory_evictions"] = memory["evictions"]
+        stats["memory_entries"] = memory["entries"]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        self._memory.clear()
+        try:
+            conn = self._disk()
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+        except sqlite3.Error:
+            pass
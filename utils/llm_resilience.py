@@ -0,0 +1,485 @@
+"""
+LLM 调用的容错层：
+- 每次调用有总时限（deadline），每次尝试的超时 = 剩余时限
+- 可重试错误（超时、连接错误、429、5xx）按指数退避 + 随机抖动重试，剩余时限不够就不再重试
+- 开启对冲（hedge_enabled，默认关闭）时，首个请求超过近期 p95 延迟仍未返回，再发一个对冲请求，谁先成功用谁
+- 熔断器：连续失败达到阈值后直接失败（调用方返回兜底文案），冷却后放行一个探测请求
+- 每次调用的结果计入指标，get_metrics() 查看，Web 端经 GET /api/stats 读取
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(Exception):
+    """本次调用的总时限已用完"""
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，未发出请求"""
+
+
+def is_timeout_error(exc: BaseException) -> bool:
+    return isinstance(exc, (APITimeoutError, DeadlineExceeded, asyncio.TimeoutError, FutureTimeout))
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    if is_timeout_error(exc) or isinstance(exc, (APIConnectionError, RateLimitError)):
+        return True
+    return isinstance(exc, APIStatusError) and exc.status_code >= 500
+
+
+# =========================
+# 基础组件
+# =========================
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+class LatencyTracker:
+    """最近 window 次成功请求的延迟，样本不足 min_samples 时不给出分位数"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """
+    closed：正常放行；连续 failure_threshold 次失败后 -> open
+    open：直接拒绝；reset_seconds 后 -> half_open
+    half_open：只放行一个探测请求，成功 -> closed，失败 -> open
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half_open"
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open":
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    return False
+                self._state = "half_open"
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """请求结束但不说明上游是否健康（如 4xx）：不改状态和失败计数，只让出半开探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    logger.warning("LLM 熔断器打开：连续失败 %d 次", self._failures)
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+
+class LLMMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+
+# =========================
+# 调用器
+# =========================
+class ResilientCaller:
+    """
+    request_fn(timeout) 发出一次请求并返回结果；timeout 为本次尝试可用的秒数。
+    call / acall / open_stream / aopen_stream 失败时抛出原始异常、DeadlineExceeded 或 CircuitOpenError，
+    兜底文案由调用方决定。
+    """
+
+    def __init__(
+        self,
+        deadline_seconds: float = 25.0,
+        max_attempts: int = 3,
+        retry_base_delay: float = 0.25,
+        retry_max_delay: float = 2.0,
+        min_attempt_seconds: float = 1.0,
+        hedge_enabled: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        hedge_workers: int = 64,
+        breaker_failures: int = 5,
+        breaker_reset_seconds: float = 30.0
+    ):
+        self.deadline_seconds = deadline_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.min_attempt_seconds = min_attempt_seconds
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_workers = hedge_workers
+
+        self.latency = LatencyTracker(min_samples=hedge_min_samples)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset_seconds)
+        self.metrics = LLMMetrics()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._in_flight = 0  # 对冲线程池中尚未结束的请求数
+
+    # ---------- 指标 ----------
+    def get_metrics(self) -> Dict[str, Any]:
+        metrics = self.metrics.snapshot()
+        metrics["breaker_state"] = self.breaker.state
+        metrics["latency_p50"] = self.latency.percentile(0.5)
+        metrics["latency_p95"] = self.latency.percentile(0.95)
+        return metrics
+
+    def _emit(self, outcome: str, attempts: int, started: float) -> None:
+        self.metrics.incr(f"outcome_{outcome}")
+        logger.info(
+            "llm_call outcome=%s attempts=%d elapsed=%.3fs breaker=%s",
+            outcome, attempts, time.monotonic() - started, self.breaker.state
+        )
+
+    def _failure_outcome(self, exc: BaseException) -> str:
+        return "timeout" if is_timeout_error(exc) else "error"
+
+    # ---------- 公共逻辑 ----------
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge_enabled:
+            return None
+        return self.latency.percentile(self.hedge_quantile)
+
+    def _retry_delay(self, attempt: int, exc: BaseException, deadline: Deadline) -> Optional[float]:
+        """返回下次重试前的等待秒数；不该重试时返回 None"""
+        if not is_retryable_error(exc) or attempt >= self.max_attempts:
+            return None
+        if self.breaker.state == "open":
+            return None
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** (attempt - 1))))
+        if deadline.remaining() - delay < self.min_attempt_seconds:
+            self.metrics.incr("retry_skipped_no_budget")
+            return None
+        return delay
+
+    def _record_attempt_failure(self, exc: BaseException) -> None:
+        self.metrics.incr("attempt_timeouts" if is_timeout_error(exc) else "attempt_errors")
+        if is_retryable_error(exc):
+            self.breaker.record_failure()
+        else:
+            # 4xx 等请求本身的问题既不代表上游不健康，也不代表已恢复：不计入熔断器
+            self.breaker.release_probe()
+
+    def report_stream_failure(self, exc: BaseException) -> None:
+        """流式输出中途失败时由调用方上报"""
+        self.metrics.incr("stream_interrupted")
+        self._record_attempt_failure(exc)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix="llm-hedge")
+        return self._executor
+
+    def _submit(self, request_fn: Callable[[float], Any], timeout: float):
+        with self._executor_lock:
+            self._in_flight += 1
+        future = self._get_executor().submit(self._timed, request_fn, timeout)
+        future.add_done_callback(self._release_slot)
+        return future
+
+    def _release_slot(self, _future) -> None:
+        with self._executor_lock:
+            self._in_flight -= 1
+
+    def _pool_saturated(self, needed: int) -> bool:
+        with self._executor_lock:
+            return self._in_flight + needed > self.hedge_workers
+
+    def _timed(self, request_fn: Callable[[float], Any], timeout: float) -> Any:
+        started = time.monotonic()
+        result = request_fn(timeout)
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    # ---------- 同步 ----------
+    def _attempt(self, request_fn: Callable[[float], Any], deadline: Deadline) -> Any:
+        """
+        同步请求无法取消：对冲后输掉的一方会在线程池里跑到自己的超时为止。
+        为此两个请求的 timeout 都不超过本次调用的剩余时限，输家最晚在时限到期时释放线程；
+        线程池放不下两个任务时（上游整体变慢、大量输家尚未结束）不再对冲，直接在当前线程请求
+        """
+        timeout = deadline.remaining()
+        if timeout <= 0:
+            raise DeadlineExceeded()
+
+        hedge_after = self._hedge_delay()
+        if hedge_after is None or hedge_after >= timeout:
+            return self._timed(request_fn, timeout)
+        if self._pool_saturated(2):
+            self.metrics.incr("hedge_skipped_saturated")
+            return self._timed(request_fn, timeout)
+
+        primary = self._submit(request_fn, timeout)
+        try:
+            return primary.result(timeout=hedge_after)
+        except FutureTimeout:
+            pass
+
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded()
+
+        if self._pool_saturated(1):
+            self.metrics.incr("hedge_skipped_saturated")
+            try:
+                return primary.result(timeout=remaining)
+            except FutureTimeout:
+                raise DeadlineExceeded()
+
+        self.metrics.incr("hedges")
+        hedge = self._submit(request_fn, remaining)
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded()
+            for future in done:
+                exc = future.exception()
+                if exc is None:
+                    if future is hedge:
+                        self.metrics.incr("hedge_wins")
+                    return future.result()
+                first_error = first_error or exc
+        raise first_error
+
+    def call(self, request_fn: Callable[[float], Any]) -> Any:
+        started = time.monotonic()
+        if not self.breaker.allow():
+            self._emit("short_circuited", 0, started)
+            raise CircuitOpenError()
+
+        deadline = Deadline(self.deadline_seconds)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = self._attempt(request_fn, deadline)
+            except Exception as exc:
+                self._record_attempt_failure(exc)
+                delay = self._retry_delay(attempt, exc, deadline)
+                if delay is None:
+                    self._emit(self._failure_outcome(exc), attempt, started)
+                    raise
+                self.metrics.incr("retries")
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self._emit("success", attempt, started)
+            return result
+
+    # ---------- 异步 ----------
+    async def _atimed(self, arequest_fn: Callable[[float], Awaitable[Any]], timeout: float) -> Any:
+        started = time.monotonic()
+        result = await arequest_fn(timeout)
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    async def _aattempt(self, arequest_fn: Callable[[float], Awaitable[Any]], deadline: Deadline) -> Any:
+        timeout = deadline.remaining()
+        if timeout <= 0:
+            raise DeadlineExceeded()
+
+        hedge_after = self._hedge_delay()
+        if hedge_after is None or hedge_after >= timeout:
+            try:
+                return await asyncio.wait_for(self._atimed(arequest_fn, timeout), timeout)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded()
+
+        primary = asyncio.ensure_future(self._atimed(arequest_fn, timeout))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+            if done:
+                return primary.result()
+
+            if deadline.remaining() <= 0:
+                raise DeadlineExceeded()
+
+            self.metrics.incr("hedges")
+            hedge = asyncio.ensure_future(self._atimed(arequest_fn, deadline.remaining()))
+            pending = {primary, hedge}
+            first_error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=deadline.remaining(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise DeadlineExceeded()
+                for task in done:
+                    exc = task.exception()
+                    if exc is None:
+                        if task is hedge:
+                            self.metrics.incr("hedge_wins")
+                        return task.result()
+                    first_error = first_error or exc
+            raise first_error
+        finally:
+            # 异步请求可以真正取消，输掉的一方立即释放连接
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def acall(self, arequest_fn: Callable[[float], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        if not self.breaker.allow():
+            self._emit("short_circuited", 0, started)
+            raise CircuitOpenError()
+
+        deadline = Deadline(self.deadline_seconds)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await self._aattempt(arequest_fn, deadline)
+            except Exception as exc:
+                self._record_attempt_failure(exc)
+                delay = self._retry_delay(attempt, exc, deadline)
+                if delay is None:
+                    self._emit(self._failure_outcome(exc), attempt, started)
+                    raise
+                self.metrics.incr("retries")
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self._emit("success", attempt, started)
+            return result
+
+    # ---------- 流式 ----------
+    def open_stream(self, request_fn: Callable[[float], Any]) -> Any:
+        """
+        建立流式连接：只在首个 token 之前重试，不做对冲（已输出给用户的内容无法撤回）。
+        返回的流由调用方迭代，中途失败请调用 report_stream_failure
+        """
+        started = time.monotonic()
+        if not self.breaker.allow():
+            self._emit("short_circuited", 0, started)
+            raise CircuitOpenError()
+
+        deadline = Deadline(self.deadline_seconds)
+        attempt = 0
+        while True:
+            attempt += 1
+            timeout = deadline.remaining()
+            try:
+                if timeout <= 0:
+                    raise DeadlineExceeded()
+                stream = request_fn(timeout)
+            except Exception as exc:
+                self._record_attempt_failure(exc)
+                delay = self._retry_delay(attempt, exc, deadline)
+                if delay is None:
+                    self._emit(self._failure_outcome(exc), attempt, started)
+                    raise
+                self.metrics.incr("retries")
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self._emit("stream_opened", attempt, started)
+            return stream
+
+    async def aopen_stream(self, arequest_fn: Callable[[float], Awaitable[Any]]) -> Any:
+        """open_stream 的异步版本，重试规则相同；建连超过剩余时限时取消请求"""
+        started = time.monotonic()
+        if not self.breaker.allow():
+            self._emit("short_circuited", 0, started)
+            raise CircuitOpenError()
+
+        deadline = Deadline(self.deadline_seconds)
+        attempt = 0
+        while True:
+            attempt += 1
+            timeout = deadline.remaining()
+            try:
+                if timeout <= 0:
+                    raise DeadlineExceeded()
+                try:
+                    stream = await asyncio.wait_for(arequest_fn(timeout), timeout)
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded()
+            except Exception as exc:
+                self._record_attempt_failure(exc)
+                delay = self._retry_delay(attempt, exc, deadline)
+                if delay is None:
+                    self._emit(self._failure_outcome(exc), attempt, started)
+                    raise
+                self.metrics.incr("retries")
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self._emit("stream_opened", attempt, started)
+            return stream
@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+
+class BoundedLRU:
+    """
+    线程安全、有条数上限的进程内 LRU 存储，供各缓存（选品 / 文本分析 / LLM 回复内存层）复用：
+    - get 命中时移到队尾，set 超出上限时从队首淘汰
+    - 统计命中 / 未命中 / 写入 / 淘汰次数
+    max_entries 为 0 时不存储：get 始终返回 default 且不计数，set 不生效
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+        }
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if self.max_entries <= 0:
+            return default
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._stats["sets"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,79 @@
+from typing import Any, Callable, Dict, Hashable
+
+from utils.lru import BoundedLRU
+
+
+# =========================
+# 只读容器：缓存的分析结果被多个请求共享，不能被调用方原地修改
+# 继承 dict / list，isinstance 判断、JSON 列序列化、比较都与普通容器一致
+# =========================
+def _readonly(self, *args, **kwargs):
+    raise TypeError(f"{type(self).__name__} 为只读缓存结果，请先 copy() 再修改")
+
+
+class FrozenDict(dict):
+    __slots__ = ()
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+
+class FrozenList(list):
+    __slots__ = ()
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = remove = pop = clear = sort = reverse = _readonly
+
+    def __reduce__(self):
+        return type(self), (list(self),)
+
+
+_SCALARS = (str, int, float, bool, type(None))
+
+
+def freeze(value: Any) -> Any:
+    """递归把 dict / list 转成只读版本；其余值原样返回"""
+    kind = type(value)
+    if kind in _SCALARS or kind is FrozenDict or kind is FrozenList:
+        return value
+    if isinstance(value, dict):
+        return FrozenDict({k: v if type(v) in _SCALARS else freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return FrozenList([v if type(v) in _SCALARS else freeze(v) for v in value])
+    return value
+
+
+_MISSING = object()
+
+
+class MemoCache:
+    """
+    纯函数结果的进程内 LRU 记忆化缓存（线程安全、有条数上限）：
+    - 键由调用方构造，通常为 (函数名, 规范化后的文本)
+    - 值存入前冻结成只读容器，命中时直接共享同一个对象
+    - 计算在锁外进行；并发下同一个键可能重复计算一次，结果相同，后写入的覆盖先写入的
+    max_entries 为 0 时不缓存，但返回值同样冻结，调用方行为不随配置变化
+    """
+
+    def __init__(self, max_entries: int = 8192):
+        self.max_entries = max_entries
+        self._entries = BoundedLRU(max_entries)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        if self.max_entries <= 0:
+            return freeze(compute())
+
+        value = self._entries.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        value = freeze(compute())
+        self._entries.set(key, value)
+        return value
+
+    def stats(self) -> Dict:
+        return self._entries.stats()
+
+    def clear(self) -> None:
+        self._entries.clear()
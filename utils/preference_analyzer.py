@@ -1,43 +1,44 @@
 import math
-import re
-from collections import Counter
+from typing import Union
+
+from utils import lexicon
+from utils.keyword_matcher import KeywordHits
+from utils.lexicon import as_keyword_hits, normalize_text
+from utils.memo_cache import MemoCache
+
 
 class PreferenceAnalyzer:
-    def __init__(self):
-        # 从CSV提取的关键词
-        self.headset_types = ["头戴式", "入耳式", "半入耳式", "颈挂式"]
-        self.core_functions = [
-            "降噪", "无线蓝牙", "超长续航", "防水", "游戏低延迟", "空间音频",
-            "快充", "重低音", "高解析", "RGB灯效", "触控", "降噪麦克风"
-        ]
-        self.brands = [
-            "索尼", "苹果", "小米", "漫步者", "雷柏", "华为", "森海塞尔", "倍思",
-            "荣耀", "JBL", "西伯利亚", "OPPO", "vivo", "铁三角", "Skullcandy",
-            "先锋", "三星", "微软", "HyperX", "飞利浦", "Bose", "Anker", "Beats"
-        ]
-        self.scenarios = ["通勤", "日常", "运动", "游戏", "办公", "音乐"]
+    def __init__(self, memo: MemoCache = None):
+        # 传入 memo 时 compute_vector 按规范化文本缓存结果（返回只读字典），否则每次重新计算
+        self.memo = memo
+
+        # 关键词表统一定义在 utils.lexicon，并编译进同一个自动机；这里保留属性便于外部引用
+        self.headset_types = lexicon.HEADSET_TYPES
+        self.core_functions = lexicon.CORE_FUNCTIONS
+        self.brands = lexicon.BRANDS
+        self.scenarios = lexicon.SCENARIOS
 
         # 价格相关关键词（电商常见表达）
-        self.price_low_keywords = ['便宜', '性价比', '实惠', '划算', '低价', '学生', '百元', '200以内', '300以下', '预算低']
-        self.price_mid_keywords = ['中等', '中端', '千元', '500-1000', '平衡']
-        self.price_high_keywords = ['贵', '好一点', '预算充足', '顶级', '旗舰', '高端', '不差钱', '1000以上', '2000以上']
+        self.price_low_keywords = lexicon.PRICE_LOW_KEYWORDS
+        self.price_mid_keywords = lexicon.PRICE_MID_KEYWORDS
+        self.price_high_keywords = lexicon.PRICE_HIGH_KEYWORDS
 
         # 决策阶段关键词（从探索→考虑→决策）
-        self.exploration_keywords = ['推荐', '有什么', '有哪些', '介绍', '看看', '了解']
-        self.consideration_keywords = ['对比', '区别', '哪个好', '优缺点', '参数', '怎么样']
-        self.decision_keywords = ['就买', '下单', '链接', '决定', '就要', '购买', '买这个']
+        self.exploration_keywords = lexicon.EXPLORATION_KEYWORDS
+        self.consideration_keywords = lexicon.CONSIDERATION_KEYWORDS
+        self.decision_keywords = lexicon.DECISION_KEYWORDS
 
         # 明确度相关（提及具体属性越多，越明确）
-        self.specific_keywords = self.headset_types + self.core_functions + self.brands + ['预算', '价格', '续航', '音质', '佩戴']
+        self.specific_keywords = self.headset_types + self.core_functions + self.brands + lexicon.SPECIFIC_EXTRA_KEYWORDS
 
-    def _calculate_price_preference(self, text: str) -> float:
+    def _calculate_price_preference(self, text: Union[str, KeywordHits]) -> float:
         """价格偏好: -1(强烈低价) ~ 0(中性) ~ 1(强烈高价)"""
         score = 0.0
-        lower_text = text.lower()
+        hits = as_keyword_hits(text)
 
-        low_count = sum(1 for k in self.price_low_keywords if k in lower_text)
-        mid_count = sum(1 for k in self.price_mid_keywords if k in lower_text)
-        high_count = sum(1 for k in self.price_high_keywords if k in lower_text)
+        low_count = hits.count("price_low")
+        mid_count = hits.count("price_mid")
+        high_count = hits.count("price_high")
 
         if low_count > 0:
             score -= 0.6 * low_count
@@ -48,19 +49,20 @@ class PreferenceAnalyzer:
 
         return max(min(score, 1.0), -1.0)
 
-    def identify_trajectory(self, current_vec: dict, last_vec: dict, turn_index: int) -> str:
+    def identify_trajectory(self, current_vec: dict, last_vec: dict, turn_index: int, drift: float = None) -> str:
         """识别偏好演化轨迹类型（用于中介分析）
         - 目标驱动型: drift低 + readiness快速上升（快速锁定需求）
         - 信息验证型: drift中 + 焦点多次变化（探索验证，如从price到function）
         - 探索型: drift高 + readiness低（偏好频繁变动）
         - 默认: 'uncertain'
+        drift：调用方已算好的 calculate_drift(current_vec, last_vec)，不传则在这里计算
         """
         if not last_vec:
             return 'exploration'  # 第一轮默认探索
 
-        drift = self.calculate_drift(current_vec, last_vec)
+        if drift is None:
+            drift = self.calculate_drift(current_vec, last_vec)
         readiness_delta = current_vec['decision_readiness'] - last_vec.get('decision_readiness', 0)
-        current_focus = self.identify_focus(current_vec.get('text', ''))  # 假设compute_vector时传text，或从vec推断
 
         if drift < 0.3 and readiness_delta > 0.4:
             return 'target_driven'  # 目标驱动: 稳定 + 快速决策
@@ -70,51 +72,58 @@ class PreferenceAnalyzer:
             return 'exploratory'  # 探索: 剧烈变动
         return 'uncertain'  # 默认
 
-    def _calculate_specificity(self, text: str) -> float:
+    def _calculate_specificity(self, text: Union[str, KeywordHits]) -> float:
         """明确度: 0(模糊) ~ 1(高度明确，提及多个具体属性)"""
-        lower_text = text.lower()
-        matches = sum(1 for k in self.specific_keywords if k in lower_text)
+        matches = as_keyword_hits(text).count("headset_type", "core_function", "brand", "specific_extra")
         # 归一化：提及3个以上属性视为高度明确
         return min(matches / 3.0, 1.0)
 
-    def _calculate_decision_readiness(self, text: str) -> float:
+    def _calculate_decision_readiness(self, text: Union[str, KeywordHits]) -> float:
         """决策准备度: 0(探索) ~ 0.5(考虑) ~ 1(决策)"""
-        lower_text = text.lower()
-        if any(k in lower_text for k in self.decision_keywords):
+        hits = as_keyword_hits(text)
+        if hits.has("decision"):
             return 1.0
-        elif any(k in lower_text for k in self.consideration_keywords):
+        elif hits.has("consideration"):
             return 0.6
-        elif any(k in lower_text for k in self.exploration_keywords):
+        elif hits.has("exploration"):
             return 0.3
         return 0.3  # 默认探索阶段
 
+    def decision_stage(self, current_readiness: float) -> str:
+        """决策准备度 -> 决策阶段（exploration / consideration / decision）"""
+        return 'exploration' if current_readiness < 0.4 else 'consideration' if current_readiness < 0.8 else 'decision'
+
     def track_decision_path(self, current_readiness: float, previous_path: list = []) -> list:
         """生成决策路径序列（e.g., ['exploration', 'consideration', 'decision']）"""
-        stage = 'exploration' if current_readiness < 0.4 else 'consideration' if current_readiness < 0.8 else 'decision'
-        return previous_path + [stage]
+        return previous_path + [self.decision_stage(current_readiness)]
 
-    def _extract_preferred_attributes(self, text: str) -> dict:
-        """提取用户偏好的具体属性（用于多维向量）"""
-        lower_text = text.lower()
+    def _extract_preferred_attributes(self, text: Union[str, KeywordHits]) -> dict:
+        """提取用户偏好的具体属性（用于多维向量），各列表按词表顺序"""
+        hits = as_keyword_hits(text)
         prefs = {
-            "headset_type": [t for t in self.headset_types if t in lower_text],
-            "core_function": [f for f in self.core_functions if f in lower_text],
-            "brand": [b for b in self.brands if b in lower_text],
-            "scenario": [s for s in self.scenarios if s in lower_text]
+            "headset_type": hits.values("headset_type"),
+            "core_function": hits.values("core_function"),
+            "brand": hits.values("brand"),
+            "scenario": hits.values("scenario")
         }
-        # 强度：提及次数（简单Counter）
-        func_counter = Counter(prefs["core_function"])
-        prefs["core_function_strength"] = {f: func_counter.get(f, 0) for f in self.core_functions}
+        # 强度：是否提及（同一功能词只计一次）
+        mentioned = set(prefs["core_function"])
+        prefs["core_function_strength"] = {f: int(f in mentioned) for f in self.core_functions}
         return prefs
 
-    def compute_vector(self, text: str) -> dict:
+    def compute_vector(self, text: Union[str, KeywordHits]) -> dict:
         """生成丰富偏好向量（适合时间序列分析和SEM）"""
+        if self.memo is None:
+            return self._compute_vector(text)
+        return self.memo.get_or_compute(("compute_vector", normalize_text(text)), lambda: self._compute_vector(text))
+
+    def _compute_vector(self, text: Union[str, KeywordHits]) -> dict:
+        hits = as_keyword_hits(text)
         vec = {
-            "price_preference": self._calculate_price_preference(text),  # -1 ~ 1
-            "specificity": self._calculate_specificity(text),            # 0 ~ 1
-            "decision_readiness": self._calculate_decision_readiness(text),
-            "decision_readiness": self._calculate_decision_readiness(text),  # 0 ~ 1
-            "preferred_attributes": self._extract_preferred_attributes(text)  # 具体偏好字典
+            "price_preference": self._calculate_price_preference(hits),  # -1 ~ 1
+            "specificity": self._calculate_specificity(hits),            # 0 ~ 1
+            "decision_readiness": self._calculate_decision_readiness(hits),  # 0 ~ 1
+            "preferred_attributes": self._extract_preferred_attributes(hits)  # 具体偏好字典
         }
         vec['purchase_intent'] = vec['decision_readiness']
         return vec
@@ -143,18 +152,18 @@ class PreferenceAnalyzer:
 
         return math.sqrt(diff + attr_diff)
 
-    def identify_focus(self, text: str) -> str:
+    def identify_focus(self, text: Union[str, KeywordHits]) -> str:
         """识别当前主要关注维度（更细粒度）"""
-        lower_text = text.lower()
-        if any(k in lower_text for k in self.price_low_keywords + self.price_mid_keywords + self.price_high_keywords + ['预算', '价格']):
+        hits = as_keyword_hits(text)
+        if hits.has("price_low", "price_mid", "price_high", "focus_price"):
             return 'price'
-        if any(b in lower_text for b in self.brands):
+        if hits.has("brand"):
             return 'brand'
-        if any(f in lower_text for f in self.core_functions + ['音质', '佩戴', '续航', '参数']):
+        if hits.has("core_function", "focus_function"):
             return 'function'
-        if any(t in lower_text for t in self.headset_types):
+        if hits.has("headset_type"):
             return 'type'
-        if any(s in lower_text for s in self.scenarios):
+        if hits.has("scenario"):
             return 'scenario'
 
         return 'exploration'
@@ -0,0 +1,280 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, bindparam, or_, select, update
+
+from models.main import InteractionTurn, SessionEvent
+from utils import lexicon
+from utils.lexicon import LEXICON_VERSION
+
+logger = logging.getLogger(__name__)
+
+TURNS = InteractionTurn.__table__
+EVENTS = SessionEvent.__table__
+
+
+# =========================
+# 历史轮次偏好指标批量重算（改词表后离线执行，见 recompute_preferences.py）
+# 与 /api/send 的在线计算逐位一致：
+# - 偏好向量 / 关注维度：analyze_message（共用同一个关键词自动机）
+# - 漂移 / 轨迹：同一会话内按 (turn_index, id) 排序，与上一条用户发言比较；
+#   按会话分组、整块向量化计算，属性集合的 Jaccard 距离用位掩码求交并
+# =========================
+
+# 漂移比较的属性维度及其取值（按词表顺序编位）
+_ATTR_KEYS = ("headset_type", "core_function", "brand", "scenario")
+_ATTR_BITS = {
+    "headset_type": {w: i for i, w in enumerate(lexicon.HEADSET_TYPES)},
+    "core_function": {w: i for i, w in enumerate(lexicon.CORE_FUNCTIONS)},
+    "brand": {w: i for i, w in enumerate(lexicon.BRANDS)},
+    "scenario": {w: i for i, w in enumerate(lexicon.SCENARIOS)},
+}
+# 8 位查表求 popcount（不依赖 numpy 2 的 bitwise_count）
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+class TurnMetrics(NamedTuple):
+    """一块用户发言的分析结果（按输入顺序）"""
+    vectors: List[Dict]
+    focus: List[str]
+    numeric: np.ndarray   # (n, 3)：price_preference, specificity, decision_readiness
+    masks: np.ndarray     # (n, 4) uint64：各属性维度的取值位掩码
+
+
+def _attribute_mask(values, bits: Dict[str, int]) -> int:
+    mask = 0
+    for value in values or ():
+        mask |= 1 << bits[value]
+    return mask
+
+
+def analyze_turn_chunk(contents: List[Optional[str]]) -> TurnMetrics:
+    """
+    进程池任务：分析一块发言。每个工作进程各自持有编译好的自动机和文本分析缓存，
+    常见说法在块内 / 块间重复时直接命中缓存
+    """
+    from ai.logic import analyze_message, preference_analyzer
+
+    vectors, focus = [], []
+    numeric = np.empty((len(contents), 3), dtype=np.float64)
+    masks = np.zeros((len(contents), len(_ATTR_KEYS)), dtype=np.uint64)
+    for i, content in enumerate(contents):
+        features = analyze_message(content or "", preference_analyzer)
+        vector = features.preference_vector
+        vectors.append(vector)
+        focus.append(features.focus)
+        numeric[i] = (vector["price_preference"], vector["specificity"], vector["decision_readiness"])
+        attrs = vector["preferred_attributes"]
+        for j, key in enumerate(_ATTR_KEYS):
+            masks[i, j] = _attribute_mask(attrs.get(key), _ATTR_BITS[key])
+    return TurnMetrics(vectors, focus, numeric, masks)
+
+
+def _popcount(masks: np.ndarray) -> np.ndarray:
+    bytes_view = np.ascontiguousarray(masks, dtype=np.uint64).view(np.uint8)
+    return _POPCOUNT8[bytes_view].reshape(masks.shape + (8,)).sum(axis=-1)
+
+
+def drift_and_trajectory(
+    session_uuids: np.ndarray,
+    turn_indexes: np.ndarray,
+    numeric: np.ndarray,
+    masks: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按会话分组后组内错位一行得到“上一轮”，整块计算漂移与轨迹类型
+    与 PreferenceAnalyzer.calculate_drift / identify_trajectory 的逐条结果逐位一致；
+    会话第一条发言（没有上一轮）漂移为 0、轨迹为 exploration
+    输入需按 (session_uuid, turn_index, id) 排序，且每个会话的发言完整地在同一块里
+    """
+    n = len(session_uuids)
+    has_prev = np.zeros(n, dtype=bool)
+    prev_numeric = np.zeros_like(numeric)
+    prev_masks = np.zeros_like(masks)
+    if n > 1:
+        has_prev[1:] = session_uuids[1:] == session_uuids[:-1]
+        prev_numeric[1:] = numeric[:-1]
+        prev_masks[1:] = masks[:-1]
+
+    # 数值维度：与逐条实现相同的累加顺序，浮点结果一致
+    delta = numeric - prev_numeric
+    squared = delta * delta
+    diff = squared[:, 0] + squared[:, 1] + squared[:, 2]
+
+    # 属性维度：1 - |交| / |并|，两边都为空时该维度不计
+    inter = _popcount(masks & prev_masks)
+    union = _popcount(masks | prev_masks)
+    jaccard = np.where(union > 0, 1 - inter / np.maximum(union, 1), 0.0)
+    attr_diff = jaccard[:, 0] + jaccard[:, 1] + jaccard[:, 2] + jaccard[:, 3]
+
+    drift = np.where(has_prev, np.sqrt(diff + attr_diff), 0.0)
+    readiness_delta = delta[:, 2]
+    trajectory = np.select(
+        [
+            ~has_prev,
+            (drift < 0.3) & (readiness_delta > 0.4),
+            (drift >= 0.3) & (drift <= 0.7) & (turn_indexes > 2),
+            drift > 0.7,
+        ],
+        ["exploration", "target_driven", "info_validation", "exploratory"],
+        default="uncertain",
+    )
+    return drift, trajectory
+
+
+def decision_stages(readiness: np.ndarray) -> np.ndarray:
+    """与 PreferenceAnalyzer.decision_stage 相同的阈值"""
+    return np.select([readiness < 0.4, readiness < 0.8], ["exploration", "consideration"], default="decision")
+
+
+# =========================
+# 读取：按会话键集分页，每页若干个完整会话（漂移依赖上一轮，会话不跨页），
+# 每页一个独立查询，不长期占用游标，两页之间可以提交写入（SQLite 下读游标会阻塞写事务）
+# =========================
+def iter_session_pages(conn, page_sessions: int, version: str = None) -> Iterator[List[Tuple]]:
+    """
+    逐页返回用户发言 (id, session_uuid, turn_index, content)，按 (session_uuid, turn_index, id) 排序
+    version 不为空时只取含有其他版本（或未标记）发言的会话；会话内全部发言都参与重算
+    """
+    user_turns = (TURNS.c.sender == "user", TURNS.c.session_uuid.isnot(None), TURNS.c.turn_index.isnot(None))
+    session_filter = list(user_turns)
+    if version:
+        session_filter.append(or_(TURNS.c.lexicon_version.is_(None), TURNS.c.lexicon_version != version))
+    last_session = None
+    while True:
+        sessions = select(TURNS.c.session_uuid).where(*session_filter).distinct()
+        if last_session is not None:
+            sessions = sessions.where(TURNS.c.session_uuid > last_session)
+        session_ids = conn.execute(sessions.order_by(TURNS.c.session_uuid).limit(page_sessions)).scalars().all()
+        if not session_ids:
+            return
+        rows = conn.execute(
+            select(TURNS.c.id, TURNS.c.session_uuid, TURNS.c.turn_index, TURNS.c.content)
+            .where(*user_turns, TURNS.c.session_uuid.in_(session_ids))
+            .order_by(TURNS.c.session_uuid, TURNS.c.turn_index, TURNS.c.id)
+        ).all()
+        yield rows
+        last_session = session_ids[-1]
+
+
+# =========================
+# 写回：整页一次 executemany
+# =========================
+_UPDATE_TURNS = (
+    update(TURNS)
+    .where(TURNS.c.id == bindparam("b_id"))
+    .values(
+        preference_vector=bindparam("b_vector"),
+        preference_drift=bindparam("b_drift"),
+        focus_dimension=bindparam("b_focus"),
+        trajectory_type=bindparam("b_trajectory"),
+        purchase_intent_score=bindparam("b_intent"),
+        lexicon_version=bindparam("b_version"),
+    )
+)
+_UPDATE_EVENTS = (
+    update(EVENTS)
+    .where(and_(EVENTS.c.session_uuid == bindparam("b_session"), EVENTS.c.turn_index == bindparam("b_turn")))
+    .values(
+        preference_vector=bindparam("b_vector"),
+        preference_drift=bindparam("b_drift"),
+        trajectory_type=bindparam("b_trajectory"),
+        decision_stage=bindparam("b_stage"),
+    )
+)
+
+
+def _plain(value):
+    """只读缓存结果转回普通 dict / list，写库时与在线路径序列化结果一致"""
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+def recompute_preferences(
+    engine,
+    page_sessions: int = 200,
+    workers: int = 0,
+    version: str = LEXICON_VERSION,
+    only_stale: bool = True,
+    dry_run: bool = False
+) -> Dict:
+    """
+    重算历史用户发言的 preference_vector / preference_drift / focus_dimension / trajectory_type /
+    purchase_intent_score，同步更新 session_events，并打上词表版本 version
+    - workers > 1 时各页的文本分析交给进程池，主进程按页顺序计算漂移 / 轨迹并写回
+    - 每页（若干个完整会话）一个事务；中途中断后再次运行（only_stale）只处理尚未更新到 version 的会话
+    返回 {"turns", "sessions", "pages"}
+    """
+    stats = {"turns": 0, "sessions": 0, "pages": 0}
+    # spawn：工作进程不继承主进程已打开的数据库连接
+    executor = (
+        ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        if workers > 1 else None
+    )
+
+    with engine.connect() as reader:
+        pages = iter_session_pages(reader, page_sessions, version if only_stale else None)
+        # 进程池最多预取 workers 页，内存占用与总行数无关
+        pending = []
+        try:
+            while True:
+                for page in pages:
+                    contents = [row.content for row in page]
+                    pending.append((page, executor.submit(analyze_turn_chunk, contents) if executor else contents))
+                    if len(pending) > max(workers, 1):
+                        break
+                if not pending:
+                    break
+                page, job = pending.pop(0)
+                metrics = job.result() if executor else analyze_turn_chunk(job)
+                reader.rollback()
+                _apply_page(engine, page, metrics, version, dry_run, stats)
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+    return stats
+
+
+def _apply_page(engine, page, metrics: TurnMetrics, version: str, dry_run: bool, stats: Dict) -> None:
+    session_uuids = np.array([row.session_uuid for row in page], dtype=object)
+    turn_indexes = np.array([row.turn_index for row in page], dtype=np.int64)
+    drift, trajectory = drift_and_trajectory(session_uuids, turn_indexes, metrics.numeric, metrics.masks)
+    readiness = metrics.numeric[:, 2]
+    stages = decision_stages(readiness)
+
+    stats["pages"] += 1
+    stats["turns"] += len(page)
+    stats["sessions"] += len(set(session_uuids))
+
+    if not dry_run:
+        turn_rows, event_rows = [], []
+        for i, row in enumerate(page):
+            vector = _plain(metrics.vectors[i])
+            turn_rows.append({
+                "b_id": row.id,
+                "b_vector": vector,
+                "b_drift": float(drift[i]),
+                "b_focus": metrics.focus[i],
+                "b_trajectory": str(trajectory[i]),
+                "b_intent": float(readiness[i]),
+                "b_version": version,
+            })
+            event_rows.append({
+                "b_session": row.session_uuid,
+                "b_turn": row.turn_index,
+                "b_vector": vector,
+                "b_drift": float(drift[i]),
+                "b_trajectory": str(trajectory[i]),
+                "b_stage": str(stages[i]),
+            })
+        with engine.begin() as conn:
+            conn.execute(_UPDATE_TURNS, turn_rows)
+            conn.execute(_UPDATE_EVENTS, event_rows)
+
+    logger.info("偏好指标重算：第 %d 页，%d 条发言", stats["pages"], len(page))
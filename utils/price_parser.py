@@ -0,0 +1,121 @@
+import re
+from typing import Optional, Tuple
+
+
+# =========================
+# 预算表达式解析：一个预编译的正则，单遍扫描整条消息
+# 支持：阿拉伯数字（含小数）、量级后缀（1.5k / 2千 / 1.2万 / 3w / 5百）、
+#      中文数字（两千 / 一千五 / 三千五百 / 一万二）、区间（500-1000 / 500到1000 / 1-2千，取上限）
+# =========================
+
+_CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_CN_UNITS = {"十": 10, "百": 100, "千": 1000, "万": 10000}
+_SUFFIX_MAGNITUDE = {"k": 1000, "千": 1000, "w": 10000, "万": 10000, "百": 100}
+
+# 单个金额：数字只能从数字串的开头开始匹配（后顾断言），长数字串中间的位置立即失败，保证线性时间
+# 中文数字必须以数字开头且带“百 / 千 / 万”，避免“一般”“十分”“千万别”之类被当成金额
+# 后顾断言放在首字符之后，正则引擎才能按首字符集合快速跳过无关位置
+_CN_NUMERALS = "零一二两三四五六七八九十"
+# 阿拉伯数字后的“千 / 万 / 百”必须紧跟数字、且其后是金额的自然结尾（单位、后缀、区间分隔符、标点、空白、结尾），
+# 否则是下一个词的开头：“1000千万别超”“500 万一不够”“300百搭款”都只取数字本身
+_MAGNITUDE_END = r"(?=[元块以左上下的多内,，。.！!？?、;；~～\-到至)）\s]|$)"
+_ARABIC = rf"\d(?<![\d.]\d)\d*(?:\.\d+)?(?:\s*[kKwW](?![A-Za-z])|[千万百]{_MAGNITUDE_END})?"
+_CHINESE = rf"[一二两三四五六七八九十](?<![{_CN_NUMERALS}百千万].)[{_CN_NUMERALS}]*[百千万][{_CN_NUMERALS}百千万]*"
+_AMOUNT = rf"(?:{_ARABIC}|{_CHINESE})"
+# 区间取上限（预算即可接受的最高价）
+_RANGE = rf"{_AMOUNT}(?:\s*[-~～到至]\s*{_AMOUNT})?"
+
+# 单位（元 / 块）与后缀之间的空白只由一个 \s* 匹配，避免两个相邻 \s* 在长空白上回溯成平方级
+# 规则优先级（数值越小越优先，与原先逐条 re.search 的顺序一致）：
+# 预算 > 以内 > 以下 > 块以内 > 不超过 > 低于 > 小于 > 控制在 > 左右
+_PREFIX_PRIORITY = {"预算": 0, "不超过": 4, "低于": 5, "小于": 6, "控制在": 7}
+_SUFFIX_PRIORITY = {"以内": 1, "以下": 2, "左右": 8}
+_KUAI_WITHIN_PRIORITY = 3
+
+# 开头的先行断言给出所有候选的首字符，扫描时不可能开始匹配的位置直接跳过
+BUDGET_PATTERN = re.compile(
+    rf"(?=[预不低小控\d{_CN_NUMERALS}])"
+    rf"(?:(?P<prefix>{'|'.join(_PREFIX_PRIORITY)})\s*(?P<prefixed>{_RANGE})"
+    rf"(?:\s*(?:(?P<prefixed_unit>[元块])\s*)?(?P<prefixed_suffix>{'|'.join(_SUFFIX_PRIORITY)}))?"
+    rf"|(?P<amount>{_RANGE})\s*(?:(?P<unit>[元块])\s*)?(?P<suffix>{'|'.join(_SUFFIX_PRIORITY)}))"
+)
+_RANGE_SPLIT = re.compile(rf"\s*[-~～到至]\s*(?={_AMOUNT})")
+
+
+def _parse_chinese_number(text: str) -> Optional[float]:
+    """两千 -> 2000，一千五 -> 1500，三千五百 -> 3500，一万二 -> 12000，十二 -> 12"""
+    total, section, digit, last_unit, zero = 0, 0, None, None, False
+    for ch in text:
+        if ch in _CN_DIGITS:
+            digit = _CN_DIGITS[ch]
+            zero = zero or digit == 0
+            continue
+        unit = _CN_UNITS[ch]
+        if unit == 10000:
+            total += (section + (digit or 0)) * unit
+            section = 0
+        else:
+            section += (1 if digit is None else digit) * unit
+        digit, last_unit, zero = None, unit, False
+    if digit is not None:
+        # 口语省略末位单位：一千五 = 一千五百，一万二 = 一万二千；有“零”时按个位（一百零五）
+        section += digit * (last_unit // 10 if last_unit and last_unit >= 100 and not zero else 1)
+    value = total + section
+    return float(value) if value else None
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """单个金额（_AMOUNT 匹配到的片段）-> 数值；无法解析时返回 None"""
+    text = text.strip()
+    if not text:
+        return None
+    if text[0].isdigit():
+        magnitude = _SUFFIX_MAGNITUDE.get(text[-1].lower(), 1)
+        number = text.rstrip("kKwW千万百").strip() if magnitude != 1 else text
+        if number.isdigit():
+            # 整数直接按 int 计算，长数字串不因浮点精度丢位
+            return int(number) * magnitude
+        try:
+            return float(number) * magnitude
+        except ValueError:
+            return None
+    return _parse_chinese_number(text)
+
+
+def parse_range(text: str) -> Optional[float]:
+    """金额或区间 -> 上限"""
+    parts = _RANGE_SPLIT.split(text)
+    return parse_amount(parts[-1])
+
+
+def _budget_candidate(match: "re.Match") -> Tuple[int, Optional[float]]:
+    """一个匹配 -> (优先级, 预算)"""
+    if match.group("prefix"):
+        priority = _PREFIX_PRIORITY[match.group("prefix")]
+        suffix = match.group("prefixed_suffix")
+        if suffix:
+            unit = match.group("prefixed_unit")
+            priority = min(priority, _KUAI_WITHIN_PRIORITY if unit == "块" and suffix == "以内" else _SUFFIX_PRIORITY[suffix])
+        return priority, parse_range(match.group("prefixed"))
+    suffix = match.group("suffix")
+    priority = _KUAI_WITHIN_PRIORITY if match.group("unit") == "块" and suffix == "以内" else _SUFFIX_PRIORITY[suffix]
+    return priority, parse_range(match.group("amount"))
+
+
+def parse_budget(text: str) -> Optional[int]:
+    """
+    从一条消息中解析预算上限（元，取整）；没有预算表达式时返回 None
+    一次 finditer 扫描收集全部候选，按规则优先级取最优，同优先级取最靠前的
+    """
+    if not text:
+        return None
+    best_priority, best_value = None, None
+    for match in BUDGET_PATTERN.finditer(text):
+        priority, value = _budget_candidate(match)
+        if value is None:
+            continue
+        if best_priority is None or priority < best_priority:
+            best_priority, best_value = priority, value
+            if priority == 0:
+                break
+    return int(best_value) if best_value is not None else None
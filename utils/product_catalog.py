@@ -0,0 +1,511 @@
+import random
+import sys
+import threading
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from utils.semantic_index import SemanticIndex
+
+
+# =========================
+# 列式商品目录：加载时一次性建好数组和倒排索引，每次请求只做位运算 / 向量化排序
+# =========================
+def _clean(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value != value:  # NaN
+        return ""
+    return str(value).strip()
+
+
+def _encode(values: Iterable[str]):
+    """字符串列 -> (int32 编码数组, 取值 -> 编码)"""
+    vocab: Dict[str, int] = {}
+    codes = [vocab.setdefault(v, len(vocab)) for v in values]
+    return np.asarray(codes, dtype=np.int32), vocab
+
+
+def _recode(codes: np.ndarray, values: List[Any], key: Callable[[Any], Any]):
+    """
+    (编码, 词表) 按 key 归并取值后重新编码，如品牌转小写后 "Sony" / "sony" 合并为一个编码
+    codes 须全部 >= 0
+    """
+    remap, vocab = _encode(key(v) for v in values)
+    return remap[np.asarray(codes, dtype=np.int64)], vocab
+
+
+def intern_str(value: Any) -> str:
+    """清洗后驻留：品牌、类型、功能等高重复取值在所有商品间共享同一个字符串对象"""
+    return sys.intern(_clean(value))
+
+
+# =========================
+# 不可变商品记录
+# =========================
+# (对外字段名, slot 名)：字段名与 CSV 列一致，battery_life(hours) 不是合法标识符，单独映射
+_RECORD_FIELDS = (
+    ("product_id", "product_id"),
+    ("product_name", "product_name"),
+    ("price", "price"),
+    ("price_band", "price_band"),
+    ("headset_type", "headset_type"),
+    ("core_function", "core_function"),
+    ("core_function_list", "core_function_list"),
+    ("brand", "brand"),
+    ("battery_life(hours)", "battery_life_hours"),
+    ("sales_volume", "sales_volume"),
+    ("sales_volume_num", "sales_volume_num"),
+    ("scenario", "scenario"),
+    ("scenario_list", "scenario_list"),
+    ("involvement_level", "involvement_level"),
+)
+_SLOT_BY_KEY = dict(_RECORD_FIELDS)
+_KEY_BY_SLOT = {slot: key for key, slot in _RECORD_FIELDS}
+
+
+class ProductRecord(Mapping):
+    """
+    不可变商品记录：字段存在 __slots__ 中（无实例 __dict__），
+    同时实现只读 Mapping 接口（.get / [] / in / items），下游按字典读取的代码无需改动。
+    目录中的同一个记录对象在所有请求间共享，不需要也不允许拷贝后修改
+    """
+    __slots__ = tuple(slot for _, slot in _RECORD_FIELDS)
+
+    def __init__(self, fields: Mapping):
+        for key, slot in _RECORD_FIELDS:
+            object.__setattr__(self, slot, fields.get(key))
+
+    @classmethod
+    def from_values(cls, values: Iterable[Any]) -> "ProductRecord":
+        """按 _RECORD_FIELDS 顺序的取值构造（批量加载用，省去逐字段查字典）"""
+        record = object.__new__(cls)
+        for set_slot, value in zip(_SLOT_SETTERS, values):
+            set_slot(record, value)
+        return record
+
+    def __getitem__(self, key: str) -> Any:
+        slot = _SLOT_BY_KEY.get(key)
+        if slot is None:
+            raise KeyError(key)
+        return getattr(self, slot)
+
+    def __iter__(self):
+        return iter(_SLOT_BY_KEY)
+
+    def __len__(self) -> int:
+        return len(_RECORD_FIELDS)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ProductRecord 不可修改")
+
+    def __delattr__(self, name):
+        raise AttributeError("ProductRecord 不可修改")
+
+    def __reduce__(self):
+        return ProductRecord, (dict(self.items()),)
+
+    def __repr__(self) -> str:
+        return f"ProductRecord({self.product_id!r}, {self.product_name!r})"
+
+    def replace(self, **changes) -> "ProductRecord":
+        """返回修改了部分字段的新记录（参数名可用字段名或 slot 名）"""
+        fields = dict(self.items())
+        for name, value in changes.items():
+            fields[_KEY_BY_SLOT.get(name, name)] = value
+        return ProductRecord(fields)
+
+
+# slot 描述符的 __set__，绕过被禁用的 __setattr__ 直接写入
+_SLOT_SETTERS = tuple(getattr(ProductRecord, slot).__set__ for _, slot in _RECORD_FIELDS)
+
+
+# 倒排表：(命中行数, 按行打包的位图)
+Posting = Tuple[int, np.ndarray]
+
+# 分类列：(每行编码, 编码 -> 取值)
+Coded = Tuple[np.ndarray, List[Any]]
+
+# 行号低 3 位 -> 该行在打包字节中的位（np.packbits 高位在前）
+_BIT_MASKS = np.array([0x80, 0x40, 0x20, 0x10, 0x08, 0x04, 0x02, 0x01], dtype=np.uint8)
+
+
+class Partition(NamedTuple):
+    """商品池分区：升序行号 + 同一批行的打包位图，均为只读"""
+    rows: np.ndarray
+    bits: np.ndarray
+
+
+def semantic_text(record: Mapping) -> str:
+    """语义索引中一款商品的文本：名称 + 功能 + 场景"""
+    return " ".join(_clean(record.get(field)) for field in ("product_name", "core_function", "scenario"))
+
+
+def record_columns(products: List[ProductRecord]) -> Dict[str, Any]:
+    """
+    从记录逐行提取 ProductCatalog 需要的列；加载器已有列式数据时直接构造同样的 dict 传入，省去这一步
+    - product_id：list[str]；price / sales_volume_num：数值数组
+    - headset_type / brand / involvement_level：Coded，取值为清洗后的字符串
+    - core_function_list / scenario_list：Coded，取值为字符串元组
+    """
+    def coded(field: str, key: Callable[[Any], Any] = _clean) -> Coded:
+        codes, vocab = _encode(key(p.get(field)) for p in products)
+        return codes, list(vocab)
+
+    as_tuple = lambda v: tuple(v or ())  # noqa: E731
+    return {
+        "product_id": [_clean(p.get("product_id")) for p in products],
+        "price": np.asarray([float(p.get("price") or 0) for p in products], dtype=np.float64),
+        "sales_volume_num": np.asarray([int(p.get("sales_volume_num") or 0) for p in products], dtype=np.int64),
+        "headset_type": coded("headset_type"),
+        "brand": coded("brand"),
+        "involvement_level": coded("involvement_level"),
+        "core_function_list": coded("core_function_list", as_tuple),
+        "scenario_list": coded("scenario_list", as_tuple),
+    }
+
+
+class ProductCatalog:
+    """
+    商品列存 + 倒排索引：
+    - price / sales：float64 / int64 数组，用于价格过滤和排序
+    - headset_type / brand：整数编码数组（品牌大小写不敏感）
+    - 倒排索引：品牌、耳机类型、涉入度、功能、场景的每个取值 -> 位图（np.packbits，每行 1 bit）
+      功能的位图已包含“互为子串”的近似匹配闭包，查询时不再逐条扫描
+    products[i] 为 ProductRecord，供下游组装 prompt / 落库
+    """
+
+    def __init__(
+        self,
+        products: List[ProductRecord],
+        version: str = "",
+        columns: Optional[Dict[str, Any]] = None,
+        semantic: Optional[SemanticIndex] = None
+    ):
+        """
+        columns 见 record_columns；不传时从 products 逐行提取
+        semantic 为加载器预先建好（或从缓存映射）的语义索引；不传时首次语义查询再从记录构建
+        """
+        self.products = list(products)
+        self.size = len(self.products)
+        self.version = version  # 由 CatalogManager 设为 CSV 内容哈希
+        if columns is None:
+            columns = record_columns(self.products)
+
+        self.product_ids = list(columns["product_id"])
+        self.row_by_id = {pid: i for i, pid in enumerate(self.product_ids) if pid}
+
+        self.price = np.asarray(columns["price"], dtype=np.float64)
+        self.sales = np.asarray(columns["sales_volume_num"], dtype=np.int64)
+
+        # 预排序的行号排列：每次请求沿排列走到凑够 top_n 即可，不再对匹配结果整体排序
+        row_ids = np.arange(self.size)
+        self.sales_order = np.lexsort((row_ids, -self.sales))                          # 销量降序
+        self.price_order = np.lexsort((row_ids, -self.sales, self.price))              # 价格升序，同价销量降序
+        self.price_desc_order = np.lexsort((row_ids, -self.sales, -self.price))        # 价格降序，同价销量降序
+        self.sales_rank = np.empty(self.size, dtype=np.int64)                          # 行 -> 在销量排列中的名次
+        self.sales_rank[self.sales_order] = row_ids
+        self.sorted_price = self.price[self.price_order]
+        self._neg_sorted_price_desc = -self.price[self.price_desc_order]
+
+        lower = lambda v: _clean(v).lower()  # noqa: E731
+        self.headset_type_codes, self.headset_type_vocab = _recode(*columns["headset_type"], _clean)
+        self.brand_codes, self.brand_vocab = _recode(*columns["brand"], lower)
+        involvement_codes, involvement_vocab = _recode(*columns["involvement_level"], lower)
+
+        self._empty_bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+        self.postings: Dict[str, Dict[str, Posting]] = {
+            "headset_type": self._code_postings(self.headset_type_codes, self.headset_type_vocab),
+            "brand": self._code_postings(self.brand_codes, self.brand_vocab),
+            "involvement": self._code_postings(involvement_codes, involvement_vocab),
+            "function": self._list_postings(*columns["core_function_list"]),
+            "scenario": self._list_postings(*columns["scenario_list"]),
+        }
+
+        # 功能近似匹配闭包：查询词 -> 合并后的位图（词表内的词加载时算好，其他查询词首次出现时补算）
+        self._function_terms = [(term.lower(), posting) for term, posting in self.postings["function"].items()]
+        self._function_closure: Dict[str, Posting] = {}
+        self._closure_lock = threading.Lock()
+        for term in list(self.postings["function"]):
+            self._function_posting(term)
+
+        self._build_partitions()
+        self._semantic = semantic
+
+    def __len__(self) -> int:
+        return self.size
+
+    # ---------- 位图工具 ----------
+    def pack(self, mask: np.ndarray) -> np.ndarray:
+        return np.packbits(mask)
+
+    def unpack(self, bits: np.ndarray) -> np.ndarray:
+        return np.unpackbits(bits, count=self.size).view(bool)
+
+    def rows(self, bits: np.ndarray) -> np.ndarray:
+        """位图 -> 升序行号"""
+        return np.flatnonzero(self.unpack(bits))
+
+    def _make_posting(self, mask: np.ndarray) -> Posting:
+        return int(np.count_nonzero(mask)), self.pack(mask)
+
+    def _code_postings(self, codes: np.ndarray, vocab: Dict[str, int]) -> Dict[str, Posting]:
+        return {value: self._make_posting(codes == code) for value, code in vocab.items() if value}
+
+    def _list_postings(self, codes: np.ndarray, value_lists: List[Optional[Tuple[str, ...]]]) -> Dict[str, Posting]:
+        """多值字段：每个取值命中“列表中含该取值”的所有行（在编码上用 np.isin 一次求出）"""
+        codes_by_value: Dict[str, List[int]] = {}
+        for code, values in enumerate(value_lists):
+            for v in values or ():
+                v = _clean(v)
+                if v:
+                    codes_by_value.setdefault(v, []).append(code)
+
+        return {
+            value: self._make_posting(np.isin(codes, value_codes))
+            for value, value_codes in codes_by_value.items()
+        }
+
+    def _function_posting(self, required_func: str) -> Posting:
+        """
+        与逐条匹配语义一致：精确命中，或与商品任一功能互为子串
+        （兼容“无线蓝牙”“蓝牙”“降噪麦克风”这类近似表述）
+        """
+        required = _clean(required_func).lower()
+        cached = self._function_closure.get(required)
+        if cached is not None:
+            return cached
+
+        bits = self._empty_bits
+        for term, (_, term_bits) in self._function_terms:
+            if required in term or term in required:
+                bits = bits | term_bits
+        posting = (int(np.count_nonzero(self.unpack(bits))), bits)
+
+        with self._closure_lock:
+            self._function_closure[required] = posting
+        return posting
+
+    # ---------- 查询 ----------
+    def posting(self, field: str, value: Optional[str]) -> Optional[Posting]:
+        """
+        取某个条件的倒排表；value 为空表示不过滤，返回 None
+        未出现过的取值返回空位图
+        """
+        if not value:
+            return None
+        if field == "function":
+            return self._function_posting(value)
+        key = _clean(value)
+        if field in ("brand", "involvement"):
+            key = key.lower()
+        return self.postings[field].get(key, (0, self._empty_bits))
+
+    def intersect(self, bits: np.ndarray, postings: Iterable[Optional[Posting]]) -> np.ndarray:
+        """硬过滤：按命中行数从少到多依次求交，结果为空时提前结束"""
+        active = sorted((p for p in postings if p is not None), key=lambda p: p[0])
+        for count, posting_bits in active:
+            if count == 0:
+                return self._empty_bits
+            bits = bits & posting_bits
+            if not bits.any():
+                return bits
+        return bits
+
+    def soft_intersect(self, bits: np.ndarray, posting: Optional[Posting]) -> np.ndarray:
+        """软过滤：求交后为空则保留原位图"""
+        if posting is None or posting[0] == 0:
+            return bits
+        narrowed = bits & posting[1]
+        return narrowed if narrowed.any() else bits
+
+    # ---------- 商品池：预计算的涉入度分区 + 惰性排除视图 ----------
+    def _build_partitions(self) -> None:
+        """加载时按涉入度切好分区（升序行号 + 只读位图），每轮请求不再重新生成掩码"""
+        all_rows = np.arange(self.size, dtype=np.int64)
+        all_bits = np.packbits(np.ones(self.size, dtype=bool))
+        self._all_partition = Partition(all_rows, all_bits)
+        self.partitions: Dict[str, Partition] = {}
+        for level, (_, bits) in self.postings["involvement"].items():
+            self.partitions[level] = Partition(self.rows(bits), bits)
+        for partition in (self._all_partition, *self.partitions.values()):
+            partition.rows.setflags(write=False)
+            partition.bits.setflags(write=False)
+
+    def partition(self, level: Optional[str]) -> "Partition":
+        """涉入度分区；level 为空或目录中没有该取值时返回全量分区"""
+        if not level:
+            return self._all_partition
+        return self.partitions.get(_clean(level).lower(), self._all_partition)
+
+    def candidate_pool(self, involvement: Optional[str], exclude_ids: Iterable[str] = ()) -> "CandidatePool":
+        """
+        涉入度商品池，再排除历史推荐；任一步过滤后为空则退回上一步
+        只查被排除 id 的行号，代价 O(排除数)，不随目录规模增长
+        """
+        partition = self.partition(involvement)
+        rows = {self.row_by_id[pid] for pid in exclude_ids if pid in self.row_by_id}
+        excluded = np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+        if excluded.size:
+            excluded = excluded[self.contains(partition.bits, excluded)]
+        if excluded.size >= len(partition.rows):
+            excluded = excluded[:0]
+        return CandidatePool(self, partition, excluded)
+
+    @staticmethod
+    def contains(bits: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """位图中是否含这些行（直接测试打包位，不解包整张位图）"""
+        return (bits[rows >> 3] & _BIT_MASKS[rows & 7]) != 0
+
+    # ---------- top-k：位图解包一次成按行掩码，沿预排序排列分块前进，命中 k 条即停 ----------
+    def _walk(self, order: np.ndarray, mask: np.ndarray, k: int, start: int = 0,
+              distinct_brand: bool = False, max_price: Optional[float] = None) -> np.ndarray:
+        picked = []
+        found = 0
+        seen_brands = np.zeros(len(self.brand_vocab), dtype=bool) if distinct_brand else None
+        chunk = max(256, 8 * k)
+        i = start
+        while i < order.size and found < k:
+            block = order[i:i + chunk]
+            i += chunk
+            chunk *= 2  # 命中稀疏时加速前进
+
+            hits = block[mask[block]]
+            if max_price is not None:
+                hits = hits[self.price[hits] <= max_price]
+            if distinct_brand and hits.size:
+                _, first = np.unique(self.brand_codes[hits], return_index=True)
+                hits = hits[np.sort(first)]
+                hits = hits[~seen_brands[self.brand_codes[hits]]]
+                seen_brands[self.brand_codes[hits]] = True
+
+            hits = hits[:k - found]
+            picked.append(hits)
+            found += hits.size
+
+        if not picked:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(picked)
+
+    def top_by_sales(self, bits: np.ndarray, k: int, distinct_brand: bool = False,
+                     max_price: Optional[float] = None) -> np.ndarray:
+        """
+        销量降序前 k 行；distinct_brand 时每个品牌只取销量最高的一条
+        max_price 不为空时只取价格 <= max_price 的行
+        """
+        return self._walk(self.sales_order, self.unpack(bits), k, distinct_brand=distinct_brand, max_price=max_price)
+
+    def top_by_price(self, bits: np.ndarray, k: int) -> np.ndarray:
+        """价格升序前 k 行，同价按销量降序"""
+        return self._walk(self.price_order, self.unpack(bits), k)
+
+    def top_by_budget(self, bits: np.ndarray, max_price: Any, k: int, within_budget: bool = True) -> np.ndarray:
+        """
+        贴近预算（差值绝对值最小）的前 k 行，同差值按销量降序
+        在有序价格数组上二分定位预算，再向两侧走：
+        - 左侧（价格 <= 预算）沿价格降序排列走
+        - 右侧（价格 > 预算）沿价格升序排列走，within_budget=True 时不取
+        两侧各自已按差值有序，各取前 k 条后合并即可
+        """
+        try:
+            budget = float(max_price)
+        except (TypeError, ValueError):
+            return np.empty(0, dtype=np.int64)
+
+        mask = self.unpack(bits)
+        left_start = int(np.searchsorted(self._neg_sorted_price_desc, -budget, side="left"))
+        rows = self._walk(self.price_desc_order, mask, k, start=left_start)
+        if within_budget:
+            return rows
+
+        right_start = int(np.searchsorted(self.sorted_price, budget, side="right"))
+        rows = np.concatenate([rows, self._walk(self.price_order, mask, k, start=right_start)])
+        distance = np.abs(budget - self.price[rows])
+        return rows[np.lexsort((rows, -self.sales[rows], distance))][:k]
+
+    # ---------- 语义相似度：自由文本兜底排序 ----------
+    def semantic_index(self) -> SemanticIndex:
+        if self._semantic is None:
+            with self._closure_lock:
+                if self._semantic is None:
+                    self._semantic = SemanticIndex.build([semantic_text(p) for p in self.products])
+        return self._semantic
+
+    def query_signature(self, text: Optional[str]) -> Tuple[Tuple[int, int], ...]:
+        """查询文本在索引中的有效片段；片段相同的两句话语义排序结果相同"""
+        return self.semantic_index().query_terms(text)
+
+    def top_by_similarity(self, bits: np.ndarray, text: Optional[str], k: int,
+                          max_price: Optional[float] = None) -> np.ndarray:
+        """
+        与 text 余弦相似度降序前 k 行（同分按销量降序）；只取位图内、与查询有共同片段的行
+        max_price 不为空时只取价格 <= max_price 的行
+        """
+        rows, scores = self.semantic_index().scores(text)
+        if rows.size:
+            keep = self.contains(bits, rows)
+            if max_price is not None:
+                keep &= self.price[rows] <= max_price
+            rows, scores = rows[keep], scores[keep]
+        if rows.size > k:
+            # 第 k 高分之上的全取；与第 k 名同分的按销量名次取够 k 条，避免对大量同分行整体排序
+            kth = np.partition(scores, rows.size - k)[rows.size - k]
+            above = np.flatnonzero(scores > kth)
+            tied = np.flatnonzero(scores == kth)
+            need = k - above.size
+            if tied.size > need:
+                tied = tied[np.argpartition(self.sales_rank[rows[tied]], need - 1)[:need]]
+            keep = np.concatenate([above, tied])
+            rows, scores = rows[keep], scores[keep]
+        return rows[np.lexsort((self.sales_rank[rows], -scores))]
+
+    # ---------- 取回商品 ----------
+    def take(self, rows: Iterable[int]) -> List[ProductRecord]:
+        return [self.products[i] for i in rows]
+
+
+class CandidatePool:
+    """
+    一轮推荐的商品池：共享的涉入度分区 + 被排除的行号（升序，都在分区内）
+    不物化过滤后的列表 / 掩码；需要位图、抽样或遍历时才按需计算
+    """
+    __slots__ = ("catalog", "partition", "excluded")
+
+    def __init__(self, catalog: ProductCatalog, partition: Partition, excluded: np.ndarray):
+        self.catalog = catalog
+        self.partition = partition
+        self.excluded = excluded
+
+    def __len__(self) -> int:
+        return len(self.partition.rows) - self.excluded.size
+
+    def __iter__(self) -> Iterator[ProductRecord]:
+        products = self.catalog.products
+        skip = set(self.excluded.tolist())
+        for row in self.partition.rows.tolist():
+            if row not in skip:
+                yield products[row]
+
+    def bits(self) -> np.ndarray:
+        """商品池位图；没有排除时直接返回分区的只读位图，否则复制后清掉被排除的位"""
+        if not self.excluded.size:
+            return self.partition.bits
+        bits = self.partition.bits.copy()
+        np.bitwise_and.at(bits, self.excluded >> 3, ~_BIT_MASKS[self.excluded & 7])
+        return bits
+
+    def sample(self, k: int) -> np.ndarray:
+        """
+        无放回均匀抽 k 行：在“去掉排除项后的第 i 个”下标上抽样，再跳过排除项映射回分区行号
+        只抽 k 个下标，不复制 / 打乱整个商品池
+        """
+        n = len(self)
+        picked = np.asarray(random.sample(range(n), min(k, n)), dtype=np.int64)
+        if self.excluded.size:
+            positions = np.searchsorted(self.partition.rows, self.excluded)
+            # 第 j 个排除项之前有 positions[j] - j 个保留行；第 i 个保留行 = i + 满足该数 <= i 的排除项个数
+            skip = positions - np.arange(positions.size)
+            picked = picked + np.searchsorted(skip, picked, side="right")
+        return self.partition.rows[picked]
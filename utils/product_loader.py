@@ -1,11 +1,17 @@
+import io
 import os
 import re
-import random
-import copy
-from typing import List, Dict, Any
+import sys
+from typing import Any, Callable, Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 
+from utils.catalog_cache import CatalogCache
+from utils.catalog_manager import CatalogManager
+from utils.product_catalog import CandidatePool, ProductCatalog, ProductRecord, intern_str, semantic_text
+from utils.semantic_index import SemanticIndex
+
 
 # =========================
 # 1. 路径与缓存
@@ -13,12 +19,37 @@ import pandas as pd
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PRODUCT_CSV_PATH = os.path.join(BASE_DIR, "data", "product_list.csv")
 
-GLOBAL_PRODUCTS: List[Dict] = []
+# 商品目录后端：csv（默认，进程内列存目录）/ sql（products 表，先用 import_products.py 导入）
+PRODUCT_CATALOG_BACKEND = os.environ.get("PRODUCT_CATALOG_BACKEND", "csv").strip().lower()
+
+# CSV 变化检查间隔（秒），<= 0 关闭热更新
+CATALOG_POLL_SECONDS = float(os.environ.get("CATALOG_POLL_SECONDS", "5"))
+
+# 标准化后的目录列缓存（按 CSV 内容哈希），设为空串关闭
+CATALOG_CACHE_DIR = os.environ.get("CATALOG_CACHE_DIR", os.path.join(BASE_DIR, "data", "catalog_cache"))
+catalog_cache = CatalogCache(CATALOG_CACHE_DIR) if CATALOG_CACHE_DIR else None
+
+# CSV 中的价格带（高/中/低）统一成英文取值
+PRICE_BAND_MAP = {
+    "高": "high",
+    "中": "medium",
+    "低": "low",
+    "high": "high",
+    "medium": "medium",
+    "low": "low",
+}
 
 
 # =========================
 # 2. 基础清洗函数
 # =========================
+# 清洗用的正则在导入时编译一次，逐行清洗时直接复用
+_PRICE_NUMBER = re.compile(r"\d+(\.\d+)?")
+_SALES_WAN = re.compile(r"(\d+(\.\d+)?)\s*万")
+_SALES_NUMBER = re.compile(r"\d+")
+_LIST_SEPARATORS = re.compile(r"[，,、/｜|；;]+")
+
+
 def _safe_str(value: Any) -> str:
     if value is None:
         return ""
@@ -49,7 +80,7 @@ def _normalize_price(value: Any) -> float:
     text = _safe_str(value)
     text = text.replace("¥", "").replace("元", "").replace(",", "").strip()
 
-    m = re.search(r"\d+(\.\d+)?", text)
+    m = _PRICE_NUMBER.search(text)
     if m:
         try:
             return float(m.group())
@@ -77,14 +108,14 @@ def _normalize_sales_volume(value: Any) -> int:
         return 0
 
     # 处理中文“万”
-    m_wan = re.search(r"(\d+(\.\d+)?)\s*万", text)
+    m_wan = _SALES_WAN.search(text)
     if m_wan:
         try:
             return int(float(m_wan.group(1)) * 10000)
         except Exception:
             return 0
 
-    m = re.search(r"\d+", text.replace("+", ""))
+    m = _SALES_NUMBER.search(text.replace("+", ""))
     if m:
         try:
             return int(m.group())
@@ -111,7 +142,7 @@ def _normalize_core_function_list(value: Any) -> List[str]:
             if item is None:
                 continue
             if isinstance(item, str):
-                parts = re.split(r"[，,、/｜|；;]+", item)
+                parts = _LIST_SEPARATORS.split(item)
                 result.extend([x.strip() for x in parts if x and x.strip()])
             else:
                 item_text = _safe_str(item)
@@ -120,7 +151,7 @@ def _normalize_core_function_list(value: Any) -> List[str]:
         return [x for x in result if x]
 
     if isinstance(value, str):
-        return [x.strip() for x in re.split(r"[，,、/｜|；;]+", value) if x and x.strip()]
+        return [x.strip() for x in _LIST_SEPARATORS.split(value) if x and x.strip()]
 
     value_text = _safe_str(value)
     return [value_text] if value_text else []
@@ -133,258 +164,375 @@ def _normalize_scenario_list(value: Any) -> List[str]:
     if isinstance(value, list):
         result = []
         for item in value:
-            parts = re.split(r"[，,、/｜|；;]+", _safe_str(item))
+            parts = _LIST_SEPARATORS.split(_safe_str(item))
             result.extend([x.strip() for x in parts if x and x.strip()])
         return result
 
     text = _safe_str(value)
     if not text:
         return []
-    return [x.strip() for x in re.split(r"[，,、/｜|；;]+", text) if x and x.strip()]
+    return [x.strip() for x in _LIST_SEPARATORS.split(text) if x and x.strip()]
 
 
-def _normalize_record(record: Dict) -> Dict:
-    """
-    把每个商品统一成更稳的结构
-    """
-    r = dict(record)
-
-    r["product_id"] = _safe_str(r.get("product_id"))
-    r["product_name"] = _safe_str(r.get("product_name"))
-    r["brand"] = _safe_str(r.get("brand"))
-    r["headset_type"] = _safe_str(r.get("headset_type"))
-    r["core_function"] = _safe_str(r.get("core_function"))
-    r["scenario"] = _safe_str(r.get("scenario"))
-    r["involvement_level"] = _safe_lower(r.get("involvement_level"))
-
-    r["price"] = _normalize_price(r.get("price"))
-    r["sales_volume_num"] = _normalize_sales_volume(r.get("sales_volume"))
+def _optional_raw(value: Any) -> Any:
+    """原样保留的展示字段（销量文案、续航），只把 NaN 统一成 None"""
+    if isinstance(value, float) and pd.isna(value):
+        return None
+    return value
 
-    r["core_function_list"] = _normalize_core_function_list(r.get("core_function"))
-    r["scenario_list"] = _normalize_scenario_list(r.get("scenario"))
 
-    return r
+def _normalize_record(record: Dict) -> ProductRecord:
+    """
+    把每个商品统一成不可变的 ProductRecord：
+    每个字段只保留一份（文本字段清洗后驻留，多值字段拆成元组），不再复制整行原始数据
+    """
+    return ProductRecord({
+        "product_id": _safe_str(record.get("product_id")),
+        "product_name": _safe_str(record.get("product_name")),
+        "price": _normalize_price(record.get("price")),
+        "price_band": intern_str(record.get("price_band")),
+        "headset_type": intern_str(record.get("headset_type")),
+        "core_function": intern_str(record.get("core_function")),
+        "core_function_list": tuple(intern_str(x) for x in _normalize_core_function_list(record.get("core_function"))),
+        "brand": intern_str(record.get("brand")),
+        "battery_life(hours)": _optional_raw(record.get("battery_life(hours)")),
+        "sales_volume": _optional_raw(record.get("sales_volume")),
+        "sales_volume_num": _normalize_sales_volume(record.get("sales_volume")),
+        "scenario": intern_str(record.get("scenario")),
+        "scenario_list": tuple(intern_str(x) for x in _normalize_scenario_list(record.get("scenario"))),
+        "involvement_level": sys.intern(_safe_lower(record.get("involvement_level"))),
+    })
 
 
 # =========================
 # 3. 加载 CSV
 # =========================
-def load_products_from_csv(force_reload: bool = False) -> List[Dict]:
+REQUIRED_FIELDS = [
+    "product_id",
+    "product_name",
+    "price",
+    "headset_type",
+    "core_function",
+    "involvement_level",
+]
+
+# 分类列（取值高度重复）：存 int32 编码 + 词表，-1 表示缺失
+# (列名, CSV 列名, 是否清洗)；展示用的原始字段（续航、销量文案）不清洗，缺失为 None
+_CATEGORY_COLUMNS = (
+    ("price_band", "price_band", True),
+    ("headset_type", "headset_type", True),
+    ("core_function", "core_function", True),
+    ("brand", "brand", True),
+    ("battery_life_hours", "battery_life(hours)", False),
+    ("sales_volume", "sales_volume", False),
+    ("scenario", "scenario", True),
+    ("involvement_level", "involvement_level", True),
+)
+
+
+def _text_column(df: pd.DataFrame, col: str) -> pd.Series:
+    """对应 _safe_str：缺失列 / NaN -> 空串，去首尾空白"""
+    if col not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[col].fillna("").astype(str).str.strip()
+
+
+def _categorize(values: pd.Series, normalize: Optional[Callable[[Any], str]] = None):
     """
-    从 CSV 加载商品并缓存
+    分类列 -> (int32 编码, 定长 Unicode 词表)
+    normalize 只作用于去重后的取值（再按结果归并编码），缺失值按 normalize(None) 处理；
+    不传 normalize 时保留原始取值，缺失编码为 -1
     """
-    global GLOBAL_PRODUCTS
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    if normalize is None:
+        return codes.astype(np.int32), np.asarray(uniques, dtype=str)
+
+    vocab: Dict[str, int] = {}
+    remap = [vocab.setdefault(normalize(u), len(vocab)) for u in list(uniques) + [None]]
+    return np.asarray(remap, dtype=np.int32)[codes], np.asarray(list(vocab), dtype=str)
 
-    if GLOBAL_PRODUCTS and not force_reload:
-        return GLOBAL_PRODUCTS
 
+def _parse_numeric(values: pd.Series, parse: Callable[[Any], float]) -> np.ndarray:
+    """
+    数值列：能直接转成数字的整列转换；其余（"5000+" / "1.2万" / "¥299"）按去重后的取值逐个 parse
+    缺失为 0
+    """
+    number = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+    rest = np.isnan(number) & values.notna().to_numpy()
+    if rest.any():
+        codes, uniques = pd.factorize(values[rest])
+        number[rest] = np.asarray([parse(u) for u in uniques], dtype=np.float64)[codes]
+    return np.nan_to_num(number, nan=0.0)
+
+
+_CATEGORY_NORMALIZERS = {
+    "price_band": lambda v: PRICE_BAND_MAP.get(_safe_str(v), "low"),
+    "core_function": lambda v: _safe_str(v).replace("，", ","),
+    "involvement_level": _safe_lower,
+}
+
+
+def _normalize_frame(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    校验列并整列标准化，得到目录列（全部为数值 / 定长 Unicode 数组，可直接写入缓存）：
+    - 价格、销量整列转数字，带单位 / 符号的取值去重后再解析
+    - 文本列按分类编码，清洗和功能 / 场景拆分只在去重后的取值上做
+    """
+    missing_fields = [f for f in REQUIRED_FIELDS if f not in df.columns]
+    if missing_fields:
+        raise ValueError(f"商品CSV缺少核心字段：{', '.join(missing_fields)}")
+
+    # 去掉没有 product_id 的脏数据
+    product_id = _text_column(df, "product_id")
+    keep = (product_id != "").to_numpy()
+    df, product_id = df[keep], product_id[keep]
+
+    def column(col: str) -> pd.Series:
+        return df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+
+    columns = {
+        "product_id": product_id.to_numpy(dtype=str),
+        "product_name": _text_column(df, "product_name").to_numpy(dtype=str),
+        "price": _parse_numeric(column("price"), _normalize_price),
+        "sales_volume_num": _parse_numeric(column("sales_volume"), _normalize_sales_volume).astype(np.int64),
+    }
+    for name, col, clean in _CATEGORY_COLUMNS:
+        normalize = _CATEGORY_NORMALIZERS.get(name, _safe_str) if clean else None
+        columns[f"{name}_codes"], columns[f"{name}_vocab"] = _categorize(column(col), normalize)
+    return columns
+
+
+def _read_columns(data: bytes) -> Dict[str, np.ndarray]:
     try:
-        df = pd.read_csv(PRODUCT_CSV_PATH, encoding="utf-8")
-        df['core_function'] = df['core_function'].str.replace('，', ',')
-        df['price_band'] = df['price_band'].map(lambda x: PRICE_BAND_MAP.get(str(x).strip(), "low"))
-        df['involvement_level'] = df['involvement_level'].str.strip().str.lower()
-
-        required_fields = [
-            "product_id",
-            "product_name",
-            "price",
-            "headset_type",
-            "core_function",
-            "involvement_level",
-        ]
-        missing_fields = [f for f in required_fields if f not in df.columns]
-        if missing_fields:
-            raise ValueError(f"商品CSV缺少核心字段：{', '.join(missing_fields)}")
-
-        # 缺失列兜底，避免下游直接 KeyError
-        optional_defaults = {
-            "brand": "",
-            "scenario": "",
-            "sales_volume": 0,
-            "battery_life(hours)": "",
-        }
-        for col, default_val in optional_defaults.items():
-            if col not in df.columns:
-                df[col] = default_val
-
-        # 逐行标准化，避免 .str.split / re.split 因 list / NaN 崩掉
-        records = df.to_dict("records")
-        normalized_records = [_normalize_record(r) for r in records]
-
-        # 去掉没有 product_id 的脏数据
-        normalized_records = [r for r in normalized_records if r.get("product_id")]
-
-        GLOBAL_PRODUCTS = normalized_records
-        print(f"成功加载商品数据，共 {len(GLOBAL_PRODUCTS)} 款商品")
-
-        # 调试阶段可临时打开
-        # print([p["core_function"] for p in GLOBAL_PRODUCTS[:5]])
-        # print([p["core_function_list"] for p in GLOBAL_PRODUCTS[:5]])
-
-        return GLOBAL_PRODUCTS
-
-    except FileNotFoundError:
-        raise FileNotFoundError(f"商品CSV文件未找到，请检查路径：{PRODUCT_CSV_PATH}")
+        # 全部按字符串读入，再统一做向量化解析，避免同一列因类型推断在不同文件里表现不同
+        df = pd.read_csv(io.BytesIO(data), encoding="utf-8", dtype=str)
+        columns = _normalize_frame(df)
     except Exception as e:
         raise Exception(f"加载商品CSV失败：{str(e)}")
+    columns.update(_semantic_columns(columns))
+    return columns
 
 
-# =========================
-# 4. 匹配工具
-# =========================
-def _match_headset_type(product: Dict, headset_type: str) -> bool:
-    if not headset_type:
-        return True
-    return _safe_str(product.get("headset_type")) == _safe_str(headset_type)
+def _semantic_columns(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    冷启动时离线建好语义索引，随目录列一起写入缓存
+    文本在已清洗的列上整列拼接，与 semantic_text(记录) 逐行拼出的结果一致
+    """
+    def text(name: str) -> np.ndarray:
+        table = np.append(columns[f"{name}_vocab"].astype(str), "")  # 编码 -1 取空串
+        return table[columns[f"{name}_codes"]]
 
+    texts = columns["product_name"].astype(str)
+    for part in (text("core_function"), text("scenario")):
+        texts = np.char.add(np.char.add(texts, " "), part)
+    return SemanticIndex.build(texts).to_columns()
 
-def _match_brand(product: Dict, brand: str) -> bool:
-    if not brand:
-        return True
-    return _safe_str(product.get("brand")).lower() == _safe_str(brand).lower()
 
+def _vocab(columns: Dict[str, np.ndarray], name: str, to_value: Callable[[Any], Any]) -> list:
+    """分类列词表 -> 转换后的取值（每个不同取值只转换一次）"""
+    return [to_value(v) for v in columns[f"{name}_vocab"].tolist()]
 
-def _match_core_function(product: Dict, required_func: str) -> bool:
-    if not required_func:
-        return True
 
-    required = _safe_str(required_func)
-    funcs = product.get("core_function_list", [])
-    funcs = funcs if isinstance(funcs, list) else []
+def _expand(columns: Dict[str, np.ndarray], name: str, vocab: list, missing: Any = None) -> list:
+    """按编码展开成逐行取值，编码 -1 取 missing"""
+    table = np.empty(len(vocab) + 1, dtype=object)
+    table[:] = vocab + [missing]
+    return table[columns[f"{name}_codes"]].tolist()
 
-    # 先做精确匹配
-    if required in funcs:
-        return True
 
-    # 再做包含匹配，兼容“无线蓝牙”“蓝牙”“降噪麦克风”这类近似表述
-    required_lower = required.lower()
-    for f in funcs:
-        f_lower = _safe_str(f).lower()
-        if required_lower in f_lower or f_lower in required_lower:
-            return True
+def _split_terms(split: Callable[[Any], List[str]]) -> Callable[[Any], tuple]:
+    """多值字段拆分函数 -> 词表取值到驻留字符串元组的转换"""
+    return lambda v: tuple(intern_str(x) for x in split(v)) if v else ()
 
-    return False
 
+def _catalog_from_columns(columns: Dict[str, np.ndarray]) -> ProductCatalog:
+    """
+    目录列 -> ProductCatalog（冷启动与读缓存共用，两条路径结果一致）
+    记录逐行组装，目录的数值列 / 编码列直接复用，不再从记录里逐行提取
+    """
+    vocab = {name: _vocab(columns, name, intern_str) for name, _, clean in _CATEGORY_COLUMNS if clean}
+    vocab["battery_life_hours"] = _vocab(columns, "battery_life_hours", lambda v: v)
+    vocab["sales_volume"] = _vocab(columns, "sales_volume", lambda v: v)
+    function_lists = [_split_terms(_normalize_core_function_list)(v) for v in vocab["core_function"]]
+    scenario_lists = [_split_terms(_normalize_scenario_list)(v) for v in vocab["scenario"]]
+
+    product_ids = columns["product_id"].tolist()
+    products = [
+        ProductRecord.from_values(values)
+        for values in zip(
+            product_ids,
+            columns["product_name"].tolist(),
+            columns["price"].tolist(),
+            _expand(columns, "price_band", vocab["price_band"]),
+            _expand(columns, "headset_type", vocab["headset_type"]),
+            _expand(columns, "core_function", vocab["core_function"]),
+            _expand(columns, "core_function", function_lists),
+            _expand(columns, "brand", vocab["brand"]),
+            _expand(columns, "battery_life_hours", vocab["battery_life_hours"]),
+            _expand(columns, "sales_volume", vocab["sales_volume"]),
+            columns["sales_volume_num"].tolist(),
+            _expand(columns, "scenario", vocab["scenario"]),
+            _expand(columns, "scenario", scenario_lists),
+            _expand(columns, "involvement_level", vocab["involvement_level"]),
+        )
+    ]
 
-def _match_price(product: Dict, max_price: Any) -> bool:
-    if max_price is None:
-        return True
-    try:
-        return float(product.get("price", 0)) <= float(max_price)
-    except Exception:
-        return False
+    return ProductCatalog(products, columns={
+        "product_id": product_ids,
+        "price": columns["price"],
+        "sales_volume_num": columns["sales_volume_num"],
+        "headset_type": (columns["headset_type_codes"], vocab["headset_type"]),
+        "brand": (columns["brand_codes"], vocab["brand"]),
+        "involvement_level": (columns["involvement_level_codes"], vocab["involvement_level"]),
+        "core_function_list": (columns["core_function_codes"], function_lists),
+        "scenario_list": (columns["scenario_codes"], scenario_lists),
+    }, semantic=SemanticIndex.from_columns(columns))
+
+
+def _build_catalog(data: bytes, digest: str) -> ProductCatalog:
+    """
+    CSV 内容 -> 带全部索引的商品目录（由 CatalogManager 在后台线程调用）
+    同一内容哈希第二次加载时直接映射列缓存，跳过 CSV 解析和标准化
+    """
+    columns = catalog_cache.load(digest) if catalog_cache else None
+    source = "缓存"
+    if columns is None:
+        columns = _read_columns(data)
+        source = "CSV"
+        if catalog_cache:
+            catalog_cache.save(digest, columns)
+
+    catalog = _catalog_from_columns(columns)
+    print(f"成功加载商品数据，共 {len(catalog)} 款商品（来自{source}）")
+    return catalog
 
 
-def _sort_by_price_asc(products: List[Dict]) -> List[Dict]:
-    return sorted(products, key=lambda x: float(x.get("price", 0)))
+catalog_manager = CatalogManager(PRODUCT_CSV_PATH, _build_catalog, poll_seconds=CATALOG_POLL_SECONDS)
 
 
-def _sort_by_sales_desc(products: List[Dict]) -> List[Dict]:
-    return sorted(products, key=lambda x: int(x.get("sales_volume_num", 0)), reverse=True)
+def get_product_catalog(force_reload: bool = False) -> ProductCatalog:
+    """
+    当前商品目录快照；CSV 改动后由后台线程重建并原子替换。
+    同一轮请求内应只取一次，并把它传给下游，保证整轮使用同一版本
+    PRODUCT_CATALOG_BACKEND=sql 时返回 products 表上的 SqlProductCatalog（需在应用上下文中调用）
+    """
+    if PRODUCT_CATALOG_BACKEND == "sql":
+        from utils.product_store import get_sql_catalog
+        return get_sql_catalog()
+
+    if force_reload:
+        catalog_manager.reload(force=True)
+    return catalog_manager.current()
+
+
+def load_products_from_csv(force_reload: bool = False) -> List[ProductRecord]:
+    """
+    当前目录中的全部商品
+    """
+    return get_product_catalog(force_reload=force_reload).products
 
 
 # =========================
-# 5. 推荐主逻辑
+# 4. 推荐主逻辑（在 ProductCatalog 上做向量化筛选 / 排序）
 # =========================
-def get_matching_products(pool: List[Dict], user_intent: str, max_price: float = None, **kwargs) -> List[Dict]:
+def get_matching_products(
+    user_intent: str,
+    intent_details: Dict,
+    top_n: int = 5,
+    candidates: Optional[CandidatePool] = None,
+    catalog: Optional[ProductCatalog] = None,
+    fallback: bool = True,
+    query_text: Optional[str] = None
+) -> List[ProductRecord]:
     """
     HIGH 校准：基于意图和条件做规则筛选
+    candidates 为 catalog.candidate_pool 返回的商品池（涉入度分区 + 排除历史），None 表示全量
+    类型 / 品牌 / 功能条件走倒排索引位图求交，排序沿目录预排序排列取前 top_n
+    fallback=False 时没匹配到返回空列表，由调用方自行兜底（结果因此总是确定性的，可缓存）
+    query_text 为用户原话：recommendation 意图下没抽到结构化条件、或条件过滤后为空时，
+    按与商品名称 / 功能 / 场景的语义相似度排序（仅进程内目录）
     """
-    matched = pool
-
+    catalog = catalog or get_product_catalog()
+    if not isinstance(catalog, ProductCatalog):
+        # SQL 目录：candidates 为 SqlPool，过滤 / 排序 / LIMIT 在数据库完成
+        matched = catalog.match(user_intent, intent_details, top_n=top_n, pool=candidates)
+        if matched or not fallback:
+            return matched
+        return catalog.sample(top_n=top_n, pool=candidates)
+
+    pool = candidates if candidates is not None else catalog.candidate_pool(None)
+    bits = pool.bits()
+
+    intent_details = intent_details or {}
     max_price = intent_details.get("max_price")
-    headset_type = intent_details.get("headset_type")
-    core_function = intent_details.get("core_function")
-    brand = intent_details.get("brand")
+    type_posting = catalog.posting("headset_type", intent_details.get("headset_type"))
+    function_posting = catalog.posting("function", intent_details.get("core_function"))
+    brand_posting = catalog.posting("brand", intent_details.get("brand"))
 
     # 1) 价格敏感
     if user_intent == "price_sensitive":
-        matched = [p for p in matched if _match_price(p, max_price)]
-        matched = [p for p in matched if _match_headset_type(p, headset_type)]
-        matched = [p for p in matched if _match_core_function(p, core_function)]
-        matched = [p for p in matched if _match_brand(p, brand)]
+        bits = catalog.intersect(bits, [type_posting, function_posting, brand_posting])
 
         if max_price is not None:
             # 如果有明确预算，按“贴近预算（差值绝对值最小）”排序，而不是最便宜的
-            matched = sorted(
-                matched,
-                key=lambda x: (abs(max_price - float(x.get("price", 0))), -int(x.get("sales_volume_num", 0)))
-            )
+            rows = catalog.top_by_budget(bits, max_price, top_n, within_budget=True)
         else:
             # 如果没说具体预算，纯喊便宜，才按从低到高排
-            matched = sorted(
-                matched,
-                key=lambda x: (float(x.get("price", 0)), -int(x.get("sales_volume_num", 0)))
-            )
+            rows = catalog.top_by_price(bits, top_n)
 
     # 2) 常规推荐
     elif user_intent == "recommendation":
-        matched = [p for p in matched if _match_headset_type(p, headset_type)]
-        matched = [p for p in matched if _match_core_function(p, core_function)]
-        matched = [p for p in matched if _match_brand(p, brand)]
-
-        # 如果一个条件都没给，就按销量走
-        if not any([headset_type, core_function, brand, max_price]):
-            matched = _sort_by_sales_desc(matched)
-        else:
-            matched = sorted(
-                matched,
-                key=lambda x: (
-                    0 if _match_brand(x, brand) else 1,
-                    0 if _match_headset_type(x, headset_type) else 1,
-                    0 if _match_core_function(x, core_function) else 1,
-                    -int(x.get("sales_volume_num", 0))
-                )
+        postings = [type_posting, function_posting, brand_posting]
+        matched = catalog.intersect(bits, postings)
+
+        # 关键词没抽到条件，或条件组合在商品池里为空：先按用户原话的语义相似度在商品池内排序
+        rows = np.empty(0, dtype=np.int64)
+        if query_text and (all(p is None for p in postings) or not matched.any()):
+            rows = _budget_soft_filter(
+                lambda budget: catalog.top_by_similarity(bits, query_text, top_n, max_price=budget), max_price
             )
 
-        # 若给了预算，再做一个软过滤
-        if max_price is not None:
-            budget_matched = [p for p in matched if _match_price(p, max_price)]
-            if budget_matched:
-                matched = budget_matched
+        # 过滤后剩下的都满足全部条件，按销量取前 top_n 即可
+        if rows.size == 0:
+            rows = _budget_soft_filter(
+                lambda budget: catalog.top_by_sales(matched, top_n, max_price=budget), max_price
+            )
 
     # 3) 对比
     elif user_intent == "comparison":
-        # 优先同类型；若无则不过滤类型
-        if headset_type:
-            type_matched = [p for p in matched if _match_headset_type(p, headset_type)]
-            if type_matched:
-                matched = type_matched
-
-        if core_function:
-            func_matched = [p for p in matched if _match_core_function(p, core_function)]
-            if func_matched:
-                matched = func_matched
-
-        # 如果指定品牌，优先这些品牌；否则保留多品牌
-        if brand:
-            brand_matched = [p for p in matched if _match_brand(p, brand)]
-            if brand_matched:
-                matched = brand_matched
+        # 优先同类型 / 同功能 / 指定品牌；过滤后为空则不过滤
+        bits = catalog.soft_intersect(bits, type_posting)
+        bits = catalog.soft_intersect(bits, function_posting)
+        bits = catalog.soft_intersect(bits, brand_posting)
 
         # 选不同品牌更利于对比
-        matched = _sort_by_sales_desc(matched)
-        dedup_brands = []
-        seen_brands = set()
-        for p in matched:
-            b = _safe_str(p.get("brand"))
-            if b not in seen_brands:
-                dedup_brands.append(p)
-                seen_brands.add(b)
-        matched = dedup_brands
-
-    # 4) 探索
-    elif user_intent == "exploration":
-        matched = _sort_by_sales_desc(matched)
+        rows = catalog.top_by_sales(bits, top_n, distinct_brand=True)
 
+    # 4) 探索 / 其他
     else:
-        matched = _sort_by_sales_desc(matched)
+        rows = catalog.top_by_sales(bits, top_n)
 
-    # 兜底：没匹配到时不要递归自己，直接随机
-    if not matched:
-        return get_random_products(top_n=top_n)
+    # 兜底：没匹配到时直接从商品池随机
+    if rows.size == 0:
+        if not fallback:
+            return []
+        return get_random_products(top_n=top_n, candidates=pool, catalog=catalog)
 
-    return matched[:top_n]
+    return catalog.take(rows)
+
+
+def _budget_soft_filter(rank: Callable[[Optional[float]], np.ndarray], max_price: Any) -> np.ndarray:
+    """预算软过滤：先只在预算内排序（排序时顺带比较价格），预算内一条都没有、或预算无法解析时不限价"""
+    if max_price is not None:
+        try:
+            budget = float(max_price)
+        except (TypeError, ValueError):
+            budget = None
+        if budget is not None:
+            rows = rank(budget)
+            if rows.size:
+                return rows
+    return rank(None)
 
 
 def render_product_text(products: List[Dict]) -> str:
@@ -401,26 +549,21 @@ def render_product_text(products: List[Dict]) -> str:
     return "\n".join(lines)
 
 
-def get_random_products(pool: List[Dict], top_n: int = 3) -> List[Dict]:
+def get_random_products(
+    top_n: int = 3,
+    candidates: Optional[CandidatePool] = None,
+    catalog: Optional[ProductCatalog] = None
+) -> List[ProductRecord]:
     """
     LOW 校准：随机推荐
+    candidates 为 catalog.candidate_pool 返回的商品池，None 表示全量
     """
-    temp_pool=copy.deepcopy(pool)
-    random.shuffle(temp_pool)
-    return temp_pool[:top_n]
-
-
-def filter_products_by_involvement(products: List[Dict], level: str) -> List[Dict]:
-    """
-    根据涉入度过滤
-    如果 level 无效或过滤后为空，则回退到原列表
-    """
-    level = _safe_lower(level)
-    if not level:
-        return products
+    catalog = catalog or get_product_catalog()
+    if not isinstance(catalog, ProductCatalog):
+        return catalog.sample(top_n=top_n, pool=candidates)
 
-    filtered = [p for p in products if _safe_lower(p.get("involvement_level")) == level]
-    return filtered if filtered else products
+    pool = candidates if candidates is not None else catalog.candidate_pool(None)
+    return catalog.take(pool.sample(top_n))
 
 
 def extract_product_core_info(products: List[Dict]) -> List[Dict]:
@@ -0,0 +1,359 @@
+import csv
+import hashlib
+import io
+import logging
+import random
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, exists, false, func, insert, select, text
+
+from models.main import Product, ProductFunctionTag, db
+from utils.lru import BoundedLRU
+from utils.product_catalog import ProductRecord
+from utils.product_loader import (
+    _expand,
+    _normalize_core_function_list,
+    _normalize_frame,
+    _normalize_record,
+    _safe_lower,
+    _safe_str,
+    _vocab,
+)
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS = Product.__table__
+TAGS = ProductFunctionTag.__table__
+
+# 入库列顺序（COPY 与批量 INSERT 共用）
+_COLUMNS = [
+    "product_id",
+    "product_name",
+    "price",
+    "price_band",
+    "headset_type",
+    "core_function",
+    "brand",
+    "battery_life",
+    "sales_volume",
+    "scenario",
+    "involvement_level",
+    "sales_volume_num",
+    "brand_key",
+    "catalog_version",
+    "created_at",
+]
+
+
+# =========================
+# 1. 批量导入
+# =========================
+def _file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _battery_hours(value: Any) -> Optional[int]:
+    """续航列可能是 "30" / "/" / 空，只保留整数"""
+    text = _safe_str(value)
+    try:
+        return int(float(text))
+    except (ValueError, OverflowError):
+        return None
+
+
+def _table_rows(columns: Dict[str, np.ndarray], version: str, created_at: datetime) -> List[Dict]:
+    """标准化后的目录列（与 CSV 目录同一套向量化标准化）-> products 表的行"""
+    values = {
+        "product_id": columns["product_id"].tolist(),
+        "product_name": columns["product_name"].tolist(),
+        "price": columns["price"].tolist(),
+        "battery_life": _expand(columns, "battery_life_hours", _vocab(columns, "battery_life_hours", _battery_hours)),
+        "sales_volume": _expand(columns, "sales_volume", _vocab(columns, "sales_volume", _safe_str), ""),
+        "sales_volume_num": columns["sales_volume_num"].tolist(),
+        "brand_key": _expand(columns, "brand", _vocab(columns, "brand", _safe_lower)),
+    }
+    for name in ("price_band", "headset_type", "core_function", "brand", "scenario", "involvement_level"):
+        values[name] = _expand(columns, name, _vocab(columns, name, _safe_str))
+
+    names = list(values)
+    return [
+        dict(zip(names, row), catalog_version=version, created_at=created_at)
+        for row in zip(*values.values())
+    ]
+
+
+def _tag_rows(columns: Dict[str, np.ndarray]) -> List[Dict]:
+    """标准化后的目录列 -> product_function_tags 表的行（每个商品每个去重后的小写功能一行）"""
+    function_tags = _vocab(
+        columns, "core_function",
+        lambda v: tuple(dict.fromkeys(t.lower() for t in _normalize_core_function_list(v)))
+    )
+    return [
+        {"tag": tag, "product_id": product_id}
+        for product_id, tags in zip(columns["product_id"].tolist(), _expand(columns, "core_function", function_tags))
+        for tag in tags or ()
+    ]
+
+
+def _copy_rows(conn, table, columns: List[str], rows: List[Dict]) -> bool:
+    """PostgreSQL + psycopg2：用 COPY 写入；驱动不支持时返回 False 交给批量 INSERT"""
+    with conn.connection.dbapi_connection.cursor() as cursor:
+        if not hasattr(cursor, "copy_expert"):
+            return False
+
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow(["" if row[c] is None else row[c] for c in columns])
+        buf.seek(0)
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buf
+        )
+    return True
+
+
+def ingest_products(engine, csv_path: str, batch_size: int = 5000) -> Tuple[int, str]:
+    """
+    整表替换式导入商品 CSV（products 与功能标签子表 product_function_tags）：
+    - 按 batch_size 行分块读取 / 向量化标准化 / 写入，内存占用与文件大小无关
+    - PostgreSQL 用 COPY，其他数据库用批量 INSERT（executemany）
+    - 删除旧数据与写入新数据在同一事务内，读者要么看到旧目录、要么看到新目录
+    返回 (写入行数, 目录版本)；版本与 CSV 目录一致，为文件内容 sha256 前 12 位
+    """
+    version = _file_digest(csv_path)[:12]
+    created_at = datetime.utcnow()
+    use_copy = engine.dialect.name == "postgresql"
+    total = 0
+
+    with engine.begin() as conn:
+        conn.execute(delete(TAGS))
+        conn.execute(delete(PRODUCTS))
+        for chunk in pd.read_csv(csv_path, encoding="utf-8", chunksize=batch_size, dtype=str):
+            columns = _normalize_frame(chunk)
+            rows = _table_rows(columns, version, created_at)
+            if not rows:
+                continue
+            if not (use_copy and _copy_rows(conn, PRODUCTS, _COLUMNS, rows)):
+                conn.execute(insert(PRODUCTS), rows)
+            tag_rows = _tag_rows(columns)
+            if tag_rows and not (use_copy and _copy_rows(conn, TAGS, ["tag", "product_id"], tag_rows)):
+                conn.execute(insert(TAGS), tag_rows)
+            total += len(rows)
+        # 更新统计信息，让查询规划器在品牌 / 类型 / 涉入度 / 功能标签索引之间选对
+        conn.execute(text(f"ANALYZE {PRODUCTS.name}"))
+        conn.execute(text(f"ANALYZE {TAGS.name}"))
+
+    logger.info("商品导入完成：%d 行，版本 %s", total, version)
+    return total, version
+
+
+# =========================
+# 2. SQL 商品目录
+# =========================
+class SqlPool(NamedTuple):
+    """SQL 目录的商品池：涉入度 + 排除的商品 ID（对应内存目录的 CandidatePool）"""
+    involvement: Optional[str]
+    exclude_ids: Tuple[str, ...]
+
+
+# 各目录版本的功能标签词表（去重后的小写标签，通常只有几十个）；整表替换导入会换版本，旧条目自然淘汰
+_function_vocab_cache = BoundedLRU(max_entries=4)
+
+
+class SqlProductCatalog:
+    """
+    products 表上的商品目录：过滤、排序和 LIMIT 都下推到带索引的 SQL，
+    进程内不持有商品数据，多节点共享同一份数据源
+    排序并列时按 id（即导入顺序）升序，与内存目录按 CSV 行号一致
+    """
+
+    def __init__(self, session, version: str = ""):
+        self.session = session
+        self.version = version
+
+    def __len__(self) -> int:
+        return self.session.execute(select(func.count()).select_from(PRODUCTS)).scalar_one()
+
+    # ---------- 工具 ----------
+    def _exists(self, conditions: Iterable) -> bool:
+        return bool(self.session.execute(select(exists().select_from(PRODUCTS).where(*conditions))).scalar())
+
+    def _fetch(self, conditions: Iterable, order_by: Iterable, k: int) -> List[ProductRecord]:
+        stmt = select(PRODUCTS).where(*conditions).order_by(*order_by).limit(k)
+        return [self._to_record(row) for row in self.session.execute(stmt).mappings()]
+
+    @staticmethod
+    def _to_record(row) -> ProductRecord:
+        return _normalize_record({
+            "product_id": row["product_id"],
+            "product_name": row["product_name"],
+            "price": row["price"],
+            "price_band": row["price_band"],
+            "headset_type": row["headset_type"],
+            "core_function": row["core_function"],
+            "brand": row["brand"],
+            "battery_life(hours)": row["battery_life"],
+            "sales_volume": row["sales_volume"],
+            "scenario": row["scenario"],
+            "involvement_level": row["involvement_level"],
+        })
+
+    def _function_vocab(self) -> Tuple[str, ...]:
+        vocab = _function_vocab_cache.get(self.version) if self.version else None
+        if vocab is None:
+            vocab = tuple(self.session.execute(select(TAGS.c.tag).distinct()).scalars())
+            if self.version:
+                _function_vocab_cache.set(self.version, vocab)
+        return vocab
+
+    def _function_condition(self, required_func: str):
+        """
+        与内存目录语义一致：查询词是某个功能的子串，或某个功能是查询词的子串
+        先在标签词表上展开出命中的标签集合，再对每个候选商品按 (tag IN (...), product_id) 探测子表主键；
+        不用 product_id IN (子查询)，常见标签（降噪）会把大半张子表物化出来，
+        关联探测则能沿销量索引取满 top_n 就停
+        """
+        required = _safe_lower(required_func)
+        matched = [tag for tag in self._function_vocab() if required in tag or tag in required]
+        if not matched:
+            return false()
+        return exists().where(TAGS.c.tag.in_(matched), TAGS.c.product_id == PRODUCTS.c.product_id)
+
+    def _pool_conditions(self, pool: Optional[SqlPool]) -> List:
+        conditions = []
+        if pool is None:
+            return conditions
+        if pool.involvement:
+            conditions.append(PRODUCTS.c.involvement_level == pool.involvement)
+        if pool.exclude_ids:
+            conditions.append(PRODUCTS.c.product_id.notin_(pool.exclude_ids))
+        return conditions
+
+    # ---------- 商品池 ----------
+    def candidate_pool(self, involvement: Optional[str], exclude_ids: Iterable[str] = ()) -> SqlPool:
+        """涉入度商品池，再排除历史推荐；任一步过滤后为空则退回上一步"""
+        level = _safe_lower(involvement) or None
+        if level and not self._exists([PRODUCTS.c.involvement_level == level]):
+            level = None
+
+        excluded = tuple(sorted({pid for pid in exclude_ids if pid}))
+        pool = SqlPool(level, excluded)
+        if excluded and not self._exists(self._pool_conditions(pool)):
+            pool = SqlPool(level, ())
+        return pool
+
+    # ---------- 查询 ----------
+    def match(
+        self,
+        user_intent: str,
+        intent_details: Dict,
+        top_n: int = 5,
+        pool: Optional[SqlPool] = None
+    ) -> List[ProductRecord]:
+        """
+        get_matching_products 的 SQL 版本，规则与内存目录一致；未命中时返回空列表，
+        由调用方从同一商品池随机兜底
+        """
+        c = PRODUCTS.c
+        intent_details = intent_details or {}
+        conditions = self._pool_conditions(pool)
+        max_price = intent_details.get("max_price")
+
+        filters = []
+        if intent_details.get("headset_type"):
+            filters.append(c.headset_type == _safe_str(intent_details["headset_type"]))
+        if intent_details.get("core_function"):
+            filters.append(self._function_condition(intent_details["core_function"]))
+        if intent_details.get("brand"):
+            filters.append(c.brand_key == _safe_lower(intent_details["brand"]))
+
+        by_sales = [c.sales_volume_num.desc(), c.id]
+
+        # 1) 价格敏感
+        if user_intent == "price_sensitive":
+            conditions += filters
+            if max_price is None:
+                return self._fetch(conditions, [c.price, *by_sales], top_n)
+            try:
+                budget = float(max_price)
+            except (TypeError, ValueError):
+                return []
+            # 预算内贴近预算：价格降序，同价销量降序
+            return self._fetch(conditions + [c.price <= budget], [c.price.desc(), *by_sales], top_n)
+
+        # 2) 常规推荐：预算为软过滤
+        if user_intent == "recommendation":
+            conditions += filters
+            if max_price is not None:
+                try:
+                    rows = self._fetch(conditions + [c.price <= float(max_price)], by_sales, top_n)
+                except (TypeError, ValueError):
+                    rows = []
+                if rows:
+                    return rows
+            return self._fetch(conditions, by_sales, top_n)
+
+        # 3) 对比：条件逐个软过滤，每个品牌只取销量最高的一条
+        if user_intent == "comparison":
+            for condition in filters:
+                if self._exists(conditions + [condition]):
+                    conditions.append(condition)
+
+            # 沿销量索引逐条取下一个新品牌，top_n 次短查询，不对整个商品池做窗口排序
+            brand_key = func.coalesce(c.brand_key, "")
+            picked, seen = [], []
+            for _ in range(top_n):
+                step = conditions + ([brand_key.notin_(seen)] if seen else [])
+                rows = self._fetch(step, by_sales, 1)
+                if not rows:
+                    break
+                picked += rows
+                seen.append(rows[0]["brand"].lower())
+            return picked
+
+        # 4) 探索 / 其他
+        return self._fetch(conditions, by_sales, top_n)
+
+    def sample(self, top_n: int = 3, pool: Optional[SqlPool] = None, max_rounds: int = 8) -> List[ProductRecord]:
+        """
+        LOW 校准：商品池内均匀随机 top_n 条
+        导入后 id 连续，每轮随机抽一批 id 按主键取回、保留落在商品池内的行（拒绝采样），
+        不做 ORDER BY random() 全表扫描；抽不够时（池很稀疏）再退回 ORDER BY random()
+        """
+        conditions = self._pool_conditions(pool)
+        # min / max 分两条查询，SQLite 才会直接走主键两端
+        low = self.session.execute(select(func.min(PRODUCTS.c.id))).scalar()
+        high = self.session.execute(select(func.max(PRODUCTS.c.id))).scalar()
+        if low is None:
+            return []
+
+        picked: Dict[int, Dict] = {}
+        for _ in range(max_rounds):
+            need = top_n - len(picked)
+            if need <= 0:
+                break
+            probe = {random.randint(low, high) for _ in range(4 * need)} - picked.keys()
+            stmt = select(PRODUCTS).where(PRODUCTS.c.id.in_(probe), *conditions)
+            rows = list(self.session.execute(stmt).mappings())
+            random.shuffle(rows)
+            for row in rows[:need]:
+                picked[row["id"]] = row
+
+        if len(picked) < top_n:
+            return self._fetch(conditions, [func.random()], top_n)
+        return [self._to_record(row) for row in picked.values()]
+
+
+def get_sql_catalog(session=None) -> SqlProductCatalog:
+    """当前 products 表上的目录；版本取导入批次号（整表替换导入，所有行相同）"""
+    session = session or db.session
+    version = session.execute(select(PRODUCTS.c.catalog_version).limit(1)).scalar()
+    return SqlProductCatalog(session, version or "")
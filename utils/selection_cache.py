@@ -0,0 +1,74 @@
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from utils.lru import BoundedLRU
+
+
+def _canonical_price(value: Any) -> Any:
+    """800 / 800.0 / "800" 视为同一个预算；无法转成数字的按原文比较"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return ("raw", str(value).strip())
+
+
+def _canonical_text(value: Any, lower: bool = False) -> str:
+    text = "" if value is None else str(value).strip()
+    return text.lower() if lower else text
+
+
+class SelectionCache:
+    """
+    HIGH 校准选品结果的进程内 LRU 缓存：
+    - 键：目录版本 + 涉入度 + 意图 + 规范化后的筛选条件 + 已推荐商品集合 + top_n + 自由文本签名
+      （与目录的匹配语义一致：品牌 / 功能 / 涉入度不区分大小写，类型按清洗后原文）
+    - 值：商品记录元组，记录本身不可变，命中时直接共享同一个元组
+    - 只缓存确定性的规则匹配结果；随机选品（LOW 校准、匹配为空时的随机兜底）不经过这里
+    目录热更新后版本变化，旧键自然不再命中，随 LRU 淘汰
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries = BoundedLRU(max_entries)
+
+    # ---------- 键 ----------
+    @staticmethod
+    def make_key(
+        catalog_version: str,
+        involvement: Optional[str],
+        user_intent: str,
+        intent_details: Dict,
+        exclude_ids: Iterable[str],
+        top_n: int,
+        query_signature: Hashable = None
+    ) -> Hashable:
+        """query_signature：参与排序的自由文本的规范形式（如语义索引中的有效片段），没有则为 None"""
+        return (
+            catalog_version,
+            _canonical_text(involvement, lower=True),
+            user_intent,
+            _canonical_price(intent_details.get("max_price")),
+            _canonical_text(intent_details.get("headset_type")),
+            _canonical_text(intent_details.get("brand"), lower=True),
+            _canonical_text(intent_details.get("core_function"), lower=True),
+            frozenset(str(pid) for pid in exclude_ids if pid),
+            top_n,
+            query_signature,
+        )
+
+    # ---------- 读写 ----------
+    def get(self, key: Hashable) -> Optional[Tuple]:
+        return self._entries.get(key)
+
+    def set(self, key: Hashable, products: Iterable) -> Tuple:
+        """存入并返回不可变的元组（调用方后续只使用返回值）"""
+        products = tuple(products)
+        self._entries.set(key, products)
+        return products
+
+    def stats(self) -> Dict:
+        return self._entries.stats()
+
+    def clear(self) -> None:
+        self._entries.clear()
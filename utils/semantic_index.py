@@ -0,0 +1,196 @@
+import math
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# =========================
+# 字符 n-gram TF-IDF 语义索引：不分词、不依赖模型，中文 / 英文型号都按字符片段匹配
+# =========================
+# 出现在超过该比例商品中的片段（如“耳机”）区分度低且倒排表很长，建索引时丢弃
+MAX_DF = 0.5
+COLUMN_PREFIX = "semantic_"
+# 分块切片段，控制按字符展开的矩阵大小
+_CHUNK_ROWS = 20000
+# 码点最多 21 位，3 个字符拼成一个 uint64 片段编码
+_CODE_BITS = np.uint64(21)
+
+
+def _gram_codes(texts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    一批文本的全部 2 / 3 字符片段 -> (所在文本下标, 片段编码)
+    - 小写后只保留数字、英文字母、汉字，其余字符视为分隔，片段不跨越分隔
+    - 纯数字片段（预算、型号数字）不参与匹配
+    文本数组按定长 UCS-4 直接看成码点矩阵，整批向量化切片，建索引和查询共用
+    """
+    texts = np.char.lower(np.asarray(texts, dtype=str))
+    if not texts.size or texts.dtype.itemsize == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+    chars = np.ascontiguousarray(texts).view(np.uint32).reshape(texts.size, -1)
+    digit = (chars >= ord("0")) & (chars <= ord("9"))
+    word = digit | ((chars >= ord("a")) & (chars <= ord("z"))) | ((chars >= 0x4e00) & (chars <= 0x9fff))
+    chars = chars.astype(np.uint64)
+
+    text_ids, codes = [], []
+    for n in (2, 3):
+        if chars.shape[1] < n:
+            continue
+        width = chars.shape[1] - n + 1
+        valid = np.ones((texts.size, width), dtype=bool)
+        all_digit = np.ones((texts.size, width), dtype=bool)
+        code = np.zeros((texts.size, width), dtype=np.uint64)
+        for i in range(n):
+            valid &= word[:, i:i + width]
+            all_digit &= digit[:, i:i + width]
+            code = (code << _CODE_BITS) | chars[:, i:i + width]
+        valid &= ~all_digit
+        text_ids.append(np.nonzero(valid)[0])
+        codes.append(code[valid])
+    if not codes:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+    return np.concatenate(text_ids), np.concatenate(codes)
+
+
+class SemanticIndex:
+    """
+    按列（片段）存储的行归一化 TF-IDF 矩阵：
+    - vocab：升序片段编码（uint64，2 / 3 个字符码点拼接），查询时二分定位
+    - idf：每个片段的 idf
+    - indptr / rows / weights：片段 t 命中的行号为 rows[indptr[t]:indptr[t+1]]，对应权重为 weights 同一段
+      （每行向量已做 L2 归一化，查询向量也归一化后，累加结果即余弦相似度）
+    全部为数值数组，可随目录列一起写入缓存并内存映射加载
+    """
+
+    def __init__(self, vocab: np.ndarray, idf: np.ndarray, indptr: np.ndarray,
+                 rows: np.ndarray, weights: np.ndarray, size: int):
+        self.vocab = vocab
+        self.idf = idf
+        self.indptr = indptr
+        self.rows = rows
+        self.weights = weights
+        self.size = size
+
+    # ---------- 建索引 ----------
+    @classmethod
+    def build(cls, texts: Sequence[str], max_df: float = MAX_DF) -> "SemanticIndex":
+        """texts[i] 为第 i 行商品的文本；相同文本只切一次片段"""
+        size = len(texts)
+        # 哈希去重（不排序）：text_of_row[i] 为第 i 行的文本编号
+        text_of_row, unique_texts = pd.factorize(np.asarray(texts, dtype=object), sort=False)
+        unique_texts = np.asarray(unique_texts, dtype=str)
+        rows_per_text = np.bincount(text_of_row, minlength=unique_texts.size)
+
+        # 每个不同文本的 (片段, 词频)
+        gram_text, gram_code = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.uint64)]
+        for start in range(0, unique_texts.size, _CHUNK_ROWS):
+            text_ids, codes = _gram_codes(unique_texts[start:start + _CHUNK_ROWS])
+            gram_text.append(text_ids + start)
+            gram_code.append(codes)
+        gram_term, terms = pd.factorize(np.concatenate(gram_code), sort=True)
+        stride = max(terms.size, 1)
+        pair_id, pairs = pd.factorize(np.concatenate(gram_text) * stride + gram_term, sort=False)
+        entry_tf = np.bincount(pair_id, minlength=pairs.size)
+        entry_text, entry_term = np.divmod(pairs, stride)
+
+        # 文档频率按商品行数计（同一文本出现在多行时计多次），再剪掉高频片段（编码本身已升序）
+        df = np.bincount(entry_term, weights=rows_per_text[entry_text], minlength=terms.size)
+        kept = np.flatnonzero(df <= max(1.0, max_df * size))
+        new_id = np.full(terms.size, -1, dtype=np.int64)
+        new_id[kept] = np.arange(kept.size)
+
+        keep_entry = new_id[entry_term] >= 0
+        entry_text, entry_tf = entry_text[keep_entry], entry_tf[keep_entry]
+        entry_term = new_id[entry_term[keep_entry]]
+        idf = np.log((1.0 + size) / (1.0 + df[kept])) + 1.0
+
+        # 亚线性词频 * idf，按文本做 L2 归一化
+        weight = (1.0 + np.log(entry_tf)) * idf[entry_term]
+        norm = np.sqrt(np.bincount(entry_text, weights=weight * weight, minlength=unique_texts.size))
+        weight = weight / norm[entry_text]
+
+        # 条目先按片段排好，展开后自然按片段分组，不必再对展开后的大数组排序
+        by_term = np.argsort(entry_term, kind="stable")
+        entry_text, entry_term, weight = entry_text[by_term], entry_term[by_term], weight[by_term]
+
+        # 文本 -> 行展开：每个 (文本, 片段) 条目复制到使用该文本的所有行
+        rows_by_text = np.argsort(text_of_row, kind="stable")
+        text_start = np.cumsum(rows_per_text) - rows_per_text
+        repeat = rows_per_text[entry_text]
+        entry_of = np.repeat(np.arange(entry_text.size), repeat)
+        offset = np.arange(entry_of.size) - np.repeat(np.cumsum(repeat) - repeat, repeat)
+        rows = rows_by_text[text_start[entry_text[entry_of]] + offset]
+        term_of = entry_term[entry_of]
+
+        indptr = np.zeros(kept.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_of, minlength=kept.size), out=indptr[1:])
+        return cls(
+            vocab=terms[kept],
+            idf=idf.astype(np.float32),
+            indptr=indptr,
+            rows=rows.astype(np.int32),
+            weights=weight[entry_of].astype(np.float32),
+            size=size,
+        )
+
+    # ---------- 缓存 ----------
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        return {
+            f"{COLUMN_PREFIX}vocab": self.vocab,
+            f"{COLUMN_PREFIX}idf": self.idf,
+            f"{COLUMN_PREFIX}indptr": self.indptr,
+            f"{COLUMN_PREFIX}rows": self.rows,
+            f"{COLUMN_PREFIX}weights": self.weights,
+            f"{COLUMN_PREFIX}size": np.asarray([self.size], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, np.ndarray]) -> Optional["SemanticIndex"]:
+        """目录列里没有索引（其他来源的列）时返回 None"""
+        if f"{COLUMN_PREFIX}vocab" not in columns:
+            return None
+        return cls(
+            vocab=columns[f"{COLUMN_PREFIX}vocab"],
+            idf=columns[f"{COLUMN_PREFIX}idf"],
+            indptr=columns[f"{COLUMN_PREFIX}indptr"],
+            rows=columns[f"{COLUMN_PREFIX}rows"],
+            weights=columns[f"{COLUMN_PREFIX}weights"],
+            size=int(columns[f"{COLUMN_PREFIX}size"][0]),
+        )
+
+    # ---------- 查询 ----------
+    def query_terms(self, text: Optional[str]) -> Tuple[Tuple[int, int], ...]:
+        """查询文本中出现在索引里的 (片段编号, 词频)，按编号升序；可直接作为缓存键的一部分"""
+        if not text or not self.vocab.size:
+            return ()
+        _, codes = _gram_codes(np.asarray([text]))
+        codes, tfs = np.unique(codes, return_counts=True)
+        positions = np.minimum(np.searchsorted(self.vocab, codes), self.vocab.size - 1)
+        found = self.vocab[positions] == codes
+        return tuple(zip(positions[found].tolist(), tfs[found].tolist()))
+
+    def scores(self, text: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        与查询有共同片段的行及其余弦相似度 (rows, scores)
+        代价只与查询片段的倒排表长度有关
+        """
+        terms = self.query_terms(text)
+        if not terms:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        ids = np.asarray([t for t, _ in terms], dtype=np.int64)
+        query = (1.0 + np.log([tf for _, tf in terms])) * self.idf[ids]
+        query /= math.sqrt(float(query @ query))
+
+        starts, ends = self.indptr[ids], self.indptr[ids + 1]
+        if ids.size == 1:
+            # 单个片段：倒排表本身就是结果，每行只出现一次，不需要再按行合并
+            return self.rows[starts[0]:ends[0]].astype(np.int64), self.weights[starts[0]:ends[0]] * query[0]
+
+        hit_rows = np.concatenate([self.rows[s:e] for s, e in zip(starts, ends)])
+        hit_weights = np.concatenate([self.weights[s:e] * q for s, e, q in zip(starts, ends, query)])
+        total = np.bincount(hit_rows, weights=hit_weights, minlength=self.size)
+        hit = np.zeros(self.size, dtype=bool)
+        hit[hit_rows] = True
+        rows = np.flatnonzero(hit)  # 布尔数组上取非零比浮点数组快一个数量级
+        return rows, total[rows]